@@ -6,16 +6,23 @@ and initializes the TravelPlannerAgent to process user travel queries and genera
 """
 
 import os
+import re
+import json
+import uuid
 import yaml
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
+from typing import Any, Dict, Optional
 from app.agent import TravelPlannerAgent
 from fastapi.staticfiles import StaticFiles
+from api.llm_provider import aclose_http_clients
+from utils.helpers import set_to_list_converter
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -30,8 +37,10 @@ class UserInput(BaseModel):
     
     Attributes:
         text (str): The text input from the user describing their travel plans.
+        session_id (Optional[str]): The client's session, or None to start a new one.
     """
     text: str
+    session_id: Optional[str] = None
 
 def load_config(config_path: str):
     """
@@ -46,6 +55,89 @@ def load_config(config_path: str):
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
 
+def prepare_plan_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check a generated travel plan and patch it up for the frontend.
+    
+    Fills in a missing itinerary, logs when the itinerary has fewer day headers
+    than requested, and adds a title to the budget estimate if it lacks one.
+    
+    Args:
+        result (Dict[str, Any]): The output of the travel planner agent.
+        
+    Returns:
+        Dict[str, Any]: The same result, ready to be returned to the client.
+    """
+    # Check for trip_details
+    trip_details = result.get("trip_details", {})
+    if trip_details:
+        logger.info(f"Trip details: {trip_details}")
+
+    # Verify the result contains the necessary fields
+    if not result.get("itinerary"):
+        logger.warning("No itinerary was generated in the result")
+        result["itinerary"] = "I couldn't generate a detailed itinerary based on your input. Please provide more specific travel details like destination, dates, and preferences."
+
+    # Verify the itinerary has the correct number of days
+    itinerary = result.get("itinerary", "")
+    trip_details = result.get("trip_details", {})
+    expected_days = trip_details.get("duration_days", 0)
+
+    if expected_days > 0 and itinerary:
+        # Count day headers in the itinerary
+        day_headers = re.findall(r'## Day \d+', itinerary)
+        day_count = len(day_headers)
+
+        logger.info(f"Expected {expected_days} days, found {day_count} day headers")
+
+        # If we have a significant mismatch, log a warning
+        if day_count < expected_days:
+            logger.warning(f"Itinerary has fewer days than requested. Expected: {expected_days}, Found: {day_count}")
+            # We'll still return what we have, as the frontend will handle the display
+
+    # Log each component for debugging purposes
+    logger.info(f"Generated itinerary length: {len(result.get('itinerary', ''))}")
+    logger.info(f"Generated packing list length: {len(result.get('packing_list', ''))}")
+
+    # Specifically check the budget content
+    budget = result.get("estimated_budget", "")
+    logger.info(f"Generated budget length: {len(budget)}")
+    logger.info(f"Budget excerpt: {budget[:100]}...")
+
+    # Make sure budget is properly formatted for the frontend
+    if budget and "Budget Estimate" not in budget:
+        # Try to add a title if it's missing
+        logger.warning("Budget estimate is missing a title, adding one")
+        destination = trip_details.get("destination", "Your Trip")
+        result["estimated_budget"] = f"### Budget Estimate for {destination}\n\n{budget}"
+
+    return result
+
+def resolve_session_id(session_id: Optional[str]) -> str:
+    """
+    Get the session a request belongs to, starting a new one if the client sent none.
+    
+    Args:
+        session_id (Optional[str]): The session id sent by the client.
+        
+    Returns:
+        str: The session id to use.
+    """
+    return session_id or uuid.uuid4().hex
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one server-sent event.
+    
+    Args:
+        event (str): The event name.
+        data (Any): JSON-serializable event payload.
+        
+    Returns:
+        str: The event in text/event-stream wire format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=set_to_list_converter)}\n\n"
+
 # Get the base directory of the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 config_path = os.path.join(BASE_DIR, 'config', 'config.yaml')
@@ -67,6 +159,13 @@ app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), na
 # Set up templates
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Close the pooled LLM HTTP connections when the server stops.
+    """
+    await aclose_http_clients()
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """
@@ -97,7 +196,8 @@ async def create_plan(user_input: UserInput):
                 "itinerary": str,
                 "packing_list": str,
                 "estimated_budget": str,
-                "trip_details": dict
+                "trip_details": dict,
+                "session_id": str
             }
             Error: {
                 "error": str
@@ -113,51 +213,11 @@ async def create_plan(user_input: UserInput):
             return JSONResponse(content={"error": "Input text cannot be empty"}, status_code=400)
         
         # Process the input with our agent - no validation requirements
-        result = agent.process_input(user_input.text)
+        session_id = resolve_session_id(user_input.session_id)
+        result = await agent.aprocess_input(user_input.text, session_id=session_id)
         
-        # Check for trip_details
-        trip_details = result.get("trip_details", {})
-        if trip_details:
-            logger.info(f"Trip details: {trip_details}")
-        
-        # Verify the result contains the necessary fields
-        if not result.get("itinerary"):
-            logger.warning("No itinerary was generated in the result")
-            result["itinerary"] = "I couldn't generate a detailed itinerary based on your input. Please provide more specific travel details like destination, dates, and preferences."
-            
-        # Verify the itinerary has the correct number of days
-        itinerary = result.get("itinerary", "")
-        trip_details = result.get("trip_details", {})
-        expected_days = trip_details.get("duration_days", 0)
-        
-        if expected_days > 0 and itinerary:
-            # Count day headers in the itinerary
-            import re
-            day_headers = re.findall(r'## Day \d+', itinerary)
-            day_count = len(day_headers)
-            
-            logger.info(f"Expected {expected_days} days, found {day_count} day headers")
-            
-            # If we have a significant mismatch, log a warning
-            if day_count < expected_days:
-                logger.warning(f"Itinerary has fewer days than requested. Expected: {expected_days}, Found: {day_count}")
-                # We'll still return what we have, as the frontend will handle the display
-            
-        # Log each component for debugging purposes
-        logger.info(f"Generated itinerary length: {len(result.get('itinerary', ''))}")
-        logger.info(f"Generated packing list length: {len(result.get('packing_list', ''))}")
-        
-        # Specifically check the budget content
-        budget = result.get("estimated_budget", "")
-        logger.info(f"Generated budget length: {len(budget)}")
-        logger.info(f"Budget excerpt: {budget[:100]}...")
-        
-        # Make sure budget is properly formatted for the frontend
-        if budget and "Budget Estimate" not in budget:
-            # Try to add a title if it's missing
-            logger.warning("Budget estimate is missing a title, adding one")
-            destination = trip_details.get("destination", "Your Trip")
-            result["estimated_budget"] = f"### Budget Estimate for {destination}\n\n{budget}"
+        result = prepare_plan_response(result)
+        result["session_id"] = session_id
         
         logger.info("Successfully generated travel plan")
         return JSONResponse(content=result)
@@ -168,14 +228,63 @@ async def create_plan(user_input: UserInput):
             status_code=500
         )
 
+@app.post("/api/plan/stream")
+async def stream_plan(user_input: UserInput):
+    """
+    Generate a travel plan, streaming progress as server-sent events.
+    
+    Emits one event per completed pipeline stage, then the itinerary text as the
+    LLM produces it, and finally the complete plan. Clients get their first bytes
+    within about a second instead of waiting for the whole plan.
+    
+    Args:
+        user_input (UserInput): Pydantic model containing the user's travel query.
+        
+    Returns:
+        StreamingResponse: A text/event-stream response with these events:
+            - guardrail, features, queries, context: pipeline stage progress
+            - itinerary_delta: {"text": str}, repeated while the itinerary streams
+            - result: the same payload as /api/plan, including the session_id
+            - error: {"error": str} if plan generation failed unexpectedly
+    """
+    logger.info(f"Received request to stream plan with input: {user_input.text[:50]}...")
+    
+    if not user_input.text:
+        return JSONResponse(content={"error": "Input text cannot be empty"}, status_code=400)
+    
+    session_id = resolve_session_id(user_input.session_id)
+    
+    async def event_stream():
+        try:
+            async for event in agent.astream_input(user_input.text, session_id=session_id):
+                if event["event"] == "result":
+                    result = prepare_plan_response(event["data"])
+                    result["session_id"] = session_id
+                    yield format_sse("result", result)
+                    logger.info("Successfully streamed travel plan")
+                else:
+                    yield format_sse(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"Error streaming travel plan: {str(e)}", exc_info=True)
+            yield format_sse("error", {"error": f"Failed to generate travel plan: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/history")
-async def get_history():
+async def get_history(session_id: str):
     """
-    Retrieve the conversation history with the travel planning agent.
+    Retrieve the conversation history of one session with the travel planning agent.
     
     This endpoint fetches the history of user interactions with the agent,
     which can be used for displaying past queries and plans.
     
+    Args:
+        session_id (str): The session id returned with the session's plans.
+    
     Returns:
         dict: A dictionary containing the conversation history or an error message.
             Success: {
@@ -189,10 +298,40 @@ async def get_history():
         Exception: Any unexpected errors are caught and returned as a 500 response.
     """
     try:
-        return {"history": agent.get_conversation_history()}
+        return {"history": agent.get_conversation_history(session_id)}
     except Exception as e:
         logger.error(f"Error getting history: {str(e)}", exc_info=True)
         return JSONResponse(
             content={"error": f"Failed to get history: {str(e)}"}, 
             status_code=500
+        )
+
+@app.get("/api/llm/queue")
+async def get_llm_queue():
+    """
+    Report the LLM rate limiter's queues, shared with batch and evaluation jobs.
+    
+    Returns:
+        dict: The rate limiter stats, or an error message.
+            Success: {
+                "enabled": bool,
+                "classes": dict,   # Per priority class: queued, in_flight, acquired,
+                                   # mean_wait_seconds and max_wait_seconds
+                "keys": dict,      # Per provider/model: limits, concurrency and in_flight
+                ...
+            }
+            Error: {
+                "error": str
+            }
+    """
+    if agent.rate_limiter is None:
+        return {"enabled": False}
+    try:
+        stats = await asyncio.to_thread(agent.rate_limiter.stats)
+        return {"enabled": True, **stats}
+    except Exception as e:
+        logger.error(f"Error getting LLM queue stats: {str(e)}", exc_info=True)
+        return JSONResponse(
+            content={"error": f"Failed to get LLM queue stats: {str(e)}"}, 
+            status_code=500
         )
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""
+api/cache_store.py
+
+Persistent key-value cache backed by a single SQLite file. Used by the API clients to
+keep responses from external services across restarts and share them between worker
+processes.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_MAX_BATCH = 500
+
+class CacheStore:
+    """
+    A size-bounded, expiring JSON cache stored in one SQLite file.
+    
+    Every write is a single transaction, so readers never see a half-written entry.
+    The database runs in WAL mode with a busy timeout, which lets several processes
+    read and write the same file concurrently. Entries are grouped by namespace; each
+    namespace has its own TTL and byte budget, and the least recently used entries
+    are evicted once the budget is exceeded.
+    
+    Attributes:
+        db_path (str): Path of the SQLite file.
+        namespace (str): Namespace that all keys of this store live in.
+        ttl_seconds (Optional[float]): Default entry lifetime, or None for no expiry.
+        max_bytes (Optional[int]): Byte budget for the namespace, or None for unbounded.
+    """
+    
+    def __init__(self,
+                 db_path: str = "cache/cache.sqlite",
+                 namespace: str = "default",
+                 ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = 64 * 1024 * 1024):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            db_path (str, optional): Path of the SQLite file. Defaults to "cache/cache.sqlite".
+            namespace (str, optional): Namespace for this store's keys. Defaults to "default".
+            ttl_seconds (Optional[float], optional): Default entry lifetime in seconds, or None
+                for entries that never expire. Defaults to None.
+            max_bytes (Optional[int], optional): Maximum total size of the namespace's values,
+                or None for no limit. Defaults to 64 MiB.
+        """
+        self.db_path = db_path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, expires_at REAL, last_access REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(namespace, last_access)")
+        
+        logger.info(f"Initialized CacheStore (db_path={db_path}, namespace={namespace})")
+    
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a single entry.
+        
+        Args:
+            key (str): The entry key.
+        
+        Returns:
+            Optional[Any]: The cached value, or None if missing or expired.
+        """
+        return self.get_many([key]).get(key)
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up several entries in one round trip.
+        
+        Args:
+            keys (Iterable[str]): The entry keys.
+        
+        Returns:
+            Dict[str, Any]: Values for the keys that were found and not expired.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        
+        now = time.time()
+        found = {}
+        
+        with self._lock:
+            try:
+                for start in range(0, len(keys), _MAX_BATCH):
+                    batch = keys[start:start + _MAX_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, value FROM entries WHERE namespace = ? AND key IN ({placeholders}) "
+                        "AND (expires_at IS NULL OR expires_at > ?)",
+                        (self.namespace, *batch, now)
+                    ).fetchall()
+                    
+                    for key, value in rows:
+                        try:
+                            found[key] = json.loads(value)
+                        except ValueError as e:
+                            logger.error(f"Discarding unreadable cache entry {key}: {e}")
+                    
+                    if rows:
+                        hit_keys = [key for key, _ in rows]
+                        self._db.execute(
+                            f"UPDATE entries SET last_access = ? WHERE namespace = ? "
+                            f"AND key IN ({','.join('?' * len(hit_keys))})",
+                            (now, self.namespace, *hit_keys)
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"Error reading from cache: {e}")
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        
+        return found
+    
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Store an entry, replacing any previous value, and enforce the byte budget.
+        
+        Args:
+            key (str): The entry key.
+            value (Any): A JSON-serializable value.
+            ttl_seconds (Optional[float], optional): Lifetime for this entry. Defaults to
+                the store's ttl_seconds.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Cannot cache value for {key}: {e}")
+            return
+        
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.namespace, key, payload, len(payload.encode()), expires_at, now)
+                    )
+                    self._evict(now)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logger.error(f"Error writing to cache: {e}")
+    
+    def delete(self, key: str) -> None:
+        """
+        Remove an entry if present.
+        
+        Args:
+            key (str): The entry key.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+    
+    def clear(self) -> None:
+        """
+        Remove every entry in this store's namespace.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit counters and the namespace's current size.
+        
+        Returns:
+            Dict[str, Any]: Hits, misses, entry count and total bytes.
+        """
+        with self._lock:
+            entries, total_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+        
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": total_bytes
+        }
+    
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired entries, then the least recently used ones beyond max_bytes.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        self._db.execute(
+            "DELETE FROM entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now)
+        )
+        
+        if self.max_bytes is None:
+            return
+        
+        # Keep the most recently used entries whose running size fits in the budget
+        self._db.execute(
+            "DELETE FROM entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running "
+            "FROM entries WHERE namespace = ?) WHERE running > ?)",
+            (self.namespace, self.namespace, self.max_bytes)
+        )
@@ -0,0 +1,257 @@
+"""
+api/llm_cache.py
+
+Two-tier cache for LLM completions. Identical requests (same provider, model, sampling
+parameters, system prompt and messages) are answered from an in-memory LRU or an
+on-disk SQLite store instead of going back to the provider.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CompletionCache:
+    """
+    Exact-match cache for LLM completions with an in-memory and an on-disk tier.
+    
+    Lookups check the in-memory LRU first, then SQLite; disk hits are promoted to
+    memory. Entries expire after a TTL, and each tier is bounded in size with
+    least-recently-used eviction. The SQLite file uses WAL mode so several worker
+    processes can share it.
+    
+    Attributes:
+        memory_size (int): Maximum number of entries kept in memory.
+        db_path (Optional[str]): Path of the SQLite file, or None for memory only.
+        ttl_seconds (float): Time after which an entry is no longer served.
+        max_disk_entries (int): Maximum number of entries kept on disk.
+        max_temperature (float): Calls sampled above this temperature are not cached
+            unless the caller explicitly opts in.
+        hits (int): Number of lookups answered from either tier.
+        misses (int): Number of lookups that went to the provider.
+    """
+    
+    def __init__(self,
+                 memory_size: int = 256,
+                 db_path: Optional[str] = "cache/llm_cache.sqlite",
+                 ttl_seconds: float = 7 * 24 * 3600,
+                 max_disk_entries: int = 10000,
+                 max_temperature: float = 0.3):
+        """
+        Initialize the completion cache.
+        
+        Args:
+            memory_size (int, optional): Maximum in-memory entries. Defaults to 256.
+            db_path (Optional[str], optional): SQLite file for the disk tier, or None to
+                keep the cache in memory only. Defaults to "cache/llm_cache.sqlite".
+            ttl_seconds (float, optional): Entry lifetime in seconds. Defaults to one week.
+            max_disk_entries (int, optional): Maximum on-disk entries. Defaults to 10000.
+            max_temperature (float, optional): Highest temperature cached by default.
+                Defaults to 0.3.
+        """
+        self.memory_size = memory_size
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.max_temperature = max_temperature
+        
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS completions_last_access ON completions(last_access)")
+            except sqlite3.Error as e:
+                logger.error(f"Error opening completion cache database, using memory only: {e}")
+                self._db = None
+        
+        logger.info(f"Initialized CompletionCache (memory_size={memory_size}, db_path={db_path if self._db else None})")
+    
+    def make_key(self, provider: str, request: Dict[str, Any]) -> str:
+        """
+        Build the cache key for a completion request.
+        
+        Args:
+            provider (str): The LLM provider name.
+            request (Dict[str, Any]): The provider-specific request arguments, including
+                model, sampling parameters, system prompt and messages.
+        
+        Returns:
+            str: A SHA-256 hex digest identifying the request.
+        """
+        payload = json.dumps({"provider": provider, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def should_cache(self, temperature: float, use_cache: Optional[bool] = None) -> bool:
+        """
+        Decide whether a call should go through the cache.
+        
+        Args:
+            temperature (float): The sampling temperature of the call.
+            use_cache (Optional[bool], optional): Explicit per-call choice. None means
+                cache only if temperature <= max_temperature.
+        
+        Returns:
+            bool: True if the call should be looked up and stored.
+        """
+        if use_cache is not None:
+            return use_cache
+        return temperature <= self.max_temperature
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached completion.
+        
+        Args:
+            key (str): Cache key from make_key().
+        
+        Returns:
+            Optional[str]: The cached completion text, or None on a miss.
+        """
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] > now:
+                        self._db.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+                        self._remember(key, row[1], row[0])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    logger.error(f"Error reading from completion cache: {e}")
+            
+            self.misses += 1
+            return None
+    
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a completion in both tiers.
+        
+        Args:
+            key (str): Cache key from make_key().
+            value (str): The completion text.
+        """
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        
+        with self._lock:
+            self._remember(key, expires_at, value)
+            
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO completions (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                        (key, value, expires_at, now)
+                    )
+                    self._evict_disk(now)
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing to completion cache: {e}")
+    
+    def clear(self) -> None:
+        """
+        Remove every entry from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache hit and miss counters.
+        
+        Returns:
+            Dict[str, Any]: Counters and the overall hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory)
+        }
+    
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        """
+        Insert an entry into the in-memory LRU, evicting the oldest if full.
+        
+        Must be called with the lock held.
+        """
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def _evict_disk(self, now: float) -> None:
+        """
+        Drop expired entries and trim the disk tier to max_disk_entries.
+        
+        Must be called with the lock held.
+        """
+        self._db.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+def create_completion_cache(cache_config: Optional[Dict[str, Any]]) -> Optional[CompletionCache]:
+    """
+    Build a CompletionCache from the "llm_cache" configuration section.
+    
+    Args:
+        cache_config (Optional[Dict[str, Any]]): The configuration section, or None.
+    
+    Returns:
+        Optional[CompletionCache]: The cache, or None if caching is disabled.
+    """
+    if not cache_config or not cache_config.get("enabled", False):
+        return None
+    
+    return CompletionCache(
+        memory_size=cache_config.get("memory_size", 256),
+        db_path=cache_config.get("db_path", "cache/llm_cache.sqlite"),
+        ttl_seconds=cache_config.get("ttl_seconds", 7 * 24 * 3600),
+        max_disk_entries=cache_config.get("max_disk_entries", 10000),
+        max_temperature=cache_config.get("max_temperature", 0.3)
+    )
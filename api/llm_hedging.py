@@ -0,0 +1,692 @@
+"""
+api/llm_hedging.py
+
+Hedged LLM requests. When the primary provider has not answered within a delay taken
+from a percentile of its recent latencies, the same request is sent to a secondary
+provider and whichever answers first is used, which cuts the tail latency caused by
+one slow completion.
+"""
+
+import math
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+from api.llm_cache import CompletionCache
+from api.llm_provider import ERROR_RESPONSE_PREFIX, AsyncLLMStream, LLMProvider, LLMStream
+from api.structured_output import StructuredOutputError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+class LatencyTracker:
+    """
+    Rolling window of latencies, used to derive the hedging delay.
+    
+    Attributes:
+        percentile (float): Percentile of the window used as the delay, between 0 and 100.
+        min_samples (int): Samples needed before the percentile replaces initial_delay.
+        initial_delay (float): Delay used until min_samples latencies are recorded.
+        min_delay (float): Lower bound of the delay.
+        max_delay (float): Upper bound of the delay.
+    """
+    
+    def __init__(self,
+                 percentile: float = 95,
+                 window: int = 200,
+                 min_samples: int = 20,
+                 initial_delay: float = 2.0,
+                 min_delay: float = 0.5,
+                 max_delay: float = 30.0):
+        """
+        Initialize the tracker.
+        
+        Args:
+            percentile (float, optional): Percentile used as the delay. Defaults to 95.
+            window (int, optional): Number of recent latencies kept. Defaults to 200.
+            min_samples (int, optional): Samples needed before the percentile is used. Defaults to 20.
+            initial_delay (float, optional): Delay in seconds until then. Defaults to 2.0.
+            min_delay (float, optional): Smallest delay in seconds. Defaults to 0.5.
+            max_delay (float, optional): Largest delay in seconds. Defaults to 30.0.
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency: float) -> None:
+        """
+        Add one latency in seconds to the window.
+        
+        Args:
+            latency (float): The observed latency.
+        """
+        with self._lock:
+            self._samples.append(latency)
+    
+    def delay(self) -> float:
+        """
+        Get the current hedging delay.
+        
+        Returns:
+            float: The configured percentile of the window (nearest rank), clamped to
+                [min_delay, max_delay], or initial_delay while the window is too small.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, self.min_samples):
+            delay = self.initial_delay
+        else:
+            rank = max(1, math.ceil(self.percentile / 100 * len(samples)))
+            delay = samples[rank - 1]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+class HedgedLLMProvider:
+    """
+    LLMProvider-compatible wrapper that hedges each request with a secondary provider.
+    
+    A request goes to the primary provider first. If it has produced nothing after the
+    hedging delay, or has already failed, the same request is sent to the secondary
+    provider. For generate() and agenerate() the first successful completion wins; for
+    stream() and astream() the first stream to produce a token wins and the other is
+    dropped, so deltas are never mixed. The loser is cancelled: async requests are
+    cancelled right away, while blocking requests are abandoned and their streams closed
+    at the next delta.
+    
+    Completions and streams keep separate latency windows, since the delay for a whole
+    completion is much longer than the delay for a first token. Only the primary's
+    latencies are recorded; when the primary loses, the time it had been running is
+    recorded as a lower bound of its latency.
+    
+    Attributes:
+        primary (LLMProvider): Provider every request goes to first.
+        secondary (LLMProvider): Provider of the hedged requests.
+        completion_latency (LatencyTracker): Primary completion latencies.
+        first_token_latency (LatencyTracker): Primary time to first streamed token.
+    """
+    
+    def __init__(self,
+                 primary: LLMProvider,
+                 secondary: LLMProvider,
+                 completion_latency: Optional[LatencyTracker] = None,
+                 first_token_latency: Optional[LatencyTracker] = None):
+        """
+        Initialize the hedged provider.
+        
+        Args:
+            primary (LLMProvider): Provider every request goes to first.
+            secondary (LLMProvider): Provider of the hedged requests.
+            completion_latency (Optional[LatencyTracker], optional): Tracker for the delay of
+                generate() and agenerate(). Defaults to a LatencyTracker with default settings.
+            first_token_latency (Optional[LatencyTracker], optional): Tracker for the delay of
+                stream() and astream(). Defaults to a LatencyTracker with default settings.
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.completion_latency = completion_latency or LatencyTracker()
+        self.first_token_latency = first_token_latency or LatencyTracker()
+        
+        self._stats = {"requests": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0}
+        self._stats_lock = threading.Lock()
+        
+        logger.info(f"Initialized HedgedLLMProvider ({primary.provider}/{primary.model} "
+                    f"hedged with {secondary.provider}/{secondary.model})")
+    
+    @property
+    def provider(self) -> str:
+        """
+        The primary provider name.
+        """
+        return self.primary.provider
+    
+    @property
+    def model(self) -> str:
+        """
+        The primary model name.
+        """
+        return self.primary.model
+    
+    @property
+    def temperature(self) -> float:
+        """
+        The primary sampling temperature.
+        """
+        return self.primary.temperature
+    
+    @property
+    def max_tokens(self) -> int:
+        """
+        The primary completion token limit.
+        """
+        return self.primary.max_tokens
+    
+    @property
+    def cache(self) -> Optional[CompletionCache]:
+        """
+        The primary provider's completion cache.
+        """
+        return self.primary.cache
+    
+    def generate(self,
+                 system_prompt: str,
+                 user_prompt: str,
+                 conversation_history: Optional[List[Dict[str, str]]] = None,
+                 use_cache: Optional[bool] = None,
+                 cache_prompt: bool = False) -> str:
+        """
+        Generate a response, hedging with the secondary provider if the primary is slow.
+        
+        Takes the same arguments and returns the same result as LLMProvider.generate().
+        """
+        return self._hedge_completion(
+            lambda llm: llm.generate(system_prompt, user_prompt, conversation_history, use_cache, cache_prompt),
+            self._is_error
+        )
+    
+    async def agenerate(self,
+                        system_prompt: str,
+                        user_prompt: str,
+                        conversation_history: Optional[List[Dict[str, str]]] = None,
+                        use_cache: Optional[bool] = None,
+                        cache_prompt: bool = False) -> str:
+        """
+        Async counterpart of generate(); the losing request is cancelled.
+        
+        Takes the same arguments and returns the same result as LLMProvider.agenerate().
+        """
+        return await self._ahedge_completion(
+            lambda llm: llm.agenerate(system_prompt, user_prompt, conversation_history, use_cache, cache_prompt),
+            self._is_error
+        )
+    
+    def generate_json(self,
+                      system_prompt: str,
+                      user_prompt: str,
+                      schema: Dict[str, Any],
+                      name: str = "response",
+                      conversation_history: Optional[List[Dict[str, str]]] = None,
+                      use_cache: Optional[bool] = None,
+                      cache_prompt: bool = False) -> Any:
+        """
+        Generate a structured response, hedging with the secondary provider if the primary is slow.
+        
+        Takes the same arguments and returns the same result as LLMProvider.generate_json().
+        
+        Raises:
+            StructuredOutputError: If neither provider produced a valid response.
+        """
+        def call(llm: LLMProvider) -> Any:
+            try:
+                return llm.generate_json(system_prompt, user_prompt, schema, name,
+                                         conversation_history, use_cache, cache_prompt)
+            except StructuredOutputError as e:
+                return e
+        
+        result = self._hedge_completion(call, lambda result: isinstance(result, StructuredOutputError))
+        if isinstance(result, StructuredOutputError):
+            raise result
+        return result
+    
+    async def agenerate_json(self,
+                             system_prompt: str,
+                             user_prompt: str,
+                             schema: Dict[str, Any],
+                             name: str = "response",
+                             conversation_history: Optional[List[Dict[str, str]]] = None,
+                             use_cache: Optional[bool] = None,
+                             cache_prompt: bool = False) -> Any:
+        """
+        Async counterpart of generate_json(); the losing request is cancelled.
+        
+        Raises:
+            StructuredOutputError: If neither provider produced a valid response.
+        """
+        async def call(llm: LLMProvider) -> Any:
+            try:
+                return await llm.agenerate_json(system_prompt, user_prompt, schema, name,
+                                                conversation_history, use_cache, cache_prompt)
+            except StructuredOutputError as e:
+                return e
+        
+        result = await self._ahedge_completion(call, lambda result: isinstance(result, StructuredOutputError))
+        if isinstance(result, StructuredOutputError):
+            raise result
+        return result
+    
+    def _hedge_completion(self, call: Callable[[LLMProvider], Any], is_error: Callable[[Any], bool]) -> Any:
+        """
+        Run a blocking completion on the primary, hedging it with the secondary.
+        
+        Args:
+            call (Callable[[LLMProvider], Any]): Runs the completion on a provider. An
+                exception it raises counts as a failed result.
+            is_error (Callable[[Any], bool]): Whether a result is a failure.
+            
+        Returns:
+            Any: The first successful result, or the last failure if both failed.
+        
+        Raises:
+            Exception: Whatever the last call raised, if both providers failed and the
+                last one raised.
+        """
+        events = queue.Queue()
+        
+        def run(name: str, llm: LLMProvider) -> None:
+            # The coordinator waits on the queue, so every outcome must be posted to it
+            try:
+                events.put((name, call(llm), None))
+            except Exception as e:
+                logger.warning(f"Hedged {name} request failed: {e}")
+                events.put((name, None, e))
+        
+        def launch(name: str, llm: LLMProvider) -> None:
+            self._start_thread(name, lambda: run(name, llm))
+        
+        start = time.monotonic()
+        delay = self.completion_latency.delay()
+        launch(PRIMARY, self.primary)
+        running = {PRIMARY}
+        hedged = False
+        
+        while True:
+            try:
+                name, result, error = events.get(timeout=None if hedged else self._remaining(start, delay))
+            except queue.Empty:
+                hedged = self._hedge()
+                launch(SECONDARY, self.secondary)
+                running.add(SECONDARY)
+                continue
+            
+            running.discard(name)
+            if name == PRIMARY:
+                self.completion_latency.record(time.monotonic() - start)
+            failed = error is not None or is_error(result)
+            if not failed or (hedged and not running):
+                break
+            if not hedged:
+                hedged = self._hedge()
+                launch(SECONDARY, self.secondary)
+                running.add(SECONDARY)
+        
+        if PRIMARY in running:
+            self.completion_latency.record(time.monotonic() - start)
+        self._record_result(name)
+        if error is not None:
+            raise error
+        return result
+    
+    async def _ahedge_completion(self, call: Callable[[LLMProvider], Awaitable[Any]],
+                                 is_error: Callable[[Any], bool]) -> Any:
+        """
+        Async counterpart of _hedge_completion(); the losing request is cancelled.
+        """
+        tasks = {}
+        
+        def launch(name: str, llm: LLMProvider) -> None:
+            tasks[asyncio.ensure_future(call(llm))] = name
+        
+        start = time.monotonic()
+        delay = self.completion_latency.delay()
+        launch(PRIMARY, self.primary)
+        hedged = False
+        
+        try:
+            while True:
+                done, _ = await asyncio.wait(tasks, timeout=None if hedged else self._remaining(start, delay),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = self._hedge()
+                    launch(SECONDARY, self.secondary)
+                    continue
+                
+                # Prefer the primary when both finished at once
+                for task in sorted(done, key=lambda task: tasks[task] != PRIMARY):
+                    name, error = tasks.pop(task), task.exception()
+                    result = task.result() if error is None else None
+                    if error is not None:
+                        logger.warning(f"Hedged {name} request failed: {error}")
+                    if name == PRIMARY:
+                        self.completion_latency.record(time.monotonic() - start)
+                    failed = error is not None or is_error(result)
+                    if not failed:
+                        break
+                if not failed or (hedged and not tasks):
+                    break
+                if not hedged:
+                    hedged = self._hedge()
+                    launch(SECONDARY, self.secondary)
+        finally:
+            if PRIMARY in tasks.values():
+                self.completion_latency.record(time.monotonic() - start)
+            await self._acancel(list(tasks))
+        
+        self._record_result(name)
+        if error is not None:
+            raise error
+        return result
+    
+    def stream(self,
+               system_prompt: str,
+               user_prompt: str,
+               conversation_history: Optional[List[Dict[str, str]]] = None,
+               cache_prompt: bool = False) -> LLMStream:
+        """
+        Stream a response from whichever provider produces the first token.
+        
+        Takes the same arguments as LLMProvider.stream(). The returned stream's usage and
+        finish_reason are those of the winning provider.
+        """
+        def deltas(result: LLMStream) -> Iterator[str]:
+            events = queue.Queue()
+            streams = {}
+            cancelled = {PRIMARY: threading.Event(), SECONDARY: threading.Event()}
+            
+            def launch(name: str, llm: LLMProvider) -> None:
+                streams[name] = llm.stream(system_prompt, user_prompt, conversation_history, cache_prompt)
+                self._start_thread(name, lambda: self._pump(events, name, streams[name], cancelled[name]))
+            
+            start = time.monotonic()
+            delay = self.first_token_latency.delay()
+            launch(PRIMARY, self.primary)
+            hedged = False
+            ended = set()
+            errors = {}
+            winner, first = None, None
+            
+            try:
+                while winner is None:
+                    try:
+                        name, delta = events.get(timeout=None if hedged else self._remaining(start, delay))
+                    except queue.Empty:
+                        hedged = self._hedge()
+                        launch(SECONDARY, self.secondary)
+                        continue
+                    
+                    if name in ended:
+                        continue
+                    if name == PRIMARY:
+                        self.first_token_latency.record(time.monotonic() - start)
+                    if delta is not None and streams[name].finish_reason != "error":
+                        winner, first = name, delta
+                        break
+                    
+                    # The stream failed or ended without a token
+                    ended.add(name)
+                    if delta is not None:
+                        errors[name] = delta
+                    if not hedged:
+                        hedged = self._hedge()
+                        launch(SECONDARY, self.secondary)
+                    elif ended == set(streams):
+                        winner, first = name, errors.get(name)
+                
+                for name in streams:
+                    if name != winner:
+                        cancelled[name].set()
+                if PRIMARY not in ended and winner != PRIMARY:
+                    self.first_token_latency.record(time.monotonic() - start)
+                self._record_result(winner)
+                
+                if first is not None:
+                    yield first
+                while winner not in ended:
+                    name, delta = events.get()
+                    if name != winner:
+                        continue
+                    if delta is None:
+                        break
+                    yield delta
+                
+                result.usage = streams[winner].usage
+                result.finish_reason = streams[winner].finish_reason
+            finally:
+                for event in cancelled.values():
+                    event.set()
+        
+        return LLMStream(deltas)
+    
+    def astream(self,
+                system_prompt: str,
+                user_prompt: str,
+                conversation_history: Optional[List[Dict[str, str]]] = None,
+                cache_prompt: bool = False) -> AsyncLLMStream:
+        """
+        Async counterpart of stream(); the losing stream is cancelled and closed.
+        
+        Takes the same arguments as LLMProvider.astream().
+        """
+        async def deltas(result: AsyncLLMStream) -> AsyncIterator[str]:
+            streams = {}
+            iterators = {}
+            tasks = {}
+            
+            def launch(name: str, llm: LLMProvider) -> None:
+                streams[name] = llm.astream(system_prompt, user_prompt, conversation_history, cache_prompt)
+                iterators[name] = streams[name].__aiter__()
+                tasks[asyncio.ensure_future(self._anext(iterators[name]))] = name
+            
+            start = time.monotonic()
+            delay = self.first_token_latency.delay()
+            launch(PRIMARY, self.primary)
+            hedged = False
+            ended = set()
+            errors = {}
+            winner, first = None, None
+            
+            try:
+                while winner is None:
+                    done, _ = await asyncio.wait(tasks, timeout=None if hedged else self._remaining(start, delay),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        hedged = self._hedge()
+                        launch(SECONDARY, self.secondary)
+                        continue
+                    
+                    for task in sorted(done, key=lambda task: tasks[task] != PRIMARY):
+                        name, delta = tasks.pop(task), task.result()
+                        if name == PRIMARY:
+                            self.first_token_latency.record(time.monotonic() - start)
+                        if delta is not None and streams[name].finish_reason != "error":
+                            winner, first = name, delta
+                            break
+                        
+                        # The stream failed or ended without a token
+                        ended.add(name)
+                        if delta is not None:
+                            errors[name] = delta
+                    
+                    if winner is None and not hedged:
+                        hedged = self._hedge()
+                        launch(SECONDARY, self.secondary)
+                    elif winner is None and not tasks:
+                        winner, first = name, errors.get(name)
+                
+                if PRIMARY in tasks.values():
+                    self.first_token_latency.record(time.monotonic() - start)
+                await self._acancel(list(tasks))
+                tasks.clear()
+                for name, iterator in iterators.items():
+                    if name != winner:
+                        await iterator.aclose()
+                self._record_result(winner)
+                
+                if first is not None:
+                    yield first
+                if winner not in ended:
+                    async for delta in iterators[winner]:
+                        yield delta
+                
+                result.usage = streams[winner].usage
+                result.finish_reason = streams[winner].finish_reason
+            finally:
+                await self._acancel(list(tasks))
+                for iterator in iterators.values():
+                    await iterator.aclose()
+        
+        return AsyncLLMStream(deltas)
+    
+    def usage_stats(self) -> Dict[str, Any]:
+        """
+        Get the token usage of both providers combined.
+        
+        Returns:
+            Dict[str, Any]: The same counters as LLMProvider.usage_stats(), summed.
+        """
+        primary, secondary = self.primary.usage_stats(), self.secondary.usage_stats()
+        usage = {key: primary[key] + secondary[key] for key in primary if key != "cache_read_rate"}
+        usage["cache_read_rate"] = usage["cache_read_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0
+        return usage
+    
+    def hedge_stats(self) -> Dict[str, Any]:
+        """
+        Get hedging counters, for tuning the delay.
+        
+        Returns:
+            Dict[str, Any]: Requests, hedged requests, wins per provider, the share of
+                requests that were hedged, the share of hedged requests the secondary won,
+                and the current delays in seconds.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["hedge_rate"] = stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+        stats["secondary_win_rate"] = stats["secondary_wins"] / stats["hedged"] if stats["hedged"] else 0.0
+        stats["completion_delay"] = self.completion_latency.delay()
+        stats["first_token_delay"] = self.first_token_latency.delay()
+        return stats
+    
+    def _hedge(self) -> bool:
+        """
+        Count and log a hedged request.
+        
+        Returns:
+            bool: True, for the caller's hedged flag.
+        """
+        with self._stats_lock:
+            self._stats["hedged"] += 1
+        logger.info(f"Hedging request with {self.secondary.provider} model {self.secondary.model}")
+        return True
+    
+    def _record_result(self, winner: str) -> None:
+        """
+        Count a finished request and its winner.
+        """
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats[f"{winner}_wins"] += 1
+    
+    def _start_thread(self, name: str, target: Callable[[], None]) -> None:
+        """
+        Run a blocking call in a daemon thread, so an abandoned call never holds up the caller.
+        """
+        threading.Thread(target=target, name=f"llm-hedge-{name}", daemon=True).start()
+    
+    def _pump(self, events: queue.Queue, name: str, stream: LLMStream, cancelled: threading.Event) -> None:
+        """
+        Forward a blocking stream's deltas to the event queue, ending with None.
+        """
+        iterator = iter(stream)
+        try:
+            for delta in iterator:
+                if cancelled.is_set():
+                    break
+                events.put((name, delta))
+        finally:
+            iterator.close()
+            events.put((name, None))
+    
+    async def _anext(self, iterator: AsyncIterator[str]) -> Optional[str]:
+        """
+        Get the next delta of an async stream, or None once it has ended.
+        """
+        try:
+            return await iterator.__anext__()
+        except StopAsyncIteration:
+            return None
+    
+    async def _acancel(self, tasks: List[asyncio.Future]) -> None:
+        """
+        Cancel tasks and wait until they have finished.
+        """
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _remaining(self, start: float, delay: float) -> float:
+        """
+        Get the time left before a request started at start should be hedged.
+        """
+        return max(0.0, start + delay - time.monotonic())
+    
+    def _is_error(self, text: Optional[str]) -> bool:
+        """
+        Check whether a completion is the error message LLMProvider returns on failure.
+        """
+        return not text or text.startswith(ERROR_RESPONSE_PREFIX)
+
+def create_hedged_provider(primary: LLMProvider,
+                           hedging_config: Optional[Dict[str, Any]],
+                           cache: Optional[CompletionCache] = None):
+    """
+    Wrap a provider for hedging as configured in the "llm.hedging" section.
+    
+    The secondary provider takes its provider and model from the section and every other
+    setting from the primary unless the section overrides it.
+    
+    Args:
+        primary (LLMProvider): The configured provider.
+        hedging_config (Optional[Dict[str, Any]]): The hedging configuration section, or None.
+        cache (Optional[CompletionCache], optional): Completion cache for the secondary provider.
+            Defaults to None.
+    
+    Returns:
+        HedgedLLMProvider, or the primary provider itself if hedging is disabled or the
+        secondary provider cannot be created.
+    """
+    if not hedging_config or not hedging_config.get("enabled", False):
+        return primary
+    
+    try:
+        secondary = LLMProvider(
+            provider=hedging_config.get("provider", primary.provider),
+            model=hedging_config.get("model", primary.model),
+            temperature=hedging_config.get("temperature", primary.temperature),
+            max_tokens=hedging_config.get("max_tokens", primary.max_tokens),
+            max_connections=primary.max_connections,
+            prompt_caching=primary.prompt_caching,
+            cache=cache,
+            rate_limiter=primary.rate_limiter,
+            priority=primary.priority,
+            structured_output=hedging_config.get("structured_output", primary.structured_output),
+            max_json_repairs=primary.max_json_repairs
+        )
+    except ValueError as e:
+        logger.error(f"Error creating the hedging provider, hedging disabled: {e}")
+        return primary
+    
+    def tracker(initial_delay: float) -> LatencyTracker:
+        return LatencyTracker(
+            percentile=hedging_config.get("delay_percentile", 95),
+            window=hedging_config.get("window", 200),
+            min_samples=hedging_config.get("min_samples", 20),
+            initial_delay=initial_delay,
+            min_delay=hedging_config.get("min_delay_seconds", 0.5),
+            max_delay=hedging_config.get("max_delay_seconds", 30.0)
+        )
+    
+    return HedgedLLMProvider(
+        primary,
+        secondary,
+        completion_latency=tracker(hedging_config.get("initial_completion_delay_seconds", 15.0)),
+        first_token_latency=tracker(hedging_config.get("initial_first_token_delay_seconds", 2.0))
+    )
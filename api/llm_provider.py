@@ -6,11 +6,23 @@ It currently supports OpenAI and Anthropic APIs with configurable parameters.
 """
 
 import os
+import re
+import json
+import time
+import random
+import httpx
 import openai
+import asyncio
 import logging
+import weakref
+import threading
 import anthropic
+import contextlib
+from api.llm_cache import CompletionCache
+from api.rate_limiter import RateLimiter, RateLimitSlot, is_rate_limit_error, response_headers
+from api.structured_output import StructuredOutputError, drop_optional_nulls, parse_json, strict_schema, validate_json
 from dotenv import load_dotenv
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, List, Optional, Tuple
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +30,141 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Start of the text returned (or streamed) in place of a completion when a request fails
+ERROR_RESPONSE_PREFIX = "I apologize, but I'm having difficulty generating a response at the moment."
+
+# Property that holds the value of a structured response whose schema is not an object
+STRUCTURED_RESULT_KEY = "result"
+
+# Request parameters, and words in a 400 error's message, showing the model rejected structured output
+STRUCTURED_OUTPUT_PARAMS = ("response_format", "tools", "tool_choice")
+STRUCTURED_OUTPUT_ERROR_PATTERN = re.compile(r"response_format|json_schema|tool_choice|\btools?\b", re.IGNORECASE)
+
+# Statuses retried besides 5xx (which includes Anthropic's 529 "overloaded"), as the SDKs do
+RETRY_STATUSES = {408, 409}
+
+# SDK errors raised when a request got no response at all
+RETRY_ERROR_TYPES = ("APIConnectionError", "APITimeoutError")
+
+# Exponential backoff with full jitter between retries of transient errors, in seconds
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+
+JSON_REPAIR_SYSTEM_PROMPT = """
+You repair JSON. Return the given JSON corrected so that it matches the given schema,
+changing as little as possible. Provide only the JSON, with no additional text.
+"""
+
+# One pooled async HTTP client per event loop, shared by every LLMProvider
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def get_async_http_client(max_connections: int = 20, max_keepalive_connections: int = 10) -> httpx.AsyncClient:
+    """
+    Get the shared, connection-pooled async HTTP client for the running event loop.
+    
+    The client is created on first use and reused by all async SDK clients on the
+    same loop, so keep-alive connections to the LLM providers are shared across
+    concurrent requests instead of being opened per call.
+    
+    Args:
+        max_connections (int, optional): Upper bound on open connections. Defaults to 20.
+        max_keepalive_connections (int, optional): Idle connections kept alive for reuse. Defaults to 10.
+        
+    Returns:
+        httpx.AsyncClient: The pooled client bound to the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            )
+        )
+        _async_http_clients[loop] = client
+        logger.info(f"Created pooled async HTTP client (max_connections={max_connections})")
+    return client
+
+async def aclose_http_clients() -> None:
+    """
+    Close the pooled async HTTP client of the running event loop, if any.
+    
+    Intended to be called on application shutdown.
+    """
+    client = _async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+class LLMStream:
+    """
+    Iterable over the text deltas of a streamed completion.
+    
+    Iterating yields text as the model produces it. Once iteration finishes, the
+    full text, token usage and finish reason are available as attributes.
+    
+    Attributes:
+        text (str): The complete generated text, set when the stream is exhausted.
+        usage (Dict[str, int]): Token counts with 'input_tokens', 'output_tokens',
+            'cache_read_tokens' and 'cache_write_tokens' keys.
+        finish_reason (Optional[str]): The provider's stop reason (e.g. "end_turn", "stop",
+            "max_tokens", "length"), or "error" if the request failed.
+    """
+    
+    def __init__(self, deltas: Callable[["LLMStream"], Iterator[str]]):
+        """
+        Initialize the stream.
+        
+        Args:
+            deltas: Generator function that yields text deltas and records usage and
+                    finish reason on the stream it is given.
+        """
+        self._deltas = deltas
+        self.text = ""
+        self.usage = {}
+        self.finish_reason = None
+    
+    @property
+    def truncated(self) -> bool:
+        """
+        Whether the completion stopped because it hit the max_tokens limit.
+        """
+        return self.finish_reason in ("max_tokens", "length")
+    
+    def __iter__(self) -> Iterator[str]:
+        chunks = []
+        for delta in self._deltas(self):
+            chunks.append(delta)
+            yield delta
+        self.text = "".join(chunks)
+
+class AsyncLLMStream(LLMStream):
+    """
+    Async iterable over the text deltas of a streamed completion.
+    
+    Async counterpart of LLMStream with the same attributes.
+    """
+    
+    def __init__(self, deltas: Callable[["AsyncLLMStream"], AsyncIterator[str]]):
+        """
+        Initialize the stream.
+        
+        Args:
+            deltas: Async generator function that yields text deltas and records usage
+                    and finish reason on the stream it is given.
+        """
+        super().__init__(deltas)
+    
+    def __iter__(self):
+        raise TypeError("AsyncLLMStream must be consumed with 'async for'")
+    
+    async def __aiter__(self) -> AsyncIterator[str]:
+        chunks = []
+        async for delta in self._deltas(self):
+            chunks.append(delta)
+            yield delta
+        self.text = "".join(chunks)
+
 class LLMProvider:
     """
     Interface for interacting with different LLM providers.
@@ -31,10 +178,22 @@ class LLMProvider:
         model (str): The specific model to use (e.g., "gpt-4", "claude-3-5-sonnet-latest").
         temperature (float): Controls randomness in generation. Higher values mean more random completions.
         max_tokens (int): Maximum number of tokens to generate in the response.
+        max_connections (int): Size of the shared async connection pool.
+        prompt_caching (bool): Whether calls made with cache_prompt=True mark the system
+            prompt as a cacheable prefix.
+        rate_limiter (Optional[RateLimiter]): Limiter shared by all providers, or None.
+        priority (Optional[str]): Rate limiter priority class of this provider's requests,
+            or None for the limiter's default.
+        structured_output (bool): Whether generate_json() has the provider enforce the schema.
+        max_json_repairs (int): Repair calls generate_json() may make for invalid output.
         client: The initialized API client for the selected provider.
     """
     
-    def __init__(self, provider: str, model: str, temperature: float = 0.7, max_tokens: int = 4000):
+    def __init__(self, provider: str, model: str, temperature: float = 0.7, max_tokens: int = 4000,
+                 max_connections: int = 20, cache: Optional[CompletionCache] = None,
+                 prompt_caching: bool = True, rate_limiter: Optional[RateLimiter] = None,
+                 priority: Optional[str] = None, structured_output: bool = True,
+                 max_json_repairs: int = 1):
         """
         Initialize the LLM provider interface.
         
@@ -43,6 +202,20 @@ class LLMProvider:
             model (str): The specific model to use (e.g., "gpt-4", "claude-3-5-sonnet-latest").
             temperature (float, optional): Controls randomness in generation. Defaults to 0.7.
             max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 4000.
+            max_connections (int, optional): Maximum connections in the async HTTP pool. Defaults to 20.
+            cache (Optional[CompletionCache], optional): Cache used by generate() and agenerate()
+                to answer repeated requests. Defaults to None (no caching).
+            prompt_caching (bool, optional): Whether calls made with cache_prompt=True mark the
+                system prompt as a cacheable prefix for the provider's prompt cache. Defaults to True.
+            rate_limiter (Optional[RateLimiter], optional): Limiter that every request waits on,
+                and retries 429 responses through. Defaults to None (no limiting).
+            priority (Optional[str], optional): Priority class under which requests queue in the
+                rate limiter, e.g. "interactive", "batch" or "eval". Defaults to None (the
+                limiter's default class).
+            structured_output (bool, optional): Whether generate_json() uses OpenAI's json_schema
+                response format or Anthropic's forced tool use. Defaults to True.
+            max_json_repairs (int, optional): Repair calls generate_json() may make when the output
+                is invalid. Defaults to 1.
             
         Raises:
             ValueError: If an unsupported provider is specified.
@@ -51,6 +224,26 @@ class LLMProvider:
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.max_connections = max_connections
+        self.cache = cache
+        self.prompt_caching = prompt_caching
+        self.rate_limiter = rate_limiter
+        self.priority = priority
+        self.structured_output = structured_output
+        self.max_json_repairs = max_json_repairs
+        
+        # Token usage of every completed request, including prompt cache reads and writes
+        self._usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0,
+                       "cache_read_tokens": 0, "cache_write_tokens": 0}
+        self._usage_lock = threading.Lock()
+        
+        # With a rate limiter the SDK must not retry 429s itself, or the limiter never sees them.
+        # Its retries are turned off and _retry_delay() retries 429s and transient errors instead.
+        self._client_options = {"max_retries": 0} if rate_limiter is not None else {}
+        
+        # Async client is created lazily on the event loop that first uses it
+        self._async_client = None
+        self._async_client_loop = None
         
         logger.info(f"Initializing LLMProvider with provider={provider}, model={model}")
         
@@ -60,22 +253,211 @@ class LLMProvider:
             if not api_key:
                 logger.warning("ANTHROPIC_API_KEY not found in environment variables")
                 
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.api_key = api_key
+            self.client = anthropic.Anthropic(api_key=api_key, **self._client_options)
             
         elif self.provider == "openai":
             api_key = os.environ.get("OPENAI_API_KEY")
             if not api_key:
                 logger.warning("OPENAI_API_KEY not found in environment variables")
                 
-            self.client = openai.OpenAI(api_key=api_key)
+            self.api_key = api_key
+            self.client = openai.OpenAI(api_key=api_key, **self._client_options)
         else:
             logger.error(f"Unsupported LLM provider: {provider}")
             raise ValueError(f"Unsupported LLM provider: {provider}")
     
+    def _build_request(self,
+                       system_prompt: str,
+                       user_prompt: str,
+                       conversation_history: Optional[List[Dict[str, str]]] = None,
+                       cache_prompt: bool = False) -> Dict[str, Any]:
+        """
+        Build the provider-specific keyword arguments for a completion request.
+        
+        The system prompt always comes first, so requests sharing it share a stable prefix
+        that OpenAI caches automatically. Anthropic caches only marked prefixes, so with
+        cache_prompt the system prompt is sent as a block with cache_control.
+        
+        Args:
+            system_prompt (str): The system instructions or context to guide the model's behavior.
+            user_prompt (str): The user's input or query.
+            conversation_history (Optional[List[Dict[str, str]]], optional): 
+                Previous messages in the conversation. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix worth
+                caching. Defaults to False.
+                
+        Returns:
+            Dict[str, Any]: Keyword arguments for the SDK's create call.
+        """
+        if conversation_history is None:
+            conversation_history = []
+        
+        if self.provider == "anthropic":
+            messages = []
+            
+            # Add conversation history
+            for message in conversation_history:
+                messages.append(message)
+            
+            # Add user message
+            messages.append({"role": "user", "content": user_prompt})
+            
+            system = system_prompt
+            if cache_prompt and self.prompt_caching:
+                system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            
+            return {
+                "model": self.model,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "system": system,
+                "messages": messages
+            }
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history
+        for message in conversation_history:
+            messages.append(message)
+        
+        # Add user message
+        messages.append({"role": "user", "content": user_prompt})
+        
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+    
+    def _cache_key(self, request: Dict[str, Any], use_cache: Optional[bool]) -> Optional[str]:
+        """
+        Get the completion cache key for a request, if the request should be cached.
+        
+        Args:
+            request (Dict[str, Any]): Keyword arguments from _build_request().
+            use_cache (Optional[bool]): Per-call override; None defers to the cache's
+                temperature threshold.
+                
+        Returns:
+            Optional[str]: The cache key, or None if caching is off for this call.
+        """
+        if self.cache is None or not self.cache.should_cache(self.temperature, use_cache):
+            return None
+        return self.cache.make_key(self.provider, request)
+    
+    def _get_async_client(self):
+        """
+        Get the async SDK client for the running event loop.
+        
+        The client wraps the shared pooled HTTP client and is rebuilt only if it
+        is used from a different event loop than the one it was created on.
+        
+        Returns:
+            The async Anthropic or OpenAI client.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            http_client = get_async_http_client(
+                max_connections=self.max_connections,
+                max_keepalive_connections=max(1, self.max_connections // 2)
+            )
+            if self.provider == "anthropic":
+                self._async_client = anthropic.AsyncAnthropic(
+                    api_key=self.api_key, http_client=http_client, **self._client_options
+                )
+            else:
+                self._async_client = openai.AsyncOpenAI(
+                    api_key=self.api_key, http_client=http_client, **self._client_options
+                )
+            self._async_client_loop = loop
+        return self._async_client
+    
+    def _rate_limit_slot(self, request: Dict[str, Any]):
+        """
+        Get the context that holds a request's rate limit capacity while it runs.
+        
+        Args:
+            request (Dict[str, Any]): Keyword arguments from _build_request().
+            
+        Returns:
+            Context manager yielding a RateLimitSlot; a no-op without a rate limiter.
+        """
+        if self.rate_limiter is None:
+            return contextlib.nullcontext(RateLimitSlot())
+        return self.rate_limiter.slot(self._rate_limit_key(), self._estimate_tokens(request), self.priority)
+    
+    def _arate_limit_slot(self, request: Dict[str, Any]):
+        """
+        Async counterpart of _rate_limit_slot(), used with 'async with'.
+        """
+        if self.rate_limiter is None:
+            return contextlib.nullcontext(RateLimitSlot())
+        return self.rate_limiter.aslot(self._rate_limit_key(), self._estimate_tokens(request), self.priority)
+    
+    def _rate_limit_key(self) -> str:
+        """
+        Get the key under which this provider and model share their rate limits.
+        """
+        return f"{self.provider}/{self.model}"
+    
+    def _estimate_tokens(self, request: Dict[str, Any]) -> float:
+        """
+        Estimate a request's tokens before sending it: roughly four characters per prompt
+        token, plus the whole completion budget.
+        """
+        prompt = json.dumps([request.get("system", ""), request["messages"]], default=str)
+        return len(prompt) / 4 + request["max_tokens"]
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Get how long to wait before sending a failed request again, if it may be retried.
+        
+        Only used with a rate limiter, which turns off the SDK's own retries. A rate
+        limited request is retried as soon as the limiter lets it through. Server errors,
+        timeouts and connection errors are retried after a backoff, honouring Retry-After.
+        
+        Args:
+            error (Exception): The error raised by the request.
+            attempt (int): Number of retries made so far.
+            
+        Returns:
+            Optional[float]: Seconds to sleep before retrying, or None to give up.
+        """
+        if self.rate_limiter is None or attempt >= self.rate_limiter.max_retries:
+            return None
+        
+        if is_rate_limit_error(error):
+            logger.warning(f"{self.provider} model {self.model} rate limited, retrying "
+                           f"({attempt + 1}/{self.rate_limiter.max_retries})")
+            return 0.0
+        
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            transient = status >= 500 or status in RETRY_STATUSES
+        else:
+            transient = any(cls.__name__ in RETRY_ERROR_TYPES for cls in type(error).__mro__)
+        if not transient:
+            return None
+        
+        delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
+        retry_after = response_headers(error).get("retry-after")
+        if retry_after:
+            try:
+                delay = min(float(retry_after), RETRY_BACKOFF_MAX)
+            except ValueError:
+                pass
+        logger.warning(f"{self.provider} model {self.model} request failed ({error}), retrying in "
+                       f"{delay:.2f}s ({attempt + 1}/{self.rate_limiter.max_retries})")
+        return delay
+    
     def generate(self, 
                  system_prompt: str, 
                  user_prompt: str, 
-                 conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+                 conversation_history: Optional[List[Dict[str, str]]] = None,
+                 use_cache: Optional[bool] = None,
+                 cache_prompt: bool = False) -> str:
         """
         Generate a response from the LLM.
         
@@ -85,6 +467,10 @@ class LLMProvider:
             conversation_history (Optional[List[Dict[str, str]]], optional): 
                 Previous messages in the conversation. Each message should be a dictionary 
                 with 'role' and 'content' keys. Defaults to None.
+            use_cache (Optional[bool], optional): Whether to serve and store this call through
+                the completion cache. None caches only low-temperature calls. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix to mark
+                for the provider's prompt cache. Defaults to False.
                 
         Returns:
             str: The generated response text from the LLM.
@@ -93,54 +479,676 @@ class LLMProvider:
             Exception: If there's an error during the API call, the error is logged and
                       an error message is returned.
         """
-        
-        if conversation_history is None:
-            conversation_history = []
-        
         logger.info(f"Generating response with {self.provider} model {self.model}")
         
         try:
-            if self.provider == "anthropic":
-                messages = []
-                
-                # Add conversation history
-                for message in conversation_history:
-                    messages.append(message)
-                
-                # Add user message
-                messages.append({"role": "user", "content": user_prompt})
-                
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    system=system_prompt,
-                    messages=messages
-                )
+            request = self._build_request(system_prompt, user_prompt, conversation_history, cache_prompt)
+            cache_key = self._cache_key(request, use_cache)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Serving response from completion cache")
+                    return cached
+            
+            text = self._response_text(self._complete(request))
+            
+            # Only successful completions are cached, never the error messages below
+            if cache_key is not None and text:
+                self.cache.set(cache_key, text)
+            return text
+        
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}", exc_info=True)
+            return f"{ERROR_RESPONSE_PREFIX} Error: {str(e)}"
+    
+    async def agenerate(self, 
+                        system_prompt: str, 
+                        user_prompt: str, 
+                        conversation_history: Optional[List[Dict[str, str]]] = None,
+                        use_cache: Optional[bool] = None,
+                        cache_prompt: bool = False) -> str:
+        """
+        Generate a response from the LLM without blocking the event loop.
+        
+        Async counterpart of generate() backed by the async SDK clients, which share
+        a bounded, keep-alive connection pool per event loop.
+        
+        Args:
+            system_prompt (str): The system instructions or context to guide the model's behavior.
+            user_prompt (str): The user's input or query.
+            conversation_history (Optional[List[Dict[str, str]]], optional): 
+                Previous messages in the conversation. Defaults to None.
+            use_cache (Optional[bool], optional): Whether to serve and store this call through
+                the completion cache. None caches only low-temperature calls. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix to mark
+                for the provider's prompt cache. Defaults to False.
                 
-                return response.content[0].text
+        Returns:
+            str: The generated response text from the LLM, or an error message on failure.
+        """
+        logger.info(f"Generating async response with {self.provider} model {self.model}")
+        
+        try:
+            request = self._build_request(system_prompt, user_prompt, conversation_history, cache_prompt)
+            cache_key = self._cache_key(request, use_cache)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Serving response from completion cache")
+                    return cached
+            
+            text = self._response_text(await self._acomplete(request))
+            
+            # Only successful completions are cached, never the error messages below
+            if cache_key is not None and text:
+                self.cache.set(cache_key, text)
+            return text
+        
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}", exc_info=True)
+            return f"{ERROR_RESPONSE_PREFIX} Error: {str(e)}"
+        
+    def generate_json(self,
+                      system_prompt: str,
+                      user_prompt: str,
+                      schema: Dict[str, Any],
+                      name: str = "response",
+                      conversation_history: Optional[List[Dict[str, str]]] = None,
+                      use_cache: Optional[bool] = None,
+                      cache_prompt: bool = False) -> Any:
+        """
+        Generate a response constrained to a JSON Schema and return it parsed.
+        
+        With structured_output on, the provider enforces the schema: OpenAI through a strict
+        json_schema response format, Anthropic by forcing a tool call whose input is the
+        schema. Models that reject either are switched to plain JSON prompts for the rest of
+        the provider's life. Output that still fails to parse or validate gets local repairs
+        (code fences, surrounding prose, trailing commas), then at most max_json_repairs
+        short repair calls that send only the broken output, the errors and the schema.
+        
+        Args:
+            system_prompt (str): The system instructions, which should describe the JSON expected.
+            user_prompt (str): The user's input or query.
+            schema (Dict[str, Any]): JSON Schema of the response. Schemas whose top level is not
+                an object are wrapped in one for the providers and unwrapped here.
+            name (str, optional): Name of the output, used as the tool or schema name.
+                Defaults to "response".
+            conversation_history (Optional[List[Dict[str, str]]], optional): 
+                Previous messages in the conversation. Defaults to None.
+            use_cache (Optional[bool], optional): Whether to serve and store this call through
+                the completion cache. None caches only low-temperature calls. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix to mark
+                for the provider's prompt cache. Defaults to False.
                 
-            elif self.provider == "openai":
-                messages = [{"role": "system", "content": system_prompt}]
+        Returns:
+            Any: The parsed response, valid against the schema.
+            
+        Raises:
+            StructuredOutputError: If the request fails or the output stays invalid after repair.
+        """
+        logger.info(f"Generating structured {name} with {self.provider} model {self.model}")
+        
+        rounds = self._structured_rounds(system_prompt, user_prompt, schema, name,
+                                         conversation_history, use_cache, cache_prompt)
+        try:
+            request = next(rounds)
+            while True:
+                try:
+                    response = self._complete(request)
+                except Exception as e:
+                    request = rounds.throw(e)
+                else:
+                    request = rounds.send(response)
+        except StopIteration as done:
+            return done.value
+    
+    async def agenerate_json(self,
+                             system_prompt: str,
+                             user_prompt: str,
+                             schema: Dict[str, Any],
+                             name: str = "response",
+                             conversation_history: Optional[List[Dict[str, str]]] = None,
+                             use_cache: Optional[bool] = None,
+                             cache_prompt: bool = False) -> Any:
+        """
+        Async counterpart of generate_json().
+        
+        Takes the same arguments and returns the same result.
+        
+        Raises:
+            StructuredOutputError: If the request fails or the output stays invalid after repair.
+        """
+        logger.info(f"Generating async structured {name} with {self.provider} model {self.model}")
+        
+        rounds = self._structured_rounds(system_prompt, user_prompt, schema, name,
+                                         conversation_history, use_cache, cache_prompt)
+        try:
+            request = next(rounds)
+            while True:
+                try:
+                    response = await self._acomplete(request)
+                except Exception as e:
+                    request = rounds.throw(e)
+                else:
+                    request = rounds.send(response)
+        except StopIteration as done:
+            return done.value
+    
+    def _structured_rounds(self,
+                           system_prompt: str,
+                           user_prompt: str,
+                           schema: Dict[str, Any],
+                           name: str,
+                           conversation_history: Optional[List[Dict[str, str]]],
+                           use_cache: Optional[bool],
+                           cache_prompt: bool) -> Generator[Dict[str, Any], Any, Any]:
+        """
+        Run the calls of generate_json() and agenerate_json().
+        
+        Yields each completion request and is sent back its response, or has the call's
+        error thrown in, so the sync and async callers only differ in how they make the call.
+        Covers the completion cache, the switch to JSON prompts for models that reject
+        structured output, and the repair calls.
+        
+        Returns:
+            Any: The parsed response, valid against the schema.
+            
+        Raises:
+            StructuredOutputError: If the request fails or the output stays invalid after repair.
+        """
+        def build() -> Dict[str, Any]:
+            return self._build_structured_request(system_prompt, user_prompt, schema, name,
+                                                  conversation_history, cache_prompt)
+        
+        request = build()
+        # The schema keeps structured results apart from plain completions of the same prompt
+        cache_key = self._cache_key({**request, "output_schema": schema}, use_cache)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving structured response from completion cache")
+                return json.loads(cached)
+        
+        try:
+            try:
+                output = self._structured_output((yield request))
+            except Exception as e:
+                if not self._disable_structured_output(e):
+                    raise
+                output = self._structured_output((yield build()))
+            
+            value, errors = self._check_structured_output(output, schema)
+            for attempt in range(self.max_json_repairs):
+                if not errors:
+                    break
+                logger.warning(f"Repairing structured {name} ({attempt + 1}/{self.max_json_repairs}): {errors[:3]}")
+                output = self._structured_output((yield self._build_repair_request(output, errors, schema, name)))
+                value, errors = self._check_structured_output(output, schema)
+        except Exception as e:
+            logger.error(f"Error generating structured {name}: {str(e)}", exc_info=True)
+            raise StructuredOutputError(f"Error generating structured {name}: {str(e)}") from e
+        
+        if errors:
+            raise StructuredOutputError(f"Invalid structured {name}: {'; '.join(errors[:5])}")
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, json.dumps(value))
+        return value
+    
+    def _complete(self, request: Dict[str, Any]) -> Any:
+        """
+        Send a completion request and record its usage.
+        
+        The request holds a rate limiter slot while it runs. Rate limited requests wait
+        for the limiter and are sent again, and transient errors are retried after a backoff.
+        
+        Args:
+            request (Dict[str, Any]): Keyword arguments for the SDK's create call.
+            
+        Returns:
+            The SDK's response object.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self._rate_limit_slot(request) as slot:
+                    if self.provider == "anthropic":
+                        raw = self.client.messages.with_raw_response.create(**request)
+                        response = raw.parse()
+                        usage = self._anthropic_usage(getattr(response, "usage", None))
+                    else:
+                        raw = self.client.chat.completions.with_raw_response.create(**request)
+                        response = raw.parse()
+                        usage = self._openai_usage(getattr(response, "usage", None))
+                    
+                    self._record_usage(usage)
+                    slot.used_tokens = self._total_tokens(usage)
+                    slot.headers = raw.headers
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+    
+    async def _acomplete(self, request: Dict[str, Any]) -> Any:
+        """
+        Async counterpart of _complete().
+        """
+        client = self._get_async_client()
+        
+        attempt = 0
+        while True:
+            try:
+                async with self._arate_limit_slot(request) as slot:
+                    if self.provider == "anthropic":
+                        raw = await client.messages.with_raw_response.create(**request)
+                        response = raw.parse()
+                        usage = self._anthropic_usage(getattr(response, "usage", None))
+                    else:
+                        raw = await client.chat.completions.with_raw_response.create(**request)
+                        response = raw.parse()
+                        usage = self._openai_usage(getattr(response, "usage", None))
+                    
+                    self._record_usage(usage)
+                    slot.used_tokens = self._total_tokens(usage)
+                    slot.headers = raw.headers
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    def _response_text(self, response: Any) -> str:
+        """
+        Get the text of a completion response.
+        """
+        if self.provider == "anthropic":
+            return response.content[0].text
+        return response.choices[0].message.content
+    
+    def _build_structured_request(self,
+                                  system_prompt: str,
+                                  user_prompt: str,
+                                  schema: Dict[str, Any],
+                                  name: str,
+                                  conversation_history: Optional[List[Dict[str, str]]] = None,
+                                  cache_prompt: bool = False) -> Dict[str, Any]:
+        """
+        Build a completion request whose output the provider constrains to a schema.
+        
+        Args:
+            system_prompt (str): The system instructions.
+            user_prompt (str): The user's input or query.
+            schema (Dict[str, Any]): JSON Schema of the response.
+            name (str): Name of the tool or response format.
+            conversation_history (Optional[List[Dict[str, str]]], optional): Previous messages.
+            cache_prompt (bool, optional): Whether to mark the system prompt for prompt caching.
+            
+        Returns:
+            Dict[str, Any]: Keyword arguments for the SDK's create call; a plain request
+                when structured_output is off.
+        """
+        request = self._build_request(system_prompt, user_prompt, conversation_history, cache_prompt)
+        if not self.structured_output:
+            return request
+        
+        # Both providers need an object at the top level
+        if schema.get("type") != "object":
+            schema = {"type": "object", "properties": {STRUCTURED_RESULT_KEY: schema}, "required": [STRUCTURED_RESULT_KEY]}
+        
+        if self.provider == "anthropic":
+            request["tools"] = [{
+                "name": name,
+                "description": f"Record the {name.replace('_', ' ')}.",
+                "input_schema": schema
+            }]
+            request["tool_choice"] = {"type": "tool", "name": name}
+        else:
+            request["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": name, "schema": strict_schema(schema), "strict": True}
+            }
+        return request
+    
+    def _build_repair_request(self, output: Any, errors: List[str], schema: Dict[str, Any], name: str) -> Dict[str, Any]:
+        """
+        Build a short, deterministic request that fixes invalid structured output.
+        
+        Only the broken output, its errors and the schema are sent, not the original prompt.
+        """
+        broken = output if isinstance(output, str) else json.dumps(output)
+        user_prompt = (
+            "The JSON below does not match its schema.\n\n"
+            "Errors:\n" + "\n".join(f"- {error}" for error in errors[:10]) + "\n\n"
+            f"Schema:\n{json.dumps(schema)}\n\n"
+            f"JSON:\n{broken}"
+        )
+        request = self._build_structured_request(JSON_REPAIR_SYSTEM_PROMPT, user_prompt, schema, name)
+        request["temperature"] = 0.0
+        return request
+    
+    def _structured_output(self, response: Any) -> Any:
+        """
+        Get the structured part of a response: the forced tool call's input for Anthropic,
+        else the response text.
+        """
+        if self.provider == "anthropic":
+            for block in response.content:
+                if getattr(block, "type", None) == "tool_use":
+                    return block.input
+            return "".join(getattr(block, "text", "") for block in response.content)
+        return response.choices[0].message.content
+    
+    def _check_structured_output(self, output: Any, schema: Dict[str, Any]) -> Tuple[Any, List[str]]:
+        """
+        Parse structured output, unwrap non-object schemas and validate it.
+        
+        Returns:
+            Tuple[Any, List[str]]: The value and its validation errors, empty if valid.
+        """
+        try:
+            value = parse_json(output) if isinstance(output, str) else output
+        except StructuredOutputError as e:
+            return None, [str(e)]
+        
+        if schema.get("type") != "object" and isinstance(value, dict) and STRUCTURED_RESULT_KEY in value:
+            value = value[STRUCTURED_RESULT_KEY]
+        value = drop_optional_nulls(value, schema)
+        return value, validate_json(value, schema)
+    
+    def _disable_structured_output(self, error: Exception) -> bool:
+        """
+        Turn structured output off if the model rejected it, so the call can be retried
+        with a plain JSON prompt.
+        
+        Only a 400 about the response format or tools counts as a rejection; other bad
+        requests, such as a prompt over the context length, leave structured output on.
+        
+        Args:
+            error (Exception): The error raised by a structured request.
+            
+        Returns:
+            bool: True if structured output was turned off and the request should be rebuilt.
+        """
+        if not self.structured_output or getattr(error, "status_code", None) != 400:
+            return False
+        about_format = (getattr(error, "param", None) in STRUCTURED_OUTPUT_PARAMS
+                        or STRUCTURED_OUTPUT_ERROR_PATTERN.search(str(error)))
+        if not about_format:
+            logger.warning(f"{self.provider} model {self.model} rejected a structured request: {error}")
+            return False
+        logger.warning(f"{self.provider} model {self.model} rejected structured output, "
+                       f"using JSON prompts instead: {error}")
+        self.structured_output = False
+        return True
+    
+    def stream(self, 
+               system_prompt: str, 
+               user_prompt: str, 
+               conversation_history: Optional[List[Dict[str, str]]] = None,
+               cache_prompt: bool = False) -> LLMStream:
+        """
+        Stream a response from the LLM as text deltas.
+        
+        Uses the providers' streaming APIs so callers can render or parse output as soon
+        as the model produces it. The request is sent when iteration starts.
+        
+        Args:
+            system_prompt (str): The system instructions or context to guide the model's behavior.
+            user_prompt (str): The user's input or query.
+            conversation_history (Optional[List[Dict[str, str]]], optional): 
+                Previous messages in the conversation. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix to mark
+                for the provider's prompt cache. Defaults to False.
                 
-                # Add conversation history
-                for message in conversation_history:
-                    messages.append(message)
+        Returns:
+            LLMStream: Iterable of text deltas; text, usage and finish_reason are set once
+                       it is exhausted. On error, the same apology message that generate()
+                       returns is yielded and finish_reason is "error".
+            
+        Example:
+            >>> stream = llm_provider.stream(system_prompt, user_prompt)
+            >>> for delta in stream:
+            ...     print(delta, end="", flush=True)
+            >>> print(stream.usage, stream.finish_reason)
+        """
+        def deltas(result: LLMStream) -> Iterator[str]:
+            logger.info(f"Streaming response with {self.provider} model {self.model}")
+            
+            try:
+                request = self._build_request(system_prompt, user_prompt, conversation_history, cache_prompt)
                 
-                # Add user message
-                messages.append({"role": "user", "content": user_prompt})
+                # A failed stream is retried only if it failed before yielding anything
+                attempt = 0
+                while True:
+                    started = False
+                    try:
+                        with self._rate_limit_slot(request) as slot:
+                            if self.provider == "anthropic":
+                                with self.client.messages.stream(**request) as stream:
+                                    slot.headers = response_headers(stream)
+                                    for text in stream.text_stream:
+                                        started = True
+                                        yield text
+                                    self._record_anthropic_final(result, stream.get_final_message())
+                                    
+                            elif self.provider == "openai":
+                                response = self.client.chat.completions.create(
+                                    **request, stream=True, stream_options={"include_usage": True}
+                                )
+                                slot.headers = response_headers(response)
+                                for chunk in response:
+                                    delta = self._record_openai_chunk(result, chunk)
+                                    if delta:
+                                        started = True
+                                        yield delta
+                            
+                            slot.used_tokens = self._total_tokens(result.usage)
+                        break
+                    except Exception as e:
+                        delay = None if started else self._retry_delay(e, attempt)
+                        if delay is None:
+                            raise
+                        time.sleep(delay)
+                        attempt += 1
+            
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+                result.finish_reason = "error"
+                yield f"{ERROR_RESPONSE_PREFIX} Error: {str(e)}"
+        
+        return LLMStream(deltas)
+    
+    def astream(self, 
+                system_prompt: str, 
+                user_prompt: str, 
+                conversation_history: Optional[List[Dict[str, str]]] = None,
+                cache_prompt: bool = False) -> AsyncLLMStream:
+        """
+        Stream a response from the LLM as text deltas without blocking the event loop.
+        
+        Async counterpart of stream(), consumed with 'async for'.
+        
+        Args:
+            system_prompt (str): The system instructions or context to guide the model's behavior.
+            user_prompt (str): The user's input or query.
+            conversation_history (Optional[List[Dict[str, str]]], optional): 
+                Previous messages in the conversation. Defaults to None.
+            cache_prompt (bool, optional): Whether the system prompt is a static prefix to mark
+                for the provider's prompt cache. Defaults to False.
                 
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens
-                )
+        Returns:
+            AsyncLLMStream: Async iterable of text deltas with the same end-of-stream
+                            attributes as LLMStream.
+        """
+        async def deltas(result: AsyncLLMStream) -> AsyncIterator[str]:
+            logger.info(f"Streaming response with {self.provider} model {self.model}")
+            
+            try:
+                request = self._build_request(system_prompt, user_prompt, conversation_history, cache_prompt)
+                client = self._get_async_client()
                 
-                return response.choices[0].message.content
+                # A failed stream is retried only if it failed before yielding anything
+                attempt = 0
+                while True:
+                    started = False
+                    try:
+                        async with self._arate_limit_slot(request) as slot:
+                            if self.provider == "anthropic":
+                                async with client.messages.stream(**request) as stream:
+                                    slot.headers = response_headers(stream)
+                                    async for text in stream.text_stream:
+                                        started = True
+                                        yield text
+                                    self._record_anthropic_final(result, await stream.get_final_message())
+                                    
+                            elif self.provider == "openai":
+                                response = await client.chat.completions.create(
+                                    **request, stream=True, stream_options={"include_usage": True}
+                                )
+                                slot.headers = response_headers(response)
+                                async for chunk in response:
+                                    delta = self._record_openai_chunk(result, chunk)
+                                    if delta:
+                                        started = True
+                                        yield delta
+                            
+                            slot.used_tokens = self._total_tokens(result.usage)
+                        break
+                    except Exception as e:
+                        delay = None if started else self._retry_delay(e, attempt)
+                        if delay is None:
+                            raise
+                        await asyncio.sleep(delay)
+                        attempt += 1
+            
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+                result.finish_reason = "error"
+                yield f"{ERROR_RESPONSE_PREFIX} Error: {str(e)}"
         
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}", exc_info=True)
-            return f"I apologize, but I'm having difficulty generating a response at the moment. Error: {str(e)}"
+        return AsyncLLMStream(deltas)
+    
+    def usage_stats(self) -> Dict[str, Any]:
+        """
+        Get the token usage of all completed requests.
+        
+        Input token counts include the tokens read from and written to the prompt cache.
+        Completion cache hits make no request and are not counted.
+        
+        Returns:
+            Dict[str, Any]: Request and token counters, and the share of input tokens
+                read from the prompt cache.
+        """
+        with self._usage_lock:
+            usage = dict(self._usage)
+        usage["cache_read_rate"] = usage["cache_read_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0
+        return usage
+    
+    def _record_usage(self, usage: Dict[str, int]) -> None:
+        """
+        Add the token usage of one completed request to the running totals.
+        
+        Args:
+            usage (Dict[str, int]): Usage from _anthropic_usage() or _openai_usage().
+        """
+        with self._usage_lock:
+            self._usage["requests"] += 1
+            for key, value in usage.items():
+                self._usage[key] += value
+    
+    def _total_tokens(self, usage: Dict[str, int]) -> Optional[int]:
+        """
+        Get the input plus output tokens of a request, as counted against rate limits.
+        
+        Args:
+            usage (Dict[str, int]): Usage from _anthropic_usage() or _openai_usage().
+            
+        Returns:
+            Optional[int]: The token count, or None without usage.
+        """
+        if not usage:
+            return None
+        return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    
+    def _anthropic_usage(self, usage: Any) -> Dict[str, int]:
+        """
+        Normalize Anthropic usage, whose input_tokens exclude the tokens read from or written to the cache.
+        
+        Args:
+            usage: The usage object of an Anthropic message, if any.
+            
+        Returns:
+            Dict[str, int]: Input, output, cache read and cache write token counts,
+                empty without usage.
+        """
+        if usage is None:
+            return {}
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return {
+            "input_tokens": usage.input_tokens + cache_read + cache_write,
+            "output_tokens": usage.output_tokens,
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write
+        }
+    
+    def _openai_usage(self, usage: Any) -> Dict[str, int]:
+        """
+        Normalize OpenAI usage, whose prompt_tokens already include the cached prefix.
+        
+        Args:
+            usage: The usage object of an OpenAI chat completion, if any.
+            
+        Returns:
+            Dict[str, int]: Input, output, cache read and cache write token counts,
+                empty without usage.
+        """
+        if usage is None:
+            return {}
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "cache_read_tokens": getattr(details, "cached_tokens", None) or 0,
+            "cache_write_tokens": 0
+        }
+    
+    def _record_anthropic_final(self, result: LLMStream, message: Any) -> None:
+        """
+        Copy usage and stop reason from Anthropic's final streamed message.
+        
+        Args:
+            result (LLMStream): The stream to update.
+            message: The final message returned by the Anthropic stream.
+        """
+        result.usage = self._anthropic_usage(message.usage)
+        self._record_usage(result.usage)
+        result.finish_reason = message.stop_reason
+    
+    def _record_openai_chunk(self, result: LLMStream, chunk: Any) -> Optional[str]:
+        """
+        Record usage and finish reason from an OpenAI stream chunk.
+        
+        Args:
+            result (LLMStream): The stream to update.
+            chunk: One chunk of an OpenAI chat completion stream.
+            
+        Returns:
+            Optional[str]: The text delta carried by the chunk, if any.
+        """
+        if getattr(chunk, "usage", None):
+            result.usage = self._openai_usage(chunk.usage)
+            self._record_usage(result.usage)
+        
+        if not chunk.choices:
+            return None
         
-        return "I apologize, but I couldn't generate a response with the current configuration."
\ No newline at end of file
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            result.finish_reason = choice.finish_reason
+        return choice.delta.content
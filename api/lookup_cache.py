@@ -0,0 +1,213 @@
+"""
+api/lookup_cache.py
+
+Stale-while-revalidate cache for location lookups (geocodes, weather forecasts) shared
+by the maps and weather API wrappers. Built on the SQLite CacheStore so cached lookups
+survive restarts and are shared between worker processes.
+"""
+
+import re
+import time
+import logging
+import threading
+import unicodedata
+from api.cache_store import CacheStore
+from api.single_flight import SingleFlight
+from typing import Any, Callable, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Concurrent misses for the same lookup share one upstream call, across all instances
+_fetch_flight = SingleFlight("lookup")
+
+def normalize_location(location: str) -> str:
+    """
+    Normalize a location name into a cache key.
+    
+    Case, accents, punctuation and spacing are ignored, so "Paris, France",
+    "paris,france" and " PARIS , France. " share one key.
+    
+    Args:
+        location (str): The location name as given by the user or the LLM.
+    
+    Returns:
+        str: The normalized key.
+    """
+    text = unicodedata.normalize("NFKD", location or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    parts = [re.sub(r"[^\w]+", " ", part).strip() for part in text.split(",")]
+    return ", ".join(" ".join(part.split()) for part in parts if part)
+
+def next_refresh_boundary(interval_hours: float, now: Optional[float] = None) -> float:
+    """
+    Get the next UTC time that is a multiple of the provider's update interval.
+    
+    Args:
+        interval_hours (float): How often the upstream data is refreshed, in hours.
+        now (Optional[float], optional): Current epoch time. Defaults to time.time().
+    
+    Returns:
+        float: Epoch time of the next refresh boundary.
+    """
+    now = time.time() if now is None else now
+    interval = interval_hours * 3600
+    return (now // interval + 1) * interval
+
+class LookupCache:
+    """
+    Location-keyed cache that serves stale entries while refreshing them in the background.
+    
+    Each entry has a fresh-until time and a longer hard expiry. Fresh entries are
+    returned directly. Entries past their fresh-until time but not yet expired are
+    still returned immediately, and a single background refresh is started for them,
+    so hot destinations never wait on the upstream API. Only misses block on a fetch.
+    
+    Aliases map the normalized query to a canonical key (for example the geocoder's
+    formatted address), so different spellings of the same place share one entry
+    once either has been resolved.
+    
+    Attributes:
+        namespace (str): CacheStore namespace for this lookup type.
+        fresh_seconds (Optional[float]): Fixed freshness window, if not using fresh_until.
+        stale_seconds (float): How long past fresh-until a stale entry may still be served.
+    """
+    
+    def __init__(self,
+                 namespace: str,
+                 fresh_seconds: Optional[float] = None,
+                 fresh_until: Optional[Callable[[float], float]] = None,
+                 stale_seconds: float = 24 * 3600,
+                 db_path: str = "cache/cache.sqlite",
+                 max_bytes: Optional[int] = 16 * 1024 * 1024):
+        """
+        Initialize the lookup cache.
+        
+        Args:
+            namespace (str): CacheStore namespace, e.g. "geocode" or "forecast".
+            fresh_seconds (Optional[float], optional): Seconds an entry stays fresh.
+            fresh_until (Optional[Callable[[float], float]], optional): Function mapping the
+                fetch time to the time the entry goes stale. Overrides fresh_seconds, and
+                is used to align freshness with the provider's update cadence.
+            stale_seconds (float, optional): Extra time a stale entry may be served while it
+                is being refreshed. Defaults to one day.
+            db_path (str, optional): SQLite file shared with the other caches.
+                Defaults to "cache/cache.sqlite".
+            max_bytes (Optional[int], optional): Byte budget for the namespace.
+                Defaults to 16 MiB.
+        
+        Raises:
+            ValueError: If neither fresh_seconds nor fresh_until is given.
+        """
+        if fresh_seconds is None and fresh_until is None:
+            raise ValueError("LookupCache needs fresh_seconds or fresh_until")
+        
+        self.namespace = namespace
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self._fresh_until = fresh_until or (lambda now: now + fresh_seconds)
+        
+        self.store = CacheStore(db_path=db_path, namespace=namespace, max_bytes=max_bytes)
+        
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+    
+    def get_or_fetch(self,
+                     location: str,
+                     fetch: Callable[[], Optional[Dict[str, Any]]],
+                     canonical: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached lookup for a location, fetching it if missing.
+        
+        Args:
+            location (str): The location name.
+            fetch (Callable[[], Optional[Dict[str, Any]]]): Calls the upstream API. Must
+                return None on failure so that fallback data is never cached.
+            canonical (Optional[Callable[[Dict[str, Any]], Optional[str]]], optional):
+                Returns the canonical location name for a fetched value, used to alias
+                other spellings to the same entry. Defaults to None.
+        
+        Returns:
+            Optional[Dict[str, Any]]: The lookup result, or None if it could not be fetched.
+        """
+        key = normalize_location(location)
+        if not key:
+            return fetch()
+        
+        entry_key = self._resolve(key)
+        entry = self.store.get(entry_key)
+        now = time.time()
+        
+        if entry is not None:
+            if entry["fresh_until"] > now:
+                logger.info(f"{self.namespace} cache hit for {location}")
+                return entry["value"]
+            
+            logger.info(f"Serving stale {self.namespace} entry for {location}, refreshing in background")
+            self._refresh_in_background(key, fetch, canonical)
+            return entry["value"]
+        
+        return _fetch_flight.do(
+            (self.namespace, key),
+            lambda: self._fetch_and_store(key, fetch, canonical)
+        )
+    
+    def _resolve(self, key: str) -> str:
+        """
+        Follow an alias to its canonical entry key, if one is recorded.
+        """
+        alias = self.store.get(f"alias:{key}")
+        return alias if alias else f"entry:{key}"
+    
+    def _fetch_and_store(self,
+                         key: str,
+                         fetch: Callable[[], Optional[Dict[str, Any]]],
+                         canonical: Optional[Callable[[Dict[str, Any]], Optional[str]]]) -> Optional[Dict[str, Any]]:
+        """
+        Call the upstream API and cache a successful result under its canonical key.
+        """
+        value = fetch()
+        if value is None:
+            return None
+        
+        now = time.time()
+        fresh_until = self._fresh_until(now)
+        ttl = fresh_until - now + self.stale_seconds
+        
+        canonical_key = key
+        if canonical is not None:
+            canonical_key = normalize_location(canonical(value) or "") or key
+        
+        entry_key = f"entry:{canonical_key}"
+        self.store.set(entry_key, {"value": value, "fresh_until": fresh_until}, ttl_seconds=ttl)
+        if canonical_key != key:
+            self.store.set(f"alias:{key}", entry_key, ttl_seconds=ttl)
+        
+        return value
+    
+    def _refresh_in_background(self,
+                               key: str,
+                               fetch: Callable[[], Optional[Dict[str, Any]]],
+                               canonical: Optional[Callable[[Dict[str, Any]], Optional[str]]]) -> None:
+        """
+        Start one background refresh per key; concurrent requests for the same key reuse it.
+        """
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh():
+            try:
+                _fetch_flight.do(
+                    (self.namespace, key),
+                    lambda: self._fetch_and_store(key, fetch, canonical)
+                )
+            except Exception as e:
+                logger.error(f"Error refreshing {self.namespace} entry for {key}: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=refresh, name=f"{self.namespace}-refresh", daemon=True).start()
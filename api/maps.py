@@ -5,10 +5,11 @@ Maps API wrapper for travel planning applications. Supports Google Maps geocodin
 with fallback to mock data when API keys are unavailable or requests fail.
 """
 import os
-import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
+from api.lookup_cache import LookupCache
+from api.transport import CircuitOpenError, get_transport
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -27,15 +28,29 @@ class MapsAPI:
     Attributes:
         provider (str): The maps API provider name ('googlemaps' or 'mock')
         api_key (str): API key for the selected provider
+        cache (Optional[LookupCache]): Geocode cache, or None in mock mode
+        transport (Optional[HTTPTransport]): Shared HTTP transport, or None in mock mode
     """
     
-    def __init__(self, provider: str = "googlemaps"):
+    def __init__(self, 
+                 provider: str = "googlemaps",
+                 cache_fresh_seconds: float = 30 * 24 * 3600,
+                 cache_stale_seconds: float = 60 * 24 * 3600,
+                 transport_settings: Optional[Dict[str, Any]] = None):
         """
         Initialize the Maps API wrapper.
         
         Args:
             provider (str, optional): The maps API provider to use.
                                      Defaults to "googlemaps".
+            cache_fresh_seconds (float, optional): How long a geocode is served without
+                                     revalidation. Defaults to 30 days.
+            cache_stale_seconds (float, optional): How long after that a geocode is still
+                                     served while it is refreshed in the background.
+                                     Defaults to 60 days.
+            transport_settings (Optional[Dict[str, Any]], optional): Overrides for the
+                                     shared HTTP transport (timeouts, retries, circuit
+                                     breaker). Defaults to None.
         
         Note:
             If Google Maps is selected but no API key is found in environment
@@ -49,6 +64,17 @@ class MapsAPI:
                 logger.warning("MAPS_API_KEY not found, falling back to mock mode")
                 self.provider = "mock"
         
+        # Geocodes effectively never change, so they are cached for weeks
+        self.cache = None
+        self.transport = None
+        if self.provider == "googlemaps":
+            self.transport = get_transport("googlemaps", **(transport_settings or {}))
+            self.cache = LookupCache(
+                namespace="geocode",
+                fresh_seconds=cache_fresh_seconds,
+                stale_seconds=cache_stale_seconds
+            )
+        
         logger.info(f"Initialized MapsAPI with provider: {self.provider}")
     
     def get_location_info(self, location: str) -> Dict[str, Any]:
@@ -69,38 +95,60 @@ class MapsAPI:
                 - place_id: Unique identifier for the location
         """
         if self.provider == "googlemaps":
-            try:
-                params = {
-                    "address": location,
-                    "key": self.api_key
-                }
-                
-                response = requests.get("https://maps.googleapis.com/maps/api/geocode/json", params=params)
+            location_info = self.cache.get_or_fetch(
+                location,
+                fetch=lambda: self._fetch_location_info(location),
+                canonical=lambda info: info.get("formatted_address")
+            )
+            if location_info is not None:
+                return location_info
+        
+        return self._get_mock_location_info(location)
+    
+    def _fetch_location_info(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Geocode a location with the Google Maps API.
+        
+        Args:
+            location (str): The location name (city, country, etc.)
+            
+        Returns:
+            Optional[Dict[str, Any]]: Location information in the same format as
+                                     get_location_info(), or None if the request fails.
+        """
+        try:
+            params = {
+                "address": location,
+                "key": self.api_key
+            }
+            
+            response = self.transport.get("https://maps.googleapis.com/maps/api/geocode/json", params=params)
+            
+            if response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if data.get("status") == "OK" and data.get("results"):
+                    result = data["results"][0]
+                    
+                    location_info = {
+                        "formatted_address": result.get("formatted_address", ""),
+                        "location": result.get("geometry", {}).get("location", {}),
+                        "place_id": result.get("place_id", "")
+                    }
                     
-                    if data.get("status") == "OK" and data.get("results"):
-                        result = data["results"][0]
-                        
-                        location_info = {
-                            "formatted_address": result.get("formatted_address", ""),
-                            "location": result.get("geometry", {}).get("location", {}),
-                            "place_id": result.get("place_id", "")
-                        }
-                        
-                        return location_info
-                    else:
-                        logger.warning(f"Failed to get location data: {data.get('status')}")
-                        return self._get_mock_location_info(location)
+                    return location_info
                 else:
-                    logger.warning(f"Failed to get location data: {response.status_code}")
-                    return self._get_mock_location_info(location)
-            except Exception as e:
-                logger.error(f"Error getting location info: {e}")
-                return self._get_mock_location_info(location)
-        
-        return self._get_mock_location_info(location)
+                    logger.warning(f"Failed to get location data: {data.get('status')}")
+                    return None
+            else:
+                logger.warning(f"Failed to get location data: {response.status_code}")
+                return None
+        except CircuitOpenError as e:
+            logger.warning(f"{e}, using mock location data")
+            return None
+        except Exception as e:
+            logger.error(f"Error getting location info: {e}")
+            return None
     
     def _get_mock_location_info(self, location: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,819 @@
+"""
+api/rate_limiter.py
+
+Adaptive rate limiter for LLM calls. Keeps a requests-per-minute and a tokens-per-minute
+token bucket and an AIMD concurrency limit per provider and model in a SQLite file, so
+every thread and worker process sharing the file draws from the same budget. Callers
+wait for capacity instead of failing, queued by priority class so that interactive
+requests go ahead of batch and evaluation calls, and the limits follow the providers'
+rate-limit response headers and 429 responses.
+"""
+
+import os
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterator, Mapping, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often a caller waiting for a concurrency slot checks again, and the longest sleep between checks
+_POLL_SECONDS = 0.05
+_MAX_POLL_SECONDS = 1.0
+
+# A waiting caller not seen for this long is taken to be gone, e.g. with its worker process
+_WAITER_TIMEOUT_SECONDS = 10.0
+
+# Priority classes: lower ranks are served first, and each class may hold at most its share
+# of a key's concurrency limit, so batch work always leaves room for interactive requests
+DEFAULT_PRIORITIES = {
+    "interactive": {"rank": 0, "share": 1.0},
+    "batch": {"rank": 1, "share": 0.5},
+    "eval": {"rank": 2, "share": 0.25}
+}
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when a caller has waited longer than max_wait_seconds for capacity.
+    """
+    pass
+
+class RateLimitSlot:
+    """
+    A call in progress under the rate limiter, filled in by the caller for its release.
+    
+    Attributes:
+        used_tokens (Optional[float]): Actual tokens of the call, None to keep the estimate.
+        headers (Mapping[str, str]): Response headers of the call.
+    """
+    
+    def __init__(self):
+        self.used_tokens = None
+        self.headers = {}
+
+def is_rate_limit_error(error: Optional[BaseException]) -> bool:
+    """
+    Check whether a provider SDK error is a 429 rate-limit response.
+    
+    Args:
+        error (Optional[BaseException]): The error raised by the SDK call, if any.
+    
+    Returns:
+        bool: True for rate-limit errors.
+    """
+    return error is not None and (getattr(error, "status_code", None) == 429
+                                  or type(error).__name__ == "RateLimitError")
+
+def response_headers(source: Any) -> Mapping[str, str]:
+    """
+    Get the HTTP response headers of an SDK raw response, stream or error.
+    
+    Args:
+        source: A raw response (with .headers), a stream or an error (with .response).
+    
+    Returns:
+        Mapping[str, str]: The headers, empty if there are none.
+    """
+    headers = getattr(source, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(source, "response", None), "headers", None)
+    return headers if headers is not None else {}
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a numeric header value, None if missing or malformed.
+    """
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+def _parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """
+    Parse a reset header into seconds from now: a duration such as "1s", "6m0s" or
+    "20ms" (OpenAI), or an RFC 3339 timestamp (Anthropic).
+    """
+    if not value:
+        return None
+    seconds = _parse_number(value)
+    if seconds is not None:
+        return seconds
+    
+    total, number = 0.0, ""
+    rest = value.strip()
+    units = (("ms", 0.001), ("h", 3600.0), ("m", 60.0), ("s", 1.0))
+    while rest:
+        if rest[0].isdigit() or rest[0] == ".":
+            number += rest[0]
+            rest = rest[1:]
+            continue
+        unit = next(((name, factor) for name, factor in units if rest.startswith(name)), None)
+        if unit is None or not number:
+            break
+        total += float(number) * unit[1]
+        number, rest = "", rest[len(unit[0]):]
+    else:
+        return total
+    
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - now)
+    except ValueError:
+        return None
+
+def parse_rate_limit_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Dict[str, float]:
+    """
+    Read the rate-limit headers of an Anthropic or OpenAI response.
+    
+    Args:
+        headers (Mapping[str, str]): The response headers.
+        now (Optional[float], optional): Current time.time(). Defaults to now.
+    
+    Returns:
+        Dict[str, float]: Any of 'request_limit', 'requests_remaining', 'token_limit',
+            'tokens_remaining', 'requests_reset', 'tokens_reset' and 'retry_after' (seconds)
+            found in the headers.
+    """
+    now = time.time() if now is None else now
+    headers = {str(key).lower(): value for key, value in dict(headers).items()}
+    names = {
+        "request_limit": ("anthropic-ratelimit-requests-limit", "x-ratelimit-limit-requests"),
+        "requests_remaining": ("anthropic-ratelimit-requests-remaining", "x-ratelimit-remaining-requests"),
+        "token_limit": ("anthropic-ratelimit-tokens-limit", "x-ratelimit-limit-tokens"),
+        "tokens_remaining": ("anthropic-ratelimit-tokens-remaining", "x-ratelimit-remaining-tokens"),
+        "requests_reset": ("anthropic-ratelimit-requests-reset", "x-ratelimit-reset-requests"),
+        "tokens_reset": ("anthropic-ratelimit-tokens-reset", "x-ratelimit-reset-tokens")
+    }
+    
+    parsed = {}
+    for field, candidates in names.items():
+        value = next((headers[name] for name in candidates if name in headers), None)
+        number = _parse_reset(value, now) if field.endswith("_reset") else _parse_number(value)
+        if number is not None:
+            parsed[field] = number
+    
+    retry_after_ms = _parse_number(headers.get("retry-after-ms"))
+    retry_after = _parse_number(headers.get("retry-after"))
+    if retry_after_ms is not None:
+        parsed["retry_after"] = retry_after_ms / 1000
+    elif retry_after is not None:
+        parsed["retry_after"] = retry_after
+    elif headers.get("retry-after"):
+        try:
+            parsed["retry_after"] = max(0.0, parsedate_to_datetime(headers["retry-after"]).timestamp() - now)
+        except (TypeError, ValueError):
+            pass
+    return parsed
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter with AIMD concurrency control, shared through SQLite.
+    
+    Each provider/model key has a request bucket and a token bucket, refilled continuously
+    at their per-minute limits, and a concurrency limit on calls in flight. A call
+    reserves one request and its estimated tokens up front; the reservation is corrected
+    with the actual usage when the call is released. Successful calls raise the
+    concurrency limit additively (by about additive_increase per limit's worth of calls),
+    and 429 responses cut it multiplicatively and pause the key until the provider's
+    retry-after. Limits and remaining budgets reported in response headers replace the
+    configured ones.
+    
+    Every call belongs to a priority class. Waiting callers are queued in the database, and
+    a call may only start when no caller of a better class, or of the same class that
+    started waiting earlier, is queued for the same key. Waiting improves a caller's rank
+    by one every aging_seconds, so lower classes are delayed but never starved. Each class
+    is also capped at its share of the concurrency limit.
+    
+    In-flight calls are leases with an expiry, so a worker process that dies mid-call
+    cannot hold its slots forever. The database runs in WAL mode with a busy timeout, like
+    the other caches; with db_path None it lives in memory and is shared by threads only.
+    
+    Attributes:
+        db_path (Optional[str]): Path of the SQLite file, or None for an in-memory database.
+        requests_per_minute (Optional[float]): Default request limit, None for no limit.
+        tokens_per_minute (Optional[float]): Default token limit, None for no limit.
+        limits (Dict[str, Dict[str, float]]): Limits per "provider/model" key.
+        initial_concurrency (float): Concurrency limit of a new key.
+        min_concurrency (float): Lowest concurrency limit.
+        max_concurrency (float): Highest concurrency limit.
+        additive_increase (float): Concurrency added per limit's worth of successful calls.
+        multiplicative_decrease (float): Factor applied to the concurrency limit on a 429.
+        max_wait_seconds (float): Longest a caller waits for capacity.
+        max_retries (int): Retries of a call rejected with a 429 or a transient error.
+        lease_seconds (float): Time after which an unreleased call no longer counts as in flight.
+        priorities (Dict[str, Dict[str, float]]): "rank" and "share" of each priority class.
+        default_priority (str): Class of calls made without one.
+        aging_seconds (float): Waiting time that improves a caller's rank by one.
+    """
+    
+    def __init__(self,
+                 db_path: Optional[str] = "cache/rate_limits.sqlite",
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 initial_concurrency: float = 8,
+                 min_concurrency: float = 1,
+                 max_concurrency: float = 64,
+                 additive_increase: float = 1.0,
+                 multiplicative_decrease: float = 0.5,
+                 max_wait_seconds: float = 120.0,
+                 max_retries: int = 3,
+                 default_backoff_seconds: float = 1.0,
+                 lease_seconds: float = 600.0,
+                 priorities: Optional[Dict[str, Dict[str, float]]] = None,
+                 default_priority: str = "interactive",
+                 aging_seconds: float = 30.0):
+        """
+        Open (or create) the rate limit database.
+        
+        Args:
+            db_path (Optional[str], optional): SQLite file shared by worker processes, or None
+                for a per-process in-memory database. Defaults to "cache/rate_limits.sqlite".
+            requests_per_minute (Optional[float], optional): Default request limit. Defaults to None.
+            tokens_per_minute (Optional[float], optional): Default token limit. Defaults to None.
+            limits (Optional[Dict[str, Dict[str, float]]], optional): "requests_per_minute" and
+                "tokens_per_minute" per "provider/model" key. Defaults to None.
+            initial_concurrency (float, optional): Starting concurrency limit. Defaults to 8.
+            min_concurrency (float, optional): Lowest concurrency limit. Defaults to 1.
+            max_concurrency (float, optional): Highest concurrency limit. Defaults to 64.
+            additive_increase (float, optional): Additive increase per window of successful
+                calls. Defaults to 1.0.
+            multiplicative_decrease (float, optional): Decrease factor on a 429. Defaults to 0.5.
+            max_wait_seconds (float, optional): Longest wait for capacity before
+                RateLimitTimeout. Defaults to 120.
+            max_retries (int, optional): Retries after a 429 or a transient error. Defaults to 3.
+            default_backoff_seconds (float, optional): Pause after a 429 without a retry-after
+                header. Defaults to 1.0.
+            lease_seconds (float, optional): Lifetime of an in-flight lease. Defaults to 600.
+            priorities (Optional[Dict[str, Dict[str, float]]], optional): Priority classes added
+                to or overriding DEFAULT_PRIORITIES. Defaults to None.
+            default_priority (str, optional): Class of calls made without one. Defaults to "interactive".
+            aging_seconds (float, optional): Waiting time that improves a caller's rank by one;
+                0 disables aging. Defaults to 30.
+        """
+        self.db_path = db_path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.limits = limits or {}
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.max_wait_seconds = max_wait_seconds
+        self.max_retries = max_retries
+        self.default_backoff_seconds = default_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+        self.default_priority = default_priority if default_priority in self.priorities else "interactive"
+        self.aging_seconds = aging_seconds
+        
+        self._stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "rate_limited": 0, "timeouts": 0}
+        self._class_stats = {}
+        self._configured_keys = set()
+        self._lock = threading.Lock()
+        
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path or ":memory:", timeout=10.0, check_same_thread=False, isolation_level=None)
+        if db_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, request_limit REAL, token_limit REAL, "
+            "request_level REAL NOT NULL, token_level REAL NOT NULL, refilled_at REAL NOT NULL, "
+            "concurrency REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, tokens REAL NOT NULL, expires_at REAL NOT NULL, "
+            "priority TEXT NOT NULL DEFAULT 'interactive')"
+        )
+        # Databases created before priority classes lack the column
+        if "priority" not in [row[1] for row in self._db.execute("PRAGMA table_info(leases)")]:
+            self._db.execute("ALTER TABLE leases ADD COLUMN priority TEXT NOT NULL DEFAULT 'interactive'")
+        self._db.execute("CREATE INDEX IF NOT EXISTS leases_key ON leases(key, expires_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS waiters ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, priority TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL, seen_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS waiters_key ON waiters(key)")
+        
+        logger.info(f"Initialized RateLimiter (db_path={db_path}, requests_per_minute={requests_per_minute}, "
+                    f"tokens_per_minute={tokens_per_minute})")
+    
+    def acquire(self, key: str, tokens: float, priority: Optional[str] = None) -> str:
+        """
+        Wait until a call can be made, then reserve a request and its tokens.
+        
+        Args:
+            key (str): The "provider/model" key.
+            tokens (float): Estimated tokens of the call, prompt and completion.
+            priority (Optional[str], optional): Priority class of the call. Defaults to
+                default_priority.
+        
+        Returns:
+            str: Lease id to pass to release().
+        
+        Raises:
+            RateLimitTimeout: If no capacity became available within max_wait_seconds.
+        """
+        priority = self._priority(priority)
+        waiter = uuid.uuid4().hex
+        start, enqueued_at = time.monotonic(), time.time()
+        try:
+            while True:
+                lease, wait = self._try_acquire(key, tokens, priority, waiter, enqueued_at)
+                if lease is not None:
+                    self._record_wait(priority, time.monotonic() - start)
+                    return lease
+                time.sleep(self._next_sleep(start, wait, key))
+        except BaseException:
+            self._leave_queue(waiter)
+            raise
+    
+    async def aacquire(self, key: str, tokens: float, priority: Optional[str] = None) -> str:
+        """
+        Async counterpart of acquire(); waits without blocking the event loop.
+        
+        Args:
+            key (str): The "provider/model" key.
+            tokens (float): Estimated tokens of the call, prompt and completion.
+            priority (Optional[str], optional): Priority class of the call. Defaults to
+                default_priority.
+        
+        Returns:
+            str: Lease id to pass to arelease().
+        
+        Raises:
+            RateLimitTimeout: If no capacity became available within max_wait_seconds.
+        """
+        priority = self._priority(priority)
+        waiter = uuid.uuid4().hex
+        start, enqueued_at = time.monotonic(), time.time()
+        try:
+            while True:
+                lease, wait = await asyncio.to_thread(self._try_acquire, key, tokens, priority, waiter, enqueued_at)
+                if lease is not None:
+                    self._record_wait(priority, time.monotonic() - start)
+                    return lease
+                await asyncio.sleep(self._next_sleep(start, wait, key))
+        except BaseException:
+            self._leave_queue(waiter)
+            raise
+    
+    def release(self,
+                lease: str,
+                used_tokens: Optional[float] = None,
+                headers: Optional[Mapping[str, str]] = None,
+                rate_limited: bool = False) -> None:
+        """
+        End a call: free its concurrency slot, settle its tokens and adapt the limits.
+        
+        Args:
+            lease (str): Lease id from acquire().
+            used_tokens (Optional[float], optional): Actual tokens of the call; the estimate
+                is kept when None. Defaults to None.
+            headers (Optional[Mapping[str, str]], optional): Response headers with the
+                provider's rate-limit information. Defaults to None.
+            rate_limited (bool, optional): Whether the provider answered with a 429. Defaults to False.
+        """
+        now = time.time()
+        limits = parse_rate_limit_headers(headers or {}, now)
+        
+        with self._lock:
+            if rate_limited:
+                self._stats["rate_limited"] += 1
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._release(lease, used_tokens, limits, rate_limited, now)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logger.error(f"Error releasing rate limit lease: {e}")
+    
+    async def arelease(self,
+                       lease: str,
+                       used_tokens: Optional[float] = None,
+                       headers: Optional[Mapping[str, str]] = None,
+                       rate_limited: bool = False) -> None:
+        """
+        Async counterpart of release().
+        """
+        await asyncio.to_thread(self.release, lease, used_tokens, headers, rate_limited)
+    
+    @contextmanager
+    def slot(self, key: str, tokens: float, priority: Optional[str] = None) -> Iterator[RateLimitSlot]:
+        """
+        Hold a call's capacity for the duration of a with block.
+        
+        The call is released when the block ends, including when a stream is abandoned
+        part-way. An exception leaving the block is reported as a 429 if it is one,
+        with the headers of its response.
+        
+        Args:
+            key (str): The "provider/model" key.
+            tokens (float): Estimated tokens of the call, prompt and completion.
+            priority (Optional[str], optional): Priority class of the call. Defaults to
+                default_priority.
+        
+        Yields:
+            RateLimitSlot: Slot on which to set the call's used tokens and response headers.
+        """
+        slot = RateLimitSlot()
+        lease = self.acquire(key, tokens, priority)
+        error = None
+        try:
+            yield slot
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if error is None:
+                self.release(lease, slot.used_tokens, slot.headers)
+            else:
+                self.release(lease, headers=response_headers(error), rate_limited=is_rate_limit_error(error))
+    
+    @asynccontextmanager
+    async def aslot(self, key: str, tokens: float, priority: Optional[str] = None) -> AsyncIterator[RateLimitSlot]:
+        """
+        Async counterpart of slot().
+        """
+        slot = RateLimitSlot()
+        lease = await self.aacquire(key, tokens, priority)
+        error = None
+        try:
+            yield slot
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if error is None:
+                await self.arelease(lease, slot.used_tokens, slot.headers)
+            else:
+                await self.arelease(lease, headers=response_headers(error), rate_limited=is_rate_limit_error(error))
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get this process's counters and the shared state of every key and priority class.
+        
+        Returns:
+            Dict[str, Any]: Acquired calls, calls that had to wait and for how long, 429s and
+                timeouts; per priority class, the calls queued and in flight in all processes
+                and this process's acquired calls and mean and longest waits; and each key's
+                limits, concurrency limit and calls in flight.
+        """
+        now = time.time()
+        with self._lock:
+            stats = dict(self._stats)
+            class_stats = {name: dict(counters) for name, counters in self._class_stats.items()}
+            rows = self._db.execute(
+                "SELECT key, request_limit, token_limit, concurrency, blocked_until, "
+                "(SELECT COUNT(*) FROM leases WHERE leases.key = rate_limits.key AND expires_at > ?) "
+                "FROM rate_limits", (now,)
+            ).fetchall()
+            queued = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM waiters WHERE seen_at > ? GROUP BY priority",
+                (now - _WAITER_TIMEOUT_SECONDS,)
+            ).fetchall())
+            in_flight = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM leases WHERE expires_at > ? GROUP BY priority", (now,)
+            ).fetchall())
+        
+        stats["classes"] = {}
+        for name in self.priorities:
+            counters = class_stats.get(name, {"acquired": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+            stats["classes"][name] = {
+                "queued": queued.get(name, 0),
+                "in_flight": in_flight.get(name, 0),
+                "acquired": counters["acquired"],
+                "mean_wait_seconds": counters["wait_seconds"] / counters["acquired"] if counters["acquired"] else 0.0,
+                "max_wait_seconds": counters["max_wait_seconds"]
+            }
+        
+        stats["keys"] = {
+            key: {
+                "requests_per_minute": request_limit,
+                "tokens_per_minute": token_limit,
+                "concurrency": round(concurrency, 2),
+                "in_flight": in_flight,
+                "blocked_seconds": max(0.0, blocked_until - now)
+            }
+            for key, request_limit, token_limit, concurrency, blocked_until, in_flight in rows
+        }
+        return stats
+    
+    def _try_acquire(self, key: str, tokens: float, priority: str, waiter: str, enqueued_at: float):
+        """
+        Take a lease if the key has capacity now and no better caller is queued, else queue
+        the caller and get the time until it may have.
+        
+        Returns:
+            Tuple[Optional[str], float]: The lease id, or None and the seconds to wait.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    lease, wait = self._reserve(key, tokens, now, priority, waiter, enqueued_at)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                # Never block LLM calls on a broken limiter database
+                logger.error(f"Error reading rate limits, allowing the call: {e}")
+                return "", 0.0
+            if lease is not None:
+                self._stats["acquired"] += 1
+            return lease, wait
+    
+    def _reserve(self, key: str, tokens: float, now: float, priority: str, waiter: str, enqueued_at: float):
+        """
+        Refill the key's buckets and reserve a call if every limit and the queue allow it,
+        else keep the caller queued.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        state = self._load(key, now)
+        request_limit, token_limit = state["request_limit"], state["token_limit"]
+        
+        self._db.execute("DELETE FROM leases WHERE key = ? AND expires_at <= ?", (key, now))
+        self._db.execute("DELETE FROM waiters WHERE key = ? AND seen_at <= ?", (key, now - _WAITER_TIMEOUT_SECONDS))
+        in_flight = dict(self._db.execute(
+            "SELECT priority, COUNT(*) FROM leases WHERE key = ? GROUP BY priority", (key,)
+        ).fetchall())
+        others = self._db.execute(
+            "SELECT priority, enqueued_at FROM waiters WHERE key = ? AND id != ?", (key, waiter)
+        ).fetchall()
+        
+        # A call larger than the whole bucket can never fit, so it waits for a full bucket instead
+        needed = min(tokens, token_limit) if token_limit else tokens
+        wait = 0.0
+        if state["blocked_until"] > now:
+            wait = state["blocked_until"] - now
+        elif sum(in_flight.values()) >= max(1, int(state["concurrency"])):
+            wait = _POLL_SECONDS
+        elif in_flight.get(priority, 0) >= self._class_limit(priority, state["concurrency"]):
+            wait = _POLL_SECONDS
+        elif self._queued_ahead(priority, enqueued_at, others, in_flight, state["concurrency"], now):
+            wait = _POLL_SECONDS
+        elif request_limit and state["request_level"] < 1:
+            wait = (1 - state["request_level"]) * 60 / request_limit
+        elif token_limit and state["token_level"] < needed:
+            wait = (needed - state["token_level"]) * 60 / token_limit
+        
+        lease = None
+        if wait <= 0:
+            lease = uuid.uuid4().hex
+            state["request_level"] -= 1
+            state["token_level"] -= tokens
+            self._db.execute(
+                "INSERT INTO leases (id, key, tokens, expires_at, priority) VALUES (?, ?, ?, ?, ?)",
+                (lease, key, tokens, now + self.lease_seconds, priority)
+            )
+            self._db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+        else:
+            self._db.execute(
+                "INSERT INTO waiters (id, key, priority, enqueued_at, seen_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET seen_at = excluded.seen_at",
+                (waiter, key, priority, enqueued_at, now)
+            )
+        self._save(key, state)
+        return lease, wait
+    
+    def _queued_ahead(self, priority: str, enqueued_at: float, others, in_flight: Dict[str, int],
+                      concurrency: float, now: float) -> bool:
+        """
+        Whether another queued caller that could start now goes before this one: it has a
+        better rank after aging, or the same rank and has waited longer.
+        """
+        mine = (self._effective_rank(priority, enqueued_at, now), enqueued_at)
+        return any(
+            (self._effective_rank(other, other_enqueued_at, now), other_enqueued_at) < mine
+            for other, other_enqueued_at in others
+            if in_flight.get(other, 0) < self._class_limit(other, concurrency)
+        )
+    
+    def _effective_rank(self, priority: str, enqueued_at: float, now: float) -> float:
+        """
+        Get a queued caller's rank, improved by one for every aging_seconds it has waited.
+        """
+        rank = self.priorities.get(priority, {}).get("rank", 0)
+        if self.aging_seconds > 0:
+            rank -= max(0.0, now - enqueued_at) / self.aging_seconds
+        return rank
+    
+    def _class_limit(self, priority: str, concurrency: float) -> int:
+        """
+        Get the most calls a priority class may have in flight: its share of the concurrency limit.
+        """
+        share = self.priorities.get(priority, {}).get("share", 1.0)
+        return max(1, int(share * concurrency))
+    
+    def _priority(self, priority: Optional[str]) -> str:
+        """
+        Resolve a call's priority class, falling back to the default for unknown classes.
+        """
+        if priority is None:
+            return self.default_priority
+        if priority not in self.priorities:
+            logger.warning(f"Unknown priority class '{priority}', using '{self.default_priority}'")
+            return self.default_priority
+        return priority
+    
+    def _leave_queue(self, waiter: str) -> None:
+        """
+        Remove a caller that stopped waiting from the queue.
+        """
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            except sqlite3.Error as e:
+                logger.error(f"Error leaving the rate limit queue: {e}")
+    
+    def _release(self, lease: str, used_tokens: Optional[float], limits: Dict[str, float],
+                 rate_limited: bool, now: float) -> None:
+        """
+        Settle a lease and update the key's limits.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        row = self._db.execute("SELECT key, tokens FROM leases WHERE id = ?", (lease,)).fetchone()
+        if row is None:
+            return
+        key, reserved = row
+        self._db.execute("DELETE FROM leases WHERE id = ?", (lease,))
+        state = self._load(key, now)
+        
+        if used_tokens is not None:
+            state["token_level"] += reserved - used_tokens
+        
+        # Trust the provider's own view of the limits and of what is left; a bucket that was
+        # unlimited until now starts full
+        if limits.get("request_limit"):
+            if not state["request_limit"]:
+                state["request_level"] = limits["request_limit"]
+            state["request_limit"] = limits["request_limit"]
+        if limits.get("token_limit"):
+            if not state["token_limit"]:
+                state["token_level"] = limits["token_limit"]
+            state["token_limit"] = limits["token_limit"]
+        if "requests_remaining" in limits:
+            state["request_level"] = min(state["request_level"], limits["requests_remaining"])
+            if limits["requests_remaining"] < 1 and limits.get("requests_reset"):
+                state["blocked_until"] = max(state["blocked_until"], now + limits["requests_reset"])
+        if "tokens_remaining" in limits:
+            state["token_level"] = min(state["token_level"], limits["tokens_remaining"])
+        
+        if rate_limited:
+            state["concurrency"] = max(self.min_concurrency, state["concurrency"] * self.multiplicative_decrease)
+            backoff = limits.get("retry_after", self.default_backoff_seconds)
+            state["blocked_until"] = max(state["blocked_until"], now + backoff)
+            logger.warning(f"Rate limited on {key}: concurrency limit {state['concurrency']:.1f}, "
+                           f"pausing {backoff:.1f}s")
+        else:
+            state["concurrency"] = min(self.max_concurrency,
+                                       state["concurrency"] + self.additive_increase / max(1.0, state["concurrency"]))
+        self._save(key, state)
+    
+    def _load(self, key: str, now: float) -> Dict[str, Any]:
+        """
+        Read a key's state with its buckets refilled up to now, creating it if missing.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        request_limit, token_limit = self._configured_limits(key)
+        if key not in self._configured_keys:
+            self._db.execute(
+                "INSERT OR IGNORE INTO rate_limits (key, request_limit, token_limit, request_level, token_level, "
+                "refilled_at, concurrency, blocked_until) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, request_limit, token_limit, request_limit or 0, token_limit or 0, now,
+                 self.initial_concurrency)
+            )
+            # Configured limits apply from this process's first call on, until headers say otherwise;
+            # unconfigured ones keep what other processes learned. A bucket that was unlimited starts full.
+            for bucket, limit in (("request", request_limit), ("token", token_limit)):
+                if limit is not None:
+                    self._db.execute(
+                        f"UPDATE rate_limits SET {bucket}_limit = ?, {bucket}_level = CASE "
+                        f"WHEN {bucket}_limit IS NULL THEN ? ELSE MIN({bucket}_level, ?) END WHERE key = ?",
+                        (limit, limit, limit, key)
+                    )
+            self._configured_keys.add(key)
+        
+        row = self._db.execute(
+            "SELECT request_limit, token_limit, request_level, token_level, refilled_at, concurrency, blocked_until "
+            "FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        state = dict(zip(("request_limit", "token_limit", "request_level", "token_level",
+                          "refilled_at", "concurrency", "blocked_until"), row))
+        
+        elapsed = max(0.0, now - state["refilled_at"])
+        if state["request_limit"]:
+            state["request_level"] = min(state["request_limit"],
+                                         state["request_level"] + elapsed * state["request_limit"] / 60)
+        if state["token_limit"]:
+            state["token_level"] = min(state["token_limit"],
+                                       state["token_level"] + elapsed * state["token_limit"] / 60)
+        state["refilled_at"] = now
+        return state
+    
+    def _save(self, key: str, state: Dict[str, Any]) -> None:
+        """
+        Write a key's state back.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        self._db.execute(
+            "UPDATE rate_limits SET request_limit = ?, token_limit = ?, request_level = ?, token_level = ?, "
+            "refilled_at = ?, concurrency = ?, blocked_until = ? WHERE key = ?",
+            (state["request_limit"], state["token_limit"], state["request_level"], state["token_level"],
+             state["refilled_at"], state["concurrency"], state["blocked_until"], key)
+        )
+    
+    def _configured_limits(self, key: str):
+        """
+        Get the configured request and token limits per minute of a key.
+        """
+        limits = self.limits.get(key, {})
+        return (limits.get("requests_per_minute", self.requests_per_minute),
+                limits.get("tokens_per_minute", self.tokens_per_minute))
+    
+    def _next_sleep(self, start: float, wait: float, key: str) -> float:
+        """
+        Get how long to sleep before checking again, with jitter so waiting callers spread out.
+        
+        Raises:
+            RateLimitTimeout: If the caller would wait past max_wait_seconds.
+        """
+        waited = time.monotonic() - start
+        if waited + wait > self.max_wait_seconds:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise RateLimitTimeout(f"No capacity for {key} within {self.max_wait_seconds}s")
+        return max(0.005, min(wait, _MAX_POLL_SECONDS) * random.uniform(0.8, 1.2))
+    
+    def _record_wait(self, priority: str, seconds: float) -> None:
+        """
+        Count an acquired call and the time it waited for capacity.
+        """
+        with self._lock:
+            counters = self._class_stats.setdefault(
+                priority, {"acquired": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            )
+            counters["acquired"] += 1
+            counters["wait_seconds"] += seconds
+            counters["max_wait_seconds"] = max(counters["max_wait_seconds"], seconds)
+            if seconds >= 0.001:
+                self._stats["waited"] += 1
+                self._stats["wait_seconds"] += seconds
+
+def create_rate_limiter(rate_limit_config: Optional[Dict[str, Any]]) -> Optional[RateLimiter]:
+    """
+    Build a RateLimiter from the "llm_rate_limit" configuration section.
+    
+    Args:
+        rate_limit_config (Optional[Dict[str, Any]]): The configuration section, or None.
+    
+    Returns:
+        Optional[RateLimiter]: The limiter, or None if rate limiting is disabled.
+    """
+    if not rate_limit_config or not rate_limit_config.get("enabled", False):
+        return None
+    
+    try:
+        return RateLimiter(
+            db_path=rate_limit_config.get("db_path", "cache/rate_limits.sqlite"),
+            requests_per_minute=rate_limit_config.get("requests_per_minute"),
+            tokens_per_minute=rate_limit_config.get("tokens_per_minute"),
+            limits=rate_limit_config.get("limits"),
+            initial_concurrency=rate_limit_config.get("initial_concurrency", 8),
+            min_concurrency=rate_limit_config.get("min_concurrency", 1),
+            max_concurrency=rate_limit_config.get("max_concurrency", 64),
+            additive_increase=rate_limit_config.get("additive_increase", 1.0),
+            multiplicative_decrease=rate_limit_config.get("multiplicative_decrease", 0.5),
+            max_wait_seconds=rate_limit_config.get("max_wait_seconds", 120.0),
+            max_retries=rate_limit_config.get("max_retries", 3),
+            lease_seconds=rate_limit_config.get("lease_seconds", 600.0),
+            priorities=rate_limit_config.get("priorities"),
+            default_priority=rate_limit_config.get("priority", "interactive"),
+            aging_seconds=rate_limit_config.get("aging_seconds", 30.0)
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Error opening rate limit database, rate limiting disabled: {e}")
+        return None
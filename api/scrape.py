@@ -5,11 +5,12 @@ A web scraping module that uses the Firecrawl API to extract information about p
 The module implements caching to avoid redundant API calls and provides fallback to mock data.
 """
 import os
-import json
 import hashlib
 import logging
-import requests
 from pathlib import Path
+from api.cache_store import CacheStore
+from api.transport import CircuitOpenError, get_transport
+from api.single_flight import SingleFlight
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,6 +18,9 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Concurrent scrapes of the same uncached URL share one Firecrawl request
+_scrape_flight = SingleFlight("scrape")
+
 class WebScrapperAPI:
     """
     A class to scrape web pages for information using the Firecrawl API.
@@ -28,40 +32,56 @@ class WebScrapperAPI:
         firecrawl_url (str): The URL endpoint for the Firecrawl API.
         headers (dict): HTTP headers for API requests, including authentication.
         cache_dir (Path): Directory to store cached results.
+        cache (CacheStore): SQLite-backed store holding scraped results.
+        transport (HTTPTransport): Shared pooled HTTP transport for Firecrawl.
     """
     
-    def __init__(self, cache_dir="cache"):
+    def __init__(self, cache_dir="cache", cache_ttl_seconds=7 * 24 * 3600, cache_max_bytes=64 * 1024 * 1024,
+                 transport_settings=None):
         """
         Initialize the WebScrapperAPI with caching capabilities.
         
         Args:
             cache_dir (str, optional): Directory to store cached results. 
                                        Defaults to "cache".
+            cache_ttl_seconds (float, optional): How long scraped results stay fresh.
+                                       Defaults to one week.
+            cache_max_bytes (int, optional): Size budget of the scrape cache, beyond which
+                                       the least recently used pages are evicted.
+                                       Defaults to 64 MiB.
+            transport_settings (dict, optional): Overrides for the shared HTTP transport
+                                       (timeouts, retries, circuit breaker).
+                                       Defaults to None.
         """
         self.firecrawl_url = "https://api.firecrawl.dev/v1/scrape"
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {os.getenv('FIRECRAWL_API_KEY')}"
         }
+        self.transport = get_transport("firecrawl", **(transport_settings or {}))
         
-        # Set up cache directory
+        # Set up cache store
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache = CacheStore(
+            db_path=str(self.cache_dir / "cache.sqlite"),
+            namespace="scrape",
+            ttl_seconds=cache_ttl_seconds,
+            max_bytes=cache_max_bytes
+        )
         
         logger.info("Initialized WebScrapperAPI of firecrawl with caching")
 
     def _get_cache_key(self, url):
         """
-        Generate a unique filename for caching based on the URL.
+        Generate a unique cache key based on the URL.
         
         Args:
             url (str): The URL to generate a cache key for.
             
         Returns:
-            str: A MD5 hash of the URL with a .json extension.
+            str: A MD5 hash of the URL.
         """
-        # Create a hash of the URL to use as the filename
-        return hashlib.md5(url.encode()).hexdigest() + ".json"
+        return hashlib.md5(url.encode()).hexdigest()
     
     def _check_cache(self, url):
         """
@@ -71,17 +91,26 @@ class WebScrapperAPI:
             url (str): The URL to check cache for.
             
         Returns:
-            dict or None: The cached data if found, None otherwise.
+            list or None: The cached places if found and not expired, None otherwise.
         """
-        cache_file = self.cache_dir / self._get_cache_key(url)
-        if cache_file.exists():
+        cached = self.cache.get(self._get_cache_key(url))
+        if cached is not None:
             logger.info(f"Cache hit for URL: {url}")
-            try:
-                with open(cache_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error reading from cache: {e}")
-        return None
+        return cached
+    
+    def get_cached_many(self, urls):
+        """
+        Look up cached results for several URLs at once.
+        
+        Args:
+            urls (list): The URLs to check cache for.
+            
+        Returns:
+            dict: Cached places keyed by URL, for the URLs that were found.
+        """
+        keys = {url: self._get_cache_key(url) for url in urls}
+        cached = self.cache.get_many(keys.values())
+        return {url: cached[key] for url, key in keys.items() if key in cached}
     
     def _save_to_cache(self, url, data):
         """
@@ -89,24 +118,20 @@ class WebScrapperAPI:
         
         Args:
             url (str): The URL associated with the data.
-            data (dict): The data to cache.
+            data (list): The data to cache.
             
         Returns:
             None
         """
-        cache_file = self.cache_dir / self._get_cache_key(url)
-        try:
-            with open(cache_file, 'w') as f:
-                json.dump(data, f)
-            logger.info(f"Saved results to cache for URL: {url}")
-        except Exception as e:
-            logger.error(f"Error saving to cache: {e}")
+        self.cache.set(self._get_cache_key(url), data)
+        logger.info(f"Saved results to cache for URL: {url}")
     
     def scrape(self, url):
         """
         Scrape a URL for information about places to visit.
         
         First checks the cache for existing results, then makes an API call if needed.
+        Concurrent calls for the same uncached URL wait on a single API call.
         Falls back to mock data if the API call fails.
         
         Args:
@@ -121,6 +146,19 @@ class WebScrapperAPI:
             return cached_results
         
         # If not in cache, make the API request
+        return _scrape_flight.do(self._get_cache_key(url.strip()), lambda: self._fetch_places(url))
+    
+    def _fetch_places(self, url):
+        """
+        Scrape a URL with the Firecrawl API and cache successful results.
+        
+        Args:
+            url (str): The URL to scrape.
+            
+        Returns:
+            list: A list of dictionaries containing information about places,
+                  or mock places if the API call fails.
+        """
         data = {
             "url": url,
             "formats": ["json"],
@@ -130,7 +168,7 @@ class WebScrapperAPI:
         }
         
         try:
-            response = requests.post(
+            response = self.transport.post(
                 self.firecrawl_url, 
                 headers=self.headers,
                 json=data
@@ -156,6 +194,10 @@ class WebScrapperAPI:
                 mock_places = self.get_mock_places_info()['places']
                 return mock_places
                 
+        except CircuitOpenError as e:
+            logger.warning(f"{e}, using mock places")
+            mock_places = self.get_mock_places_info()['places']
+            return mock_places
         except Exception as e:
             logger.error(f"Error making API request: {e}")
             mock_places = self.get_mock_places_info()['places']
@@ -7,12 +7,16 @@ Provides search capabilities with error handling and mock results fallback.
 
 import logging
 from googlesearch import search
+from api.single_flight import SingleFlight
 from typing import Dict, List, Any
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Identical searches issued concurrently share one upstream request
+_search_flight = SingleFlight("search")
+
 class SearchAPI:
     """
     Wrapper for search API providers that performs web searches.
@@ -47,6 +51,21 @@ class SearchAPI:
             
         Note:
             Falls back to mock results if the search operation fails.
+            Concurrent calls with the same (normalized) query share one request.
+        """
+        key = (" ".join(query.lower().split()), num_results)
+        return _search_flight.do(key, lambda: self._search(query, num_results))
+    
+    def _search(self, query: str, num_results: int) -> List[str]:
+        """
+        Run the web search, falling back to mock results on failure.
+        
+        Args:
+            query (str): The search query string.
+            num_results (int): Number of results to return.
+            
+        Returns:
+            List[str]: A list of URLs returned by the search.
         """
         try:
             results = []
@@ -0,0 +1,117 @@
+"""
+api/single_flight.py
+
+Request coalescing for upstream API calls. Concurrent calls with the same key share a
+single in-flight upstream request instead of each issuing their own.
+"""
+
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """
+    An in-flight call that followers wait on.
+    """
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+    
+    The first caller for a key (the leader) runs the function; callers arriving while
+    it is running block until it finishes and receive a copy of its result, or the
+    same exception. Once the call completes the key is forgotten, so later calls run
+    again (results are not cached here).
+    
+    Attributes:
+        name (str): Name used in logs.
+        calls (int): Number of executions actually run.
+        coalesced (int): Number of calls answered by another caller's execution.
+    """
+    
+    def __init__(self, name: str):
+        """
+        Initialize an empty single-flight group.
+        
+        Args:
+            name (str): Name used in logs, e.g. the upstream provider.
+        """
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        
+        self._in_flight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key.
+        
+        Args:
+            key (Hashable): Identifies equivalent calls, built from normalized arguments.
+            fn (Callable[[], Any]): The upstream call.
+        
+        Returns:
+            Any: The result of fn. Followers get a deep copy so callers can't affect
+                each other through shared mutable results.
+        
+        Raises:
+            BaseException: Whatever fn raised, re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+                leader = True
+            else:
+                call.followers += 1
+                self.coalesced += 1
+                leader = False
+        
+        if not leader:
+            logger.info(f"Coalescing duplicate {self.name} call for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        
+        try:
+            result = fn()
+            # Followers copy from a private snapshot, never from the leader's object
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            # Record every failure, interrupts included, so followers never read an unset result
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get execution and coalescing counters.
+        
+        Returns:
+            Dict[str, int]: Calls run, calls coalesced and calls currently in flight.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight)
+            }
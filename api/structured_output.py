@@ -0,0 +1,231 @@
+"""
+api/structured_output.py
+
+Helpers for schema-constrained LLM output: lenient JSON parsing with cheap local repairs,
+a validator for the JSON Schema subset the prompts use, the adaptation of those schemas to
+OpenAI's strict mode, and the error raised when a structured completion stays unusable.
+"""
+
+import re
+import json
+from typing import Any, Dict, List
+
+# Commas directly before a closing bracket, which json.loads rejects
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*([\s\S]*?)\s*```\s*$", re.IGNORECASE)
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None)
+}
+
+# Validation keywords OpenAI's strict mode does not accept
+STRICT_UNSUPPORTED_KEYWORDS = {
+    "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "multipleOf",
+    "minLength", "maxLength", "pattern", "format", "minItems", "maxItems", "uniqueItems"
+}
+
+# Keywords that only apply to one type, kept on that type's branch when a union is split
+_TYPE_KEYWORDS = {
+    "object": ("properties", "required"),
+    "array": ("items",)
+}
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when a structured completion cannot be obtained, parsed or validated.
+    """
+    pass
+
+def parse_json(text: str) -> Any:
+    """
+    Parse JSON from model output, repairing the usual formatting slips locally.
+    
+    Tries, in order: the text as is, the text inside a Markdown code fence, the first
+    complete JSON value in the text (ignoring prose around it), and each of those with
+    trailing commas removed.
+    
+    Args:
+        text (str): The model output.
+    
+    Returns:
+        Any: The parsed value.
+    
+    Raises:
+        StructuredOutputError: If no JSON value can be recovered.
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise StructuredOutputError("Empty response")
+    
+    fence = CODE_FENCE_PATTERN.match(text)
+    candidates = [text.strip(), fence.group(1)] if fence else [text.strip()]
+    for candidate in candidates + [TRAILING_COMMA_PATTERN.sub(r"\1", candidate) for candidate in candidates]:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+        
+        value = _first_json_value(candidate)
+        if value is not None:
+            return value
+    
+    raise StructuredOutputError(f"No JSON found in response: {text[:100]}")
+
+def _first_json_value(text: str) -> Any:
+    """
+    Decode the first complete JSON object or array in a text, None if there is none.
+    """
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[{\[]", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+            return value
+        except json.JSONDecodeError:
+            continue
+    return None
+
+def validate_json(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Check a value against a JSON Schema.
+    
+    Supports the keywords the prompts' schemas use: type (a name or a list of names),
+    properties, required, items, enum, minimum and maximum. Other keywords are ignored.
+    
+    Args:
+        value (Any): The parsed value.
+        schema (Dict[str, Any]): The JSON Schema.
+        path (str, optional): Location of the value, used in error messages. Defaults to "$".
+    
+    Returns:
+        List[str]: Human-readable errors, empty if the value is valid.
+    """
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        if not any(_is_type(value, name) for name in types):
+            return [f"{path} should be {' or '.join(types)}, got {type(value).__name__}"]
+    
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path} should be one of {schema['enum']}"]
+    if _is_type(value, "number"):
+        if "minimum" in schema and value < schema["minimum"]:
+            return [f"{path} should be at least {schema['minimum']}"]
+        if "maximum" in schema and value > schema["maximum"]:
+            return [f"{path} should be at most {schema['maximum']}"]
+    
+    errors = []
+    if isinstance(value, dict):
+        errors.extend(f"{path}.{name} is required" for name in schema.get("required", []) if name not in value)
+        for name, subschema in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate_json(value[name], subschema, f"{path}.{name}"))
+    elif isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate_json(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+def _is_type(value: Any, name: str) -> bool:
+    """
+    Whether a value has a JSON Schema type; booleans are not numbers.
+    """
+    if name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _JSON_TYPES.get(name, object))
+
+def strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adapt a JSON Schema to OpenAI's strict structured outputs.
+    
+    Strict mode needs additionalProperties set to false on every object and every property
+    listed in required, so optional properties become nullable; drop_optional_nulls()
+    removes those nulls from the output again. Unions of an object or array with other
+    types become anyOf, and the validation keywords strict mode rejects are dropped.
+    
+    Args:
+        schema (Dict[str, Any]): The JSON Schema, which is not modified.
+    
+    Returns:
+        Dict[str, Any]: The strict schema.
+    """
+    schema = {key: value for key, value in schema.items() if key not in STRICT_UNSUPPORTED_KEYWORDS}
+    
+    types = schema.get("type")
+    if isinstance(types, list) and len(types) > 1 and {"object", "array"} & set(types):
+        return {"anyOf": [strict_schema(_single_type(schema, name)) for name in types]}
+    
+    if "anyOf" in schema:
+        schema["anyOf"] = [strict_schema(branch) for branch in schema["anyOf"]]
+    if "items" in schema:
+        schema["items"] = strict_schema(schema["items"])
+    if "properties" in schema:
+        required = set(schema.get("required", []))
+        schema["properties"] = {
+            name: strict_schema(subschema) if name in required else _nullable(strict_schema(subschema))
+            for name, subschema in schema["properties"].items()
+        }
+        schema["required"] = list(schema["properties"])
+        schema["additionalProperties"] = False
+    return schema
+
+def drop_optional_nulls(value: Any, schema: Dict[str, Any]) -> Any:
+    """
+    Remove the nulls strict mode puts in optional properties that do not allow null.
+    
+    Args:
+        value (Any): The parsed output.
+        schema (Dict[str, Any]): The original (not strict) JSON Schema of the output.
+    
+    Returns:
+        Any: The value without those properties, as if the model had left them out.
+    """
+    if isinstance(value, dict):
+        required = set(schema.get("required", []))
+        properties = schema.get("properties", {})
+        result = {}
+        for name, item in value.items():
+            subschema = properties.get(name)
+            if subschema is None:
+                result[name] = item
+            elif item is None and name not in required and validate_json(None, subschema):
+                continue
+            else:
+                result[name] = drop_optional_nulls(item, subschema)
+        return result
+    if isinstance(value, list) and "items" in schema:
+        return [drop_optional_nulls(item, schema["items"]) for item in value]
+    return value
+
+def _single_type(schema: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """
+    Get the branch of a union schema for one of its types.
+    """
+    other_keywords = {keyword for keywords in _TYPE_KEYWORDS.values() for keyword in keywords}
+    kept = {
+        key: value for key, value in schema.items()
+        if key != "type" and (key not in other_keywords or key in _TYPE_KEYWORDS.get(name, ()))
+    }
+    return {**kept, "type": name}
+
+def _nullable(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Let a strict schema also accept null.
+    """
+    if "anyOf" in schema:
+        if {"type": "null"} not in schema["anyOf"]:
+            schema["anyOf"].append({"type": "null"})
+        return schema
+    
+    types = schema.get("type")
+    if types is None or "enum" in schema:
+        return {"anyOf": [schema, {"type": "null"}]}
+    types = [types] if isinstance(types, str) else list(types)
+    if "null" not in types:
+        if {"object", "array"} & set(types):
+            return {"anyOf": [schema, {"type": "null"}]}
+        schema["type"] = types + ["null"]
+    return schema
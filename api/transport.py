@@ -0,0 +1,265 @@
+"""
+api/transport.py
+
+Shared HTTP transport for the external API wrappers. Provides keep-alive connection
+pools, per-provider connect/read timeouts, bounded retries with jittered backoff on
+429/5xx responses, and a circuit breaker so a failing provider is skipped in favour
+of its mock fallback instead of being waited on for every request.
+"""
+
+import time
+import random
+import logging
+import requests
+import threading
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Default settings per upstream provider; callers may override any key
+DEFAULT_TRANSPORT_SETTINGS = {
+    "googlemaps": {"connect_timeout": 3.05, "read_timeout": 10, "max_retries": 2},
+    "openweathermap": {"connect_timeout": 3.05, "read_timeout": 10, "max_retries": 2},
+    "firecrawl": {"connect_timeout": 5, "read_timeout": 60, "max_retries": 1}
+}
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a request is refused because the provider's circuit breaker is open.
+    """
+    pass
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    
+    After failure_threshold consecutive failures the breaker opens and refuses calls
+    for reset_seconds. It then lets a single trial call through (half-open): success
+    closes the breaker, failure opens it again.
+    
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_seconds (float): How long the breaker stays open before a trial call.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 60.0):
+        """
+        Initialize a closed circuit breaker.
+        
+        Args:
+            failure_threshold (int, optional): Consecutive failures before opening. Defaults to 5.
+            reset_seconds (float, optional): Seconds to stay open. Defaults to 60.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """
+        Get the breaker state: "closed", "open" or "half_open".
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+    
+    def allow(self) -> bool:
+        """
+        Check whether a call may proceed.
+        
+        Returns:
+            bool: True if the breaker is closed, or half-open with no trial call running.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self) -> None:
+        """
+        Record a successful call and close the breaker.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        """
+        Record a failed call, opening the breaker once the threshold is reached.
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class HTTPTransport:
+    """
+    Pooled, retrying HTTP client for one upstream provider.
+    
+    Wraps a requests.Session whose connection pool keeps connections alive between
+    calls, so repeated requests skip the TCP and TLS handshakes. Every request has a
+    connect and read timeout. Connection errors, timeouts and 429/5xx responses are
+    retried with exponential backoff and full jitter, honouring Retry-After. Requests
+    that still fail count towards the provider's circuit breaker.
+    
+    Attributes:
+        name (str): Provider name used in logs.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for response data.
+        max_retries (int): Retries after the first attempt.
+        breaker (CircuitBreaker): The provider's circuit breaker.
+    """
+    
+    def __init__(self,
+                 name: str,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 pool_maxsize: int = 10,
+                 failure_threshold: int = 5,
+                 reset_seconds: float = 60.0):
+        """
+        Initialize the transport.
+        
+        Args:
+            name (str): Provider name used in logs.
+            connect_timeout (float, optional): Connect timeout in seconds. Defaults to 3.05.
+            read_timeout (float, optional): Read timeout in seconds. Defaults to 10.
+            max_retries (int, optional): Retries after the first attempt. Defaults to 2.
+            backoff_base (float, optional): Base delay for exponential backoff. Defaults to 0.5.
+            backoff_max (float, optional): Maximum delay between attempts. Defaults to 8.
+            pool_maxsize (int, optional): Keep-alive connections per host. Defaults to 10.
+            failure_threshold (int, optional): Failed requests before the circuit opens.
+                Defaults to 5.
+            reset_seconds (float, optional): Seconds the circuit stays open. Defaults to 60.
+        """
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=reset_seconds)
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request. See request().
+        """
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a POST request. See request().
+        """
+        return self.request("POST", url, **kwargs)
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request with timeouts, retries and circuit breaking.
+        
+        Args:
+            method (str): HTTP method.
+            url (str): Request URL.
+            **kwargs: Passed through to requests.Session.request().
+        
+        Returns:
+            requests.Response: The final response. Non-retryable error statuses and
+                retryable ones that ran out of attempts are returned, not raised.
+        
+        Raises:
+            CircuitOpenError: If the provider's circuit breaker is open.
+            requests.RequestException: If the last attempt failed to connect, timed out
+                or the request was invalid.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open, skipping request")
+        
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                retryable = isinstance(e, (requests.ConnectionError, requests.Timeout))
+                if retryable and attempt < self.max_retries:
+                    delay = self._backoff(attempt)
+                    logger.warning(f"{self.name} request failed ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_failure()
+                raise
+            
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"{self.name} returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+                time.sleep(delay)
+                continue
+            
+            if response.status_code in RETRY_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+    
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Compute the delay before the next attempt.
+        
+        Uses the server's Retry-After (in seconds) when given, otherwise exponential
+        backoff with full jitter. Either way the delay is capped at backoff_max.
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+# Transports are shared per provider so all wrappers reuse one pool and one breaker
+_transports: Dict[str, HTTPTransport] = {}
+_transports_lock = threading.Lock()
+
+def get_transport(name: str, **settings: Any) -> HTTPTransport:
+    """
+    Get the shared transport for a provider, creating it on first use.
+    
+    Args:
+        name (str): Provider name, e.g. "googlemaps", "openweathermap" or "firecrawl".
+        **settings: HTTPTransport keyword arguments overriding DEFAULT_TRANSPORT_SETTINGS.
+            Only applied when the transport is first created.
+    
+    Returns:
+        HTTPTransport: The provider's transport.
+    """
+    with _transports_lock:
+        if name not in _transports:
+            options = {**DEFAULT_TRANSPORT_SETTINGS.get(name, {}), **settings}
+            _transports[name] = HTTPTransport(name, **options)
+            logger.info(f"Initialized HTTP transport for {name}")
+        return _transports[name]
@@ -7,9 +7,10 @@ Supports OpenWeatherMap API with mock data fallback when API keys are unavailabl
 
 import os
 import logging
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
+from api.lookup_cache import LookupCache, next_refresh_boundary
+from api.transport import CircuitOpenError, get_transport
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -27,15 +28,30 @@ class WeatherAPI:
     Attributes:
         provider (str): The weather API provider name (e.g., "openweathermap")
         api_key (str): The API key for authentication with the provider
+        cache (Optional[LookupCache]): Forecast cache, or None in mock mode
+        transport (Optional[HTTPTransport]): Shared HTTP transport, or None in mock mode
     """
     
-    def __init__(self, provider: str = "openweathermap"):
+    def __init__(self, 
+                 provider: str = "openweathermap",
+                 cache_refresh_hours: float = 3,
+                 cache_stale_seconds: float = 3 * 3600,
+                 transport_settings: Optional[Dict[str, Any]] = None):
         """
         Initialize the WeatherAPI with a specific provider.
         
         Args:
             provider (str, optional): The weather API provider to use. 
                                      Defaults to "openweathermap".
+            cache_refresh_hours (float, optional): Update cadence of the provider's
+                                     forecasts. Cached forecasts go stale at the next
+                                     multiple of this interval (UTC). Defaults to 3.
+            cache_stale_seconds (float, optional): How long a stale forecast is still
+                                     served while it is refreshed in the background.
+                                     Defaults to 3 hours.
+            transport_settings (Optional[Dict[str, Any]], optional): Overrides for the
+                                     shared HTTP transport (timeouts, retries, circuit
+                                     breaker). Defaults to None.
         
         Note:
             Falls back to "mock" mode if the required API key is not found
@@ -49,6 +65,17 @@ class WeatherAPI:
                 logger.warning("WEATHER_API_KEY not found, falling back to mock mode")
                 self.provider = "mock"
         
+        # Forecasts go stale when OpenWeatherMap publishes its next 3-hourly update
+        self.cache = None
+        self.transport = None
+        if self.provider == "openweathermap":
+            self.transport = get_transport("openweathermap", **(transport_settings or {}))
+            self.cache = LookupCache(
+                namespace="forecast",
+                fresh_until=lambda now: next_refresh_boundary(cache_refresh_hours, now),
+                stale_seconds=cache_stale_seconds
+            )
+        
         logger.info(f"Initialized WeatherAPI with provider: {self.provider}")
     
     def get_forecast(self, location: str) -> Dict[str, Any]:
@@ -69,49 +96,70 @@ class WeatherAPI:
                            weather description, and wind speed.
         """
         if self.provider == "openweathermap":
-            try:
-                # Simple implementation to get current weather
-                params = {
-                    "q": location,
-                    "appid": self.api_key,
-                    "units": "imperial"
-                }
-                
-                response = requests.get("https://api.openweathermap.org/data/2.5/forecast", params=params)
-                
-                if response.status_code == 200:
-                    logger.info("Successfully Fetched the 5-Day Weather Forecast")
-                    data = response.json()
-                    # Extract daily forecasts (every 8th entry since the API provides data in 3-hour intervals)
-                    daily_forecasts = data["list"][::8]
-                    weather_forecast = []
-                    for day_num, forecast in enumerate(daily_forecasts):
-                        weather_forecast.append(
-                            {
-                                "day": {day_num},
-                                "min_temp": f"{forecast["main"]["temp_min"]}°F",
-                                "max_temp": f"{forecast["main"]["temp_max"]}°F",
-                                "feels_like": f"{forecast["main"]["feels_like"]}°F",
-                                "description": forecast["weather"][0]["description"],
-                                "wind_speed": f"{forecast['wind']["speed"]} mph"
-                            }
-                        )
-                    
-                    forecast = {
-                        "location": location,
-                        "five_day_forecast": weather_forecast
-                    }
-                    
-                    return forecast
-                else:
-                    logger.warning(f"Failed to get weather data: {response.status_code}")
-                    return self._get_mock_forecast(location)
-            except Exception as e:
-                logger.error(f"Error fetching weather data: {e}")
-                return self._get_mock_forecast(location)
+            forecast = self.cache.get_or_fetch(
+                location,
+                fetch=lambda: self._fetch_forecast(location)
+            )
+            if forecast is not None:
+                return forecast
         
         return self._get_mock_forecast(location)
     
+    def _fetch_forecast(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a 5-day forecast from OpenWeatherMap.
+        
+        Args:
+            location (str): The location name (e.g., "Paris, France")
+            
+        Returns:
+            Optional[Dict[str, Any]]: Forecast in the same format as get_forecast(),
+                                     or None if the request fails.
+        """
+        try:
+            # Simple implementation to get current weather
+            params = {
+                "q": location,
+                "appid": self.api_key,
+                "units": "imperial"
+            }
+            
+            response = self.transport.get("https://api.openweathermap.org/data/2.5/forecast", params=params)
+            
+            if response.status_code == 200:
+                logger.info("Successfully Fetched the 5-Day Weather Forecast")
+                data = response.json()
+                # Extract daily forecasts (every 8th entry since the API provides data in 3-hour intervals)
+                daily_forecasts = data["list"][::8]
+                weather_forecast = []
+                for day_num, forecast in enumerate(daily_forecasts):
+                    weather_forecast.append(
+                        {
+                            "day": day_num + 1,
+                            "min_temp": f"{forecast["main"]["temp_min"]}°F",
+                            "max_temp": f"{forecast["main"]["temp_max"]}°F",
+                            "feels_like": f"{forecast["main"]["feels_like"]}°F",
+                            "description": forecast["weather"][0]["description"],
+                            "wind_speed": f"{forecast['wind']["speed"]} mph"
+                        }
+                    )
+                
+                forecast = {
+                    "location": location,
+                    "five_day_forecast": weather_forecast
+                }
+                
+                return forecast
+            else:
+                logger.warning(f"Failed to get weather data: {response.status_code}")
+                return None
+        except CircuitOpenError as e:
+            logger.warning(f"{e}, using mock forecast")
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching weather data: {e}")
+            return None
+    
     def _get_mock_forecast(self, location: str) -> Dict[str, Any]:
         """
         Generate a mock weather forecast when actual API data is unavailable.
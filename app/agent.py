@@ -5,23 +5,35 @@ Travel Planner Agent orchestrator module that coordinates the end-to-end travel
 This module integrates various components to generate personalized travel plans from user queries.
 """
 
+import json
+import asyncio
 import logging
 from api.maps import MapsAPI 
 from api.search import SearchAPI
-from typing import Dict, List, Any
+from typing import Dict, List, Any, AsyncIterator, Optional
 from api.weather import WeatherAPI
 from api.scrape import WebScrapperAPI
 from api.llm_provider import LLMProvider
+from api.llm_cache import CompletionCache, create_completion_cache
+from api.llm_hedging import create_hedged_provider
+from api.rate_limiter import RateLimiter, create_rate_limiter
 from app.modules.guardrail import Guardrail
+from app.modules.input_analyzer import InputAnalyzer
+from app.modules.query_planner import QueryPlanner
 from app.modules.output_generator import OutputGenerator
 from app.modules.context_collector import ContextCollector
+from app.modules.local_extractor import LocalFeatureExtractor
 from app.modules.search_query_extractor import SearchQueryExtractor
 from app.modules.search_query_generator import SearchQueryGenerator
+from app.session_store import DEFAULT_SESSION_ID, create_session_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pipeline stages that can each be routed to their own LLM with llm.stages
+LLM_STAGES = ("guardrail", "extraction", "query_generation", "output")
+
 class TravelPlannerAgent:
     """
     Main Travel Planner Agent class that orchestrates the end-to-end planning process.
@@ -41,49 +53,141 @@ class TravelPlannerAgent:
         """
         logger.info("Initializing TravelPlannerAgent")
         
-        # Initialize LLM provider
-        llm_config = config.get("llm", {})
-        self.llm_provider = LLMProvider(
-            provider=llm_config.get("provider", "anthropic"),
-            model=llm_config.get("model", "claude-3-5-sonnet"),
-            temperature=llm_config.get("temperature", 0.7),
-            max_tokens=llm_config.get("max_tokens", 4000)
-        )
+        # Initialize one LLM provider per pipeline stage; the output stage uses the main settings.
+        # All stages draw from one rate limiter, shared with other worker processes through its database
+        completion_cache = create_completion_cache(config.get("llm_cache"))
+        self.rate_limiter = create_rate_limiter(config.get("llm_rate_limit"))
+        self.llm_providers = self._create_stage_providers(config.get("llm", {}), completion_cache, self.rate_limiter)
+        self.llm_provider = self.llm_providers["output"]
         
         # Initialize APIs with real implementations
         api_config = config.get("apis", {})
         
+        weather_config = api_config.get("weather", {})
         self.weather_api = WeatherAPI(
-            provider=api_config.get("weather", {}).get("provider", "openweathermap")
+            provider=weather_config.get("provider", "openweathermap"),
+            cache_refresh_hours=weather_config.get("cache_refresh_hours", 3),
+            cache_stale_seconds=weather_config.get("cache_stale_seconds", 3 * 3600),
+            transport_settings=weather_config.get("transport")
         )
         
+        maps_config = api_config.get("maps", {})
         self.maps_api = MapsAPI(
-            provider=api_config.get("maps", {}).get("provider", "googlemaps")
+            provider=maps_config.get("provider", "googlemaps"),
+            cache_fresh_seconds=maps_config.get("cache_fresh_seconds", 30 * 24 * 3600),
+            cache_stale_seconds=maps_config.get("cache_stale_seconds", 60 * 24 * 3600),
+            transport_settings=maps_config.get("transport")
         )
         
         self.search_api = SearchAPI()
-        self.scrape_api = WebScrapperAPI()
+        
+        scrape_config = api_config.get("scrape", {})
+        self.scrape_api = WebScrapperAPI(
+            cache_ttl_seconds=scrape_config.get("cache_ttl_seconds", 7 * 24 * 3600),
+            cache_max_bytes=scrape_config.get("cache_max_bytes", 64 * 1024 * 1024),
+            transport_settings=scrape_config.get("transport")
+        )
         
         # Initialize modules
-        self.guardrail = Guardrail(self.llm_provider)
-        self.query_extractor = SearchQueryExtractor(self.llm_provider)
-        self.query_generator = SearchQueryGenerator(self.llm_provider)
+        self.guardrail = Guardrail(self.llm_providers["guardrail"])
+        pipeline_config = config.get("pipeline", {})
+        local_config = pipeline_config.get("local_extraction", {})
+        local_extractor = None
+        if local_config.get("enabled", False):
+            local_extractor = LocalFeatureExtractor(min_confidence=local_config.get("min_confidence", 0.9))
+        self.query_extractor = SearchQueryExtractor(self.llm_providers["extraction"], local_extractor=local_extractor)
+        self.input_analyzer = InputAnalyzer(self.llm_providers["extraction"], self.guardrail, self.query_extractor)
+        self.fused_input_analysis = pipeline_config.get("fused_input_analysis", False)
+        query_generation_config = config.get("query_generation", {})
+        self.query_generator = SearchQueryGenerator(
+            self.llm_providers["query_generation"],
+            mode=query_generation_config.get("mode", "llm"),
+            templates=query_generation_config.get("templates")
+        )
+        planner_config = config.get("query_planner", {})
+        self.query_planner = None
+        if planner_config.get("enabled", True):
+            self.query_planner = QueryPlanner(
+                max_searches=planner_config.get("max_searches", 8),
+                max_scrapes=planner_config.get("max_scrapes", 8),
+                similarity_threshold=planner_config.get("similarity_threshold", 0.8),
+                feature_weights=planner_config.get("feature_weights")
+            )
+        context_config = config.get("context", {})
         self.context_collector = ContextCollector(
             search_api=self.search_api,
             weather_api=self.weather_api,
             maps_api=self.maps_api,
-            scrape_api=self.scrape_api
+            scrape_api=self.scrape_api,
+            concurrent=context_config.get("concurrent", True),
+            max_workers=context_config.get("max_workers", 8),
+            deadline_seconds=context_config.get("deadline_seconds", 45.0),
+            provider_limits=context_config.get("provider_limits")
+        )
+        output_config = config.get("output", {})
+        self.output_generator = OutputGenerator(
+            self.llm_providers["output"],
+            section_timeouts=output_config.get("section_timeouts"),
+            context_budgets=output_config.get("context_budgets"),
+            max_repair_rounds=output_config.get("max_repair_rounds", 2),
+            long_trip=output_config.get("long_trip")
         )
-        self.output_generator = OutputGenerator(self.llm_provider)
         
-        # Store conversation history
-        self.conversation_history = []
+        # Conversation history, last itinerary and last features, kept per session
+        self.session_store = create_session_store(config.get("sessions", {}))
         
-        # Store the last generated itinerary and features
-        self.last_itinerary = ""
-        self.last_features = {}
-    
-    def process_input(self, user_input: str, eval: bool = False) -> Dict[str, Any]:
+    def _create_stage_providers(self,
+                                llm_config: Dict[str, Any],
+                                completion_cache: Optional[CompletionCache],
+                                rate_limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
+        """
+        Create the LLM provider of each pipeline stage.
+        
+        Each entry of llm_config["stages"] overrides the main LLM settings for one stage,
+        so short classification and JSON tasks can run on a small, fast model while the
+        itinerary uses a large one. Stages that end up with the same settings share one
+        provider, and with it its connection pool and usage counters.
+        
+        Args:
+            llm_config: The "llm" configuration section
+            completion_cache: Completion cache shared by all providers, if enabled
+            rate_limiter: Rate limiter shared by all providers, if enabled
+            
+        Returns:
+            Dictionary mapping each of LLM_STAGES to its provider
+        """
+        base_config = {key: value for key, value in llm_config.items() if key != "stages"}
+        stage_configs = llm_config.get("stages") or {}
+        for stage in set(stage_configs) - set(LLM_STAGES):
+            logger.warning(f"Ignoring LLM settings for unknown stage '{stage}'")
+        
+        providers = {}
+        created = {}
+        for stage in LLM_STAGES:
+            stage_config = {**base_config, **(stage_configs.get(stage) or {})}
+            key = json.dumps(stage_config, sort_keys=True, default=str)
+            if key not in created:
+                llm_provider = LLMProvider(
+                    provider=stage_config.get("provider", "anthropic"),
+                    model=stage_config.get("model", "claude-3-5-sonnet"),
+                    temperature=stage_config.get("temperature", 0.7),
+                    max_tokens=stage_config.get("max_tokens", 4000),
+                    max_connections=stage_config.get("max_connections", 20),
+                    prompt_caching=stage_config.get("prompt_caching", True),
+                    cache=completion_cache,
+                    rate_limiter=rate_limiter,
+                    priority=stage_config.get("priority"),
+                    structured_output=stage_config.get("structured_output", True),
+                    max_json_repairs=stage_config.get("max_json_repairs", 1)
+                )
+                # Hedged with a secondary provider if configured
+                created[key] = create_hedged_provider(llm_provider, stage_config.get("hedging"), completion_cache)
+            providers[stage] = created[key]
+            logger.info(f"Using {providers[stage].provider} model {providers[stage].model} for the {stage} stage")
+        
+        return providers
+        
+    def process_input(self, user_input: str, eval: bool = False, session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
         """
         Process user input and generate comprehensive travel plans.
         
@@ -95,6 +199,7 @@ class TravelPlannerAgent:
             user_input: The user's text input containing travel preferences
             eval: Flag indicating whether to return evaluation data structure
                   instead of just the travel plan output
+            session_id: The session whose conversation history the turn is recorded in
             
         Returns:
             If eval=False: Dictionary with generated travel plans including itinerary,
@@ -105,18 +210,12 @@ class TravelPlannerAgent:
         logger.info("Processing user input")
         
         try:
-            # Input Validation
-            is_valid = self.guardrail.validate_input(user_input)
-            if not is_valid:
-                raise ValueError("Invalid User Input.")
-            logger.info("Validated the User Input")
-
-            # 1. Extract features from user input
-            features = self.query_extractor.extract_features(user_input)
+            # Input Validation and 1. Extract features from user input
+            features = self._analyze_input(user_input)
             logger.info(f"Extracted features: {features}")
             
             # 2. Generate search queries
-            queries = self.query_generator.generate_queries(features)
+            queries = self._plan_queries(self.query_generator.generate_queries(features))
             logger.info(f"Generated queries: {queries}")
             
             # 3. Collect context information
@@ -127,52 +226,287 @@ class TravelPlannerAgent:
             output = self.output_generator.generate_itinerary(features, context)
             logger.info("Generated travel plan output")
             
-            # 5. Add fallback responses if any component failed
-            if not output.get("itinerary"):
-                logger.warning("No itinerary was generated, providing fallback")
-                output["itinerary"] = self._generate_fallback_itinerary(features)
+            return self._finalize_output(user_input, features, queries, context, output, eval, session_id)
+        
+        except Exception as e:
+            logger.error(f"Error in process_input: {str(e)}", exc_info=True)
+            return self._generate_error_output()
+    
+    async def aprocess_input(self, user_input: str, eval: bool = False, session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
+        """
+        Process user input and generate travel plans without blocking the event loop.
+        
+        Async counterpart of process_input() for use from async web handlers. LLM calls
+        go through the provider's async client and the blocking context collection runs
+        in a worker thread, so one event loop can serve many plans concurrently.
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            eval: Flag indicating whether to return evaluation data structure
+                  instead of just the travel plan output
+            session_id: The session whose conversation history the turn is recorded in
+            
+        Returns:
+            Same structure as process_input()
+        """
+        logger.info("Processing user input")
+        
+        try:
+            # Input Validation and 1. Extract features from user input
+            features = await self._aanalyze_input(user_input)
+            logger.info(f"Extracted features: {features}")
+            
+            # 2. Generate search queries
+            queries = self._plan_queries(await self.query_generator.agenerate_queries(features))
+            logger.info(f"Generated queries: {queries}")
+            
+            # 3. Collect context information
+            context = await asyncio.to_thread(self.context_collector.collect_context, queries, features)
+            logger.info("Collected context information")
+            
+            # 4. Generate travel plans
+            output = await self.output_generator.agenerate_itinerary(features, context)
+            logger.info("Generated travel plan output")
+            
+            return self._finalize_output(user_input, features, queries, context, output, eval, session_id)
+        
+        except Exception as e:
+            logger.error(f"Error in aprocess_input: {str(e)}", exc_info=True)
+            return self._generate_error_output()
+    
+    async def astream_input(self, user_input: str, session_id: str = DEFAULT_SESSION_ID) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process user input, yielding progress events as each pipeline stage completes.
+        
+        Runs the same pipeline as aprocess_input() but reports stage progress and
+        streams the itinerary text while the LLM produces it, so clients can show
+        output long before the full plan is ready.
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            session_id: The session whose conversation history the turn is recorded in
             
-            if not output.get("packing_list"):
-                logger.warning("No packing list was generated, providing fallback")
-                output["packing_list"] = self._generate_fallback_packing_list(features)
+        Yields:
+            Event dictionaries with "event" and "data" keys, in order:
+            - "guardrail": {"passed": True}
+            - "features": the extracted features
+            - "queries": the generated search queries
+            - "context": counts of the collected search results, weather and map info
+            - "itinerary_delta": {"text": str}, repeated while the itinerary streams
+            - "result": the final output, with the same structure as process_input()
+        """
+        logger.info("Processing user input (streaming)")
+        
+        try:
+            # Input Validation
+            features = await self._avalidate_input(user_input)
+            yield {"event": "guardrail", "data": {"passed": True}}
             
-            if not output.get("estimated_budget"):
-                logger.warning("No budget estimate was generated, providing fallback")
-                output["estimated_budget"] = self._generate_fallback_budget(features)
+            # 1. Extract features from user input, unless the fused analysis already did
+            if features is None:
+                features = await self.query_extractor.aextract_features(user_input)
+            logger.info(f"Extracted features: {features}")
+            yield {"event": "features", "data": features}
             
-            # Store for later use
-            self.last_itinerary = output.get("itinerary", "")
-            self.last_features = features
+            # 2. Generate search queries
+            queries = self._plan_queries(await self.query_generator.agenerate_queries(features))
+            logger.info(f"Generated queries: {queries}")
+            yield {"event": "queries", "data": queries}
             
-            # 6. Update conversation history
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_input
-            })
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": output.get("itinerary", "")
-            })
-
-            if eval:
-                eval_output = {
-                    "features": features,
-                    "queries": queries,
-                    "context": context,
-                    "output": output
+            # 3. Collect context information
+            context = await asyncio.to_thread(self.context_collector.collect_context, queries, features)
+            logger.info("Collected context information")
+            yield {
+                "event": "context",
+                "data": {
+                    "search_results": sum(len(result.get("results", [])) for result in context.get("search_results", [])),
+                    "weather_info": bool(context.get("weather_info")),
+                    "map_info": bool(context.get("map_info"))
                 }
-                return eval_output
+            }
             
-            return output
+            # 4. Generate travel plans, forwarding itinerary text as it streams
+            output = {}
+            async for event in self.output_generator.astream_itinerary(features, context):
+                if event["event"] == "output":
+                    output = event["data"]
+                else:
+                    yield event
+            logger.info("Generated travel plan output")
+            
+            result = self._finalize_output(user_input, features, queries, context, output, False, session_id)
         
         except Exception as e:
-            logger.error(f"Error in process_input: {str(e)}", exc_info=True)
-            # Return a basic response in case of error
-            return {
-                "itinerary": "I apologize, but I couldn't generate a travel plan due to an error. Please try again with more specific details about your destination, dates, and preferences.",
-                "packing_list": "Unable to generate packing list due to an error.",
-                "estimated_budget": "Unable to generate budget estimate due to an error."
+            logger.error(f"Error in astream_input: {str(e)}", exc_info=True)
+            result = self._generate_error_output()
+        
+        yield {"event": "result", "data": result}
+    
+    def _analyze_input(self, user_input: str) -> Dict[str, Any]:
+        """
+        Validate the user input and extract its travel features.
+        
+        Uses one fused LLM call when pipeline.fused_input_analysis is enabled, otherwise
+        the guardrail followed by the feature extractor.
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            
+        Returns:
+            The extracted travel features
+            
+        Raises:
+            ValueError: If the input fails validation
+        """
+        features = self._validate_input(user_input)
+        if features is None:
+            features = self.query_extractor.extract_features(user_input)
+        return features
+    
+    def _validate_input(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """
+        Validate the user input.
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            
+        Returns:
+            The travel features when the fused analysis extracted them along with the
+            validation, otherwise None
+            
+        Raises:
+            ValueError: If the input fails validation
+        """
+        if self.fused_input_analysis:
+            is_valid, reason, features = self.input_analyzer.analyze(user_input)
+        else:
+            is_valid, reason = self.guardrail.validate_input(user_input)
+            features = None
+        
+        if not is_valid:
+            raise ValueError(f"Invalid User Input: {reason}")
+        logger.info("Validated the User Input")
+        return features
+    
+    async def _aanalyze_input(self, user_input: str) -> Dict[str, Any]:
+        """
+        Async counterpart of _analyze_input().
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            
+        Returns:
+            The extracted travel features
+            
+        Raises:
+            ValueError: If the input fails validation
+        """
+        features = await self._avalidate_input(user_input)
+        if features is None:
+            features = await self.query_extractor.aextract_features(user_input)
+        return features
+    
+    async def _avalidate_input(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """
+        Async counterpart of _validate_input().
+        
+        Args:
+            user_input: The user's text input containing travel preferences
+            
+        Returns:
+            The travel features when the fused analysis extracted them along with the
+            validation, otherwise None
+            
+        Raises:
+            ValueError: If the input fails validation
+        """
+        if self.fused_input_analysis:
+            is_valid, reason, features = await self.input_analyzer.aanalyze(user_input)
+        else:
+            is_valid, reason = await self.guardrail.avalidate_input(user_input)
+            features = None
+        
+        if not is_valid:
+            raise ValueError(f"Invalid User Input: {reason}")
+        logger.info("Validated the User Input")
+        return features
+    
+    def _plan_queries(self, queries: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Deduplicate and budget the generated queries when the query planner is enabled.
+        
+        Args:
+            queries: The generated search queries
+        
+        Returns:
+            The queries to collect context for
+        """
+        if self.query_planner is None:
+            return queries
+        return self.query_planner.plan(queries)
+    
+    def _finalize_output(self, 
+                         user_input: str, 
+                         features: Dict[str, Any], 
+                         queries: List[Dict[str, str]], 
+                         context: Dict[str, Any], 
+                         output: Dict[str, Any], 
+                         eval: bool,
+                         session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
+        """
+        Apply fallbacks, record the conversation and shape the pipeline result.
+        
+        Args:
+            user_input: The user's text input
+            features: Extracted travel features
+            queries: Generated search queries
+            context: Collected context information
+            output: Generated travel plan output
+            eval: Whether to return the evaluation data structure
+            session_id: The session the turn is recorded in
+            
+        Returns:
+            The travel plan output, or the evaluation data structure if eval=True
+        """
+        # 5. Add fallback responses if any component failed
+        if not output.get("itinerary"):
+            logger.warning("No itinerary was generated, providing fallback")
+            output["itinerary"] = self._generate_fallback_itinerary(features)
+        
+        if not output.get("packing_list"):
+            logger.warning("No packing list was generated, providing fallback")
+            output["packing_list"] = self._generate_fallback_packing_list(features)
+        
+        if not output.get("estimated_budget"):
+            logger.warning("No budget estimate was generated, providing fallback")
+            output["estimated_budget"] = self._generate_fallback_budget(features)
+        
+        # 6. Update the session's conversation history, last itinerary and features
+        self.session_store.record_turn(session_id, user_input, output.get("itinerary", ""), features)
+
+        if eval:
+            eval_output = {
+                "features": features,
+                "queries": queries,
+                "context": context,
+                "output": output
             }
+            return eval_output
+        
+        return output
+    
+    def _generate_error_output(self) -> Dict[str, str]:
+        """
+        Build the basic response returned when the pipeline fails.
+        
+        Returns:
+            Dictionary with apology messages for each output section
+        """
+        return {
+            "itinerary": "I apologize, but I couldn't generate a travel plan due to an error. Please try again with more specific details about your destination, dates, and preferences.",
+            "packing_list": "Unable to generate packing list due to an error.",
+            "estimated_budget": "Unable to generate budget estimate due to an error."
+        }
     
     def _generate_fallback_itinerary(self, features: Dict[str, Any]) -> str:
         """
@@ -288,14 +622,30 @@ For a detailed budget estimate, please provide information about your accommodat
         
         return fallback.strip()
     
-    def get_conversation_history(self) -> List[Dict[str, str]]:
+    def get_conversation_history(self, session_id: str = DEFAULT_SESSION_ID) -> List[Dict[str, str]]:
         """
         Get the conversation history between user and assistant.
         
         Retrieves the stored conversation messages for context-aware
         responses in follow-up interactions.
         
+        Args:
+            session_id: The session to read
+            
+        Returns:
+            List of conversation message dictionaries with role and content,
+            the newest messages only once the session's history limit is reached
+        """
+        return self.session_store.get(session_id)["history"]
+    
+    def get_session(self, session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
+        """
+        Get the stored state of a session.
+        
+        Args:
+            session_id: The session to read
+            
         Returns:
-            List of conversation message dictionaries with role and content
+            Dictionary with the session's 'history', 'last_itinerary' and 'last_features'
         """
-        return self.conversation_history
\ No newline at end of file
+        return self.session_store.get(session_id)
\ No newline at end of file
@@ -5,25 +5,48 @@ Context collection module that gathers information from various sources using se
 Serves as an information aggregator for the travel planning system, fetching relevant data based on search queries and features.
 """
 
+import time
 import logging
+import threading
 from api.maps import MapsAPI
 from api.search import SearchAPI
 from api.weather import WeatherAPI
-from typing import Dict, List, Any
 from api.scrape import WebScrapperAPI
+from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default number of in-flight calls allowed per upstream provider
+DEFAULT_PROVIDER_LIMITS = {
+    "search": 2,
+    "scrape": 4,
+    "weather": 1,
+    "maps": 1
+}
+
 class ContextCollector:
     """
     Collects context information from various external sources.
     
     This class coordinates data gathering from search, scraping, weather, and maps APIs
     to compile comprehensive context information for travel planning purposes.
+    
+    In concurrent mode every search-then-scrape chain, the weather lookup and the
+    geocode lookup run in parallel on a bounded thread pool, with a per-provider cap on
+    in-flight calls and an overall deadline after which partial results are returned.
     """
     
-    def __init__(self, search_api: SearchAPI, scrape_api: WebScrapperAPI, weather_api: WeatherAPI = None, maps_api: MapsAPI = None):
+    def __init__(self, 
+                 search_api: SearchAPI, 
+                 scrape_api: WebScrapperAPI, 
+                 weather_api: WeatherAPI = None, 
+                 maps_api: MapsAPI = None,
+                 concurrent: bool = True,
+                 max_workers: int = 8,
+                 deadline_seconds: float = 45.0,
+                 provider_limits: Optional[Dict[str, int]] = None):
         """
         Initialize the ContextCollector with required API interfaces.
         
@@ -32,11 +55,24 @@ class ContextCollector:
             scrape_api: API interface for web scraping
             weather_api: Optional API interface for weather forecasts
             maps_api: Optional API interface for geographical data
+            concurrent: Whether to collect context in parallel. Defaults to True.
+            max_workers: Size of the thread pool used in concurrent mode. Defaults to 8.
+            deadline_seconds: Overall time budget for concurrent collection. Defaults to 45.
+            provider_limits: Maximum in-flight calls per provider ("search", "scrape",
+                            "weather", "maps"). Missing keys use DEFAULT_PROVIDER_LIMITS.
         """
         self.search_api = search_api
         self.weather_api = weather_api
         self.maps_api = maps_api
         self.scrape_api = scrape_api
+        self.concurrent = concurrent
+        self.max_workers = max_workers
+        self.deadline_seconds = deadline_seconds
+        
+        limits = {**DEFAULT_PROVIDER_LIMITS, **(provider_limits or {})}
+        self._provider_semaphores = {
+            name: threading.BoundedSemaphore(max(1, limit)) for name, limit in limits.items()
+        }
         logger.info("Initialized Search Query Feature Extractor with provider")
     
     def collect_context(self, queries: List[Dict[str, str]], features: Dict[str, Any]) -> Dict[str, Any]:
@@ -58,6 +94,9 @@ class ContextCollector:
             - weather_info: Weather forecast data (if available)
             - map_info: Geographical information (if available)
         """
+        if self.concurrent:
+            return self._collect_context_concurrent(queries, features)
+        
         context = {
             "search_results": [],
             "weather_info": {},
@@ -69,38 +108,171 @@ class ContextCollector:
             search_query = query_obj.get("search_query", "")
             if not search_query:
                 continue
-                
-            search_links = self.search_api.search(search_query, num_results=1)
-            results = []
-            for link in search_links:
-                places_info = self.scrape_api.scrape(
-                    url=link
-                )
-                results.extend(places_info)
-
-            context["search_results"].append({
-                "feature_type": query_obj.get("feature_type", ""),
-                "feature_value": query_obj.get("feature_value", ""),
-                "query": search_query,
-                "results": results
-            })
+            
+            context["search_results"].append(self._collect_search_results(query_obj))
         
         # Collect weather information if available
         if self.weather_api and features.get("place_to_visit"):
-            try:
-                weather_info = self.weather_api.get_forecast(
-                    location=features["place_to_visit"]
-                )
-                context["weather_info"] = weather_info
-            except Exception as e:
-                print(f"Error fetching weather information: {e}")
+            context["weather_info"] = self._collect_weather_info(features["place_to_visit"])
         
         # Collect map information if available
         if self.maps_api and features.get("place_to_visit"):
-            try:
-                map_info = self.maps_api.get_location_info(features["place_to_visit"])
-                context["map_info"] = map_info
-            except Exception as e:
-                print(f"Error fetching map information: {e}")
+            context["map_info"] = self._collect_map_info(features["place_to_visit"])
+        
+        return context
+    
+    def _collect_context_concurrent(self, queries: List[Dict[str, str]], features: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Collect context with all upstream lookups running in parallel.
+        
+        Search results keep the order of the input queries. Lookups that have not
+        finished when the deadline expires are abandoned: their queries are returned
+        with empty results and missing weather or map info is left empty.
+        
+        Args:
+            queries: List of dictionaries containing feature type, value, and search query
+            features: Extracted travel features including destination, preferences, etc.
+            
+        Returns:
+            Dictionary with the same structure as collect_context()
+        """
+        context = {
+            "search_results": [],
+            "weather_info": {},
+            "map_info": {}
+        }
+        
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="context")
         
-        return context
\ No newline at end of file
+        try:
+            # Submit the single-call lookups first so they never queue behind search chains
+            weather_future = None
+            if self.weather_api and features.get("place_to_visit"):
+                weather_future = executor.submit(self._collect_weather_info, features["place_to_visit"])
+            
+            map_future = None
+            if self.maps_api and features.get("place_to_visit"):
+                map_future = executor.submit(self._collect_map_info, features["place_to_visit"])
+            
+            search_futures = []
+            for query_obj in queries:
+                if not query_obj.get("search_query", ""):
+                    continue
+                search_futures.append((query_obj, executor.submit(self._collect_search_results, query_obj)))
+            
+            all_futures = [future for _, future in search_futures]
+            all_futures += [future for future in (weather_future, map_future) if future is not None]
+            
+            done, not_done = wait(all_futures, timeout=self.deadline_seconds)
+            if not_done:
+                logger.warning(f"Context collection deadline of {self.deadline_seconds}s reached, "
+                               f"returning partial results ({len(not_done)} of {len(all_futures)} lookups pending)")
+            
+            for query_obj, future in search_futures:
+                if future in done and future.exception() is None:
+                    context["search_results"].append(future.result())
+                else:
+                    if future in done:
+                        logger.error(f"Error collecting search results: {future.exception()}")
+                    context["search_results"].append(self._empty_search_result(query_obj))
+            
+            if weather_future is not None and weather_future in done and weather_future.exception() is None:
+                context["weather_info"] = weather_future.result()
+            
+            if map_future is not None and map_future in done and map_future.exception() is None:
+                context["map_info"] = map_future.result()
+        finally:
+            # Don't block on stragglers past the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        logger.info(f"Collected context concurrently in {time.monotonic() - started:.2f}s")
+        return context
+    
+    def _collect_search_results(self, query_obj: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Run one search query and scrape every link it returns that is not cached.
+        
+        Args:
+            query_obj: Dictionary containing feature type, value, and search query
+            
+        Returns:
+            Dictionary with the feature type, value, query and scraped results
+        """
+        search_query = query_obj.get("search_query", "")
+        
+        with self._provider_semaphores["search"]:
+            search_links = self.search_api.search(search_query, num_results=1)
+        
+        # Cached pages are read in one lookup and never wait for a scrape slot
+        cached = self.scrape_api.get_cached_many(search_links)
+        
+        results = []
+        for link in search_links:
+            places_info = cached.get(link)
+            if not places_info:
+                with self._provider_semaphores["scrape"]:
+                    places_info = self.scrape_api.scrape(
+                        url=link
+                    )
+            results.extend(places_info)
+        
+        return {
+            "feature_type": query_obj.get("feature_type", ""),
+            "feature_value": query_obj.get("feature_value", ""),
+            "query": search_query,
+            "results": results
+        }
+    
+    def _empty_search_result(self, query_obj: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Build a search result entry with no results for an unfinished query.
+        
+        Args:
+            query_obj: Dictionary containing feature type, value, and search query
+            
+        Returns:
+            Dictionary with the feature type, value, query and an empty results list
+        """
+        return {
+            "feature_type": query_obj.get("feature_type", ""),
+            "feature_value": query_obj.get("feature_value", ""),
+            "query": query_obj.get("search_query", ""),
+            "results": []
+        }
+    
+    def _collect_weather_info(self, location: str) -> Dict[str, Any]:
+        """
+        Fetch the weather forecast for a location.
+        
+        Args:
+            location: Destination name
+            
+        Returns:
+            Weather forecast data, or an empty dictionary on error
+        """
+        try:
+            with self._provider_semaphores["weather"]:
+                return self.weather_api.get_forecast(
+                    location=location
+                )
+        except Exception as e:
+            print(f"Error fetching weather information: {e}")
+            return {}
+    
+    def _collect_map_info(self, location: str) -> Dict[str, Any]:
+        """
+        Fetch geographical information for a location.
+        
+        Args:
+            location: Destination name
+            
+        Returns:
+            Location data, or an empty dictionary on error
+        """
+        try:
+            with self._provider_semaphores["maps"]:
+                return self.maps_api.get_location_info(location)
+        except Exception as e:
+            print(f"Error fetching map information: {e}")
+            return {}
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+app/modules/context_packer.py
+
+Context packing module for the output prompts. Counts tokens with the provider's tokenizer,
+removes places repeated across search results and map data, and trims the collected context
+to a token budget per output section, keeping the highest-ranked items.
+"""
+
+import re
+import math
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Optional; token counts are estimated from the text length without it
+    tiktoken = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Context each output section is given
+SECTION_CONTEXT = {
+    "itinerary": ("search_results", "weather_info", "map_info"),
+    "packing_list": ("weather_info",),
+    "estimated_budget": ()
+}
+
+# Default token budget for the context of each output section
+DEFAULT_CONTEXT_BUDGETS = {
+    "itinerary": 3000,
+    "packing_list": 400,
+    "estimated_budget": 0
+}
+
+# Average characters per token, used when no local tokenizer is available
+CHARS_PER_TOKEN = {
+    "anthropic": 3.5,
+    "openai": 4.0
+}
+
+MAP_CATEGORIES = ("tourist_attraction", "restaurant", "hotel")
+
+class TokenCounter:
+    """
+    Counts tokens for one LLM provider and model.
+    
+    OpenAI models are counted exactly with tiktoken when it is installed. Other providers,
+    whose tokenizers are only reachable through an API call, are estimated from the text
+    length.
+    
+    Attributes:
+        provider (str): The LLM provider name.
+        model (str): The model name.
+    """
+    
+    def __init__(self, provider: str, model: str):
+        """
+        Initialize the TokenCounter.
+        
+        Args:
+            provider (str): The LLM provider name ('anthropic' or 'openai').
+            model (str): The model name.
+        """
+        self.provider = (provider or "").lower()
+        self.model = model
+        self.chars_per_token = CHARS_PER_TOKEN.get(self.provider, 4.0)
+        self._encoding = None
+        if tiktoken is not None and self.provider == "openai":
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    # Models tiktoken does not know yet are counted with the newest encoding
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"Could not load the tokenizer for {model}, estimating token counts: {e}")
+    
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a text.
+        
+        Args:
+            text (str): The text to count.
+        
+        Returns:
+            int: The number of tokens.
+        """
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return math.ceil(len(text) / self.chars_per_token)
+
+class ContextPacker:
+    """
+    Selects the collected context each output section is given.
+    
+    Each section only receives the context kinds listed in SECTION_CONTEXT. Places are
+    deduplicated by name: a place described under several feature types is kept under
+    the first (most important) one, and map places already described by a search result
+    are dropped. The section's token budget is then shared between its context kinds,
+    smallest first, with any share a kind does not use passed on to the rest. Within a
+    kind, items are taken in rank order: search results round-robin over the queries, so
+    every feature gets its top places first, map places by rating and forecast days in order.
+    
+    Attributes:
+        token_counter (TokenCounter): Token counter for the provider's tokenizer.
+        context_budgets (Dict[str, Optional[int]]): Token budget per section, None for no limit.
+    """
+    
+    def __init__(self, token_counter: TokenCounter, context_budgets: Optional[Dict[str, Optional[int]]] = None):
+        """
+        Initialize the ContextPacker.
+        
+        Args:
+            token_counter (TokenCounter): Token counter for the provider's tokenizer.
+            context_budgets (Optional[Dict[str, Optional[int]]], optional): Budgets overriding
+                entries of DEFAULT_CONTEXT_BUDGETS. Defaults to None.
+        """
+        self.token_counter = token_counter
+        self.context_budgets = {**DEFAULT_CONTEXT_BUDGETS, **(context_budgets or {})}
+    
+    def pack(self, section: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the context for one output section, trimmed to its token budget.
+        
+        Args:
+            section (str): The output section name.
+            context (Dict[str, Any]): Collected context with 'search_results', 'weather_info'
+                and 'map_info'.
+        
+        Returns:
+            Dict[str, Any]: The same keys as the context, empty for kinds the section doesn't use.
+        """
+        kinds = SECTION_CONTEXT.get(section, ())
+        search_results = []
+        if "search_results" in kinds:
+            search_results = self._deduplicate_search_results(context.get("search_results", []))
+        weather_info = context.get("weather_info", {}) if "weather_info" in kinds else {}
+        map_info = {}
+        if "map_info" in kinds:
+            map_info = self._without_known_places(context.get("map_info", {}), search_results)
+        
+        items = {
+            "search_results": self._search_items(search_results),
+            "weather_info": self._weather_items(weather_info),
+            "map_info": self._map_items(map_info)
+        }
+        total = sum(cost for kind_items in items.values() for _, cost in kind_items)
+        budget = self.context_budgets.get(section)
+        selected, used = self._allocate(items, total if budget is None else budget)
+        
+        logger.info(f"Packed {section} context: {used} of {total} tokens (budget {budget})")
+        return {
+            "search_results": self._rebuild_search_results(search_results, selected["search_results"]),
+            "weather_info": self._rebuild_weather_info(weather_info, selected["weather_info"]),
+            "map_info": self._rebuild_map_info(map_info, selected["map_info"])
+        }
+    
+    def _allocate(self, items: Dict[str, List[Tuple[Any, int]]], budget: int) -> Tuple[Dict[str, List[Any]], int]:
+        """
+        Share the budget between the context kinds, smallest first, taking each kind's items in rank order.
+        """
+        kinds = sorted(items, key=lambda kind: sum(cost for _, cost in items[kind]))
+        selected = {}
+        remaining = max(0, budget)
+        used_total = 0
+        for index, kind in enumerate(kinds):
+            share = remaining / (len(kinds) - index)
+            chosen = []
+            used = 0
+            for item, cost in items[kind]:
+                if used + cost > share:
+                    break
+                chosen.append(item)
+                used += cost
+            selected[kind] = chosen
+            remaining -= used
+            used_total += used
+        return selected, used_total
+    
+    def _deduplicate_search_results(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keep each place only under the first query group that mentions it.
+        """
+        seen = set()
+        deduplicated = []
+        for query_results in search_results:
+            results = []
+            for result in query_results.get("results", []) or []:
+                key = self._place_key(result.get("name"))
+                if key and key in seen:
+                    continue
+                seen.add(key)
+                results.append(result)
+            deduplicated.append({**query_results, "results": results})
+        return deduplicated
+    
+    def _without_known_places(self, map_info: Dict[str, Any], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Drop nearby places that a search result already describes.
+        """
+        nearby_places = map_info.get("nearby_places") if map_info else None
+        if not nearby_places:
+            return map_info
+        known = {self._place_key(result.get("name"))
+                 for query_results in search_results for result in query_results.get("results", [])}
+        return {
+            **map_info,
+            "nearby_places": {
+                category: [place for place in places if self._place_key(place.get("name")) not in known]
+                for category, places in nearby_places.items()
+            }
+        }
+    
+    def _search_items(self, search_results: List[Dict[str, Any]]) -> List[Tuple[Any, int]]:
+        """
+        Rank search results round-robin over the query groups.
+        """
+        items = []
+        depth = max((len(query_results["results"]) for query_results in search_results), default=0)
+        for rank in range(depth):
+            for group, query_results in enumerate(search_results):
+                if rank < len(query_results["results"]):
+                    result = query_results["results"][rank]
+                    line = f"- Place Name: {result.get('name')} and Place Description: {result.get('description')}"
+                    items.append(((group, rank), self.token_counter.count(line)))
+        return items
+    
+    def _weather_items(self, weather_info: Dict[str, Any]) -> List[Tuple[Any, int]]:
+        """
+        Rank forecast days in date order.
+        """
+        forecasts = (weather_info.get("five_day_forecast") if weather_info else None) or []
+        items = []
+        for index, forecast in enumerate(forecasts):
+            line = (f"- Day {forecast.get('day', '')}: Min Temp-{forecast.get('min_temp', '')}, "
+                    f"Max Temp-{forecast.get('max_temp', '')}, Feels Like-{forecast.get('feels_like', '')}, "
+                    f"Description-{forecast.get('description', '')}, Wind Speed- {forecast.get('wind_speed')}")
+            items.append((index, self.token_counter.count(line)))
+        return items
+    
+    def _map_items(self, map_info: Dict[str, Any]) -> List[Tuple[Any, int]]:
+        """
+        Rank nearby places by rating, round-robin over the categories.
+        """
+        nearby_places = (map_info.get("nearby_places") if map_info else None) or {}
+        ranked = {
+            category: sorted(range(len(nearby_places.get(category) or [])),
+                             key=lambda index, category=category: -self._rating(nearby_places[category][index]))
+            for category in MAP_CATEGORIES
+        }
+        items = []
+        depth = max((len(indices) for indices in ranked.values()), default=0)
+        for rank in range(depth):
+            for category in MAP_CATEGORIES:
+                if rank < len(ranked[category]):
+                    index = ranked[category][rank]
+                    place = nearby_places[category][index]
+                    line = f"- {place.get('name', '')} ({place.get('rating', '')}/5) - {place.get('vicinity', '')}"
+                    items.append(((category, index), self.token_counter.count(line)))
+        return items
+    
+    def _rebuild_search_results(self, search_results: List[Dict[str, Any]], selected: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Keep the selected search results, in their original order.
+        """
+        chosen = set(selected)
+        return [
+            {**query_results, "results": [result for rank, result in enumerate(query_results["results"])
+                                          if (group, rank) in chosen]}
+            for group, query_results in enumerate(search_results)
+        ]
+    
+    def _rebuild_weather_info(self, weather_info: Dict[str, Any], selected: List[Any]) -> Dict[str, Any]:
+        """
+        Keep the selected forecast days.
+        """
+        if not weather_info:
+            return {}
+        forecasts = weather_info.get("five_day_forecast") or []
+        return {**weather_info, "five_day_forecast": [forecasts[index] for index in sorted(selected)]}
+    
+    def _rebuild_map_info(self, map_info: Dict[str, Any], selected: List[Any]) -> Dict[str, Any]:
+        """
+        Keep the selected nearby places, in their original order.
+        """
+        if not map_info:
+            return {}
+        nearby_places = map_info.get("nearby_places")
+        if not nearby_places:
+            return map_info
+        chosen = set(selected)
+        return {
+            **map_info,
+            "nearby_places": {
+                category: [place for index, place in enumerate(places) if (category, index) in chosen]
+                for category, places in nearby_places.items()
+            }
+        }
+    
+    def _place_key(self, name: Any) -> str:
+        """
+        Normalize a place name for deduplication.
+        """
+        return re.sub(r"[^a-z0-9]+", " ", str(name or "").lower()).strip()
+    
+    def _rating(self, place: Dict[str, Any]) -> float:
+        """
+        Get a place's rating, 0 when missing.
+        """
+        try:
+            return float(place.get("rating") or 0)
+        except (TypeError, ValueError):
+            return 0.0
@@ -5,9 +5,31 @@ Input validation module for the Travel Planner system. Guards against inappropri
 or irrelevant user inputs by validating them against travel planning criteria.
 """
 
-import json
-from typing import Tuple
+from typing import Any, Dict, Tuple
 from api.llm_provider import LLMProvider
+from api.structured_output import StructuredOutputError
+
+GUARDRAIL_SYSTEM_PROMPT = """
+You are a content moderator for a travel planning assistant.
+Your task is to determine if the user's input is:
+1. Related to travel planning or travel information
+2. Appropriate and does not contain harmful, offensive, or inappropriate content
+
+Respond with a JSON object with the following fields:
+- is_valid: true if the input passes both checks, false otherwise
+- reason: If is_valid is false, provide a brief reason
+
+Provide only the JSON, with no additional text.
+"""
+
+GUARDRAIL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_valid": {"type": "boolean"},
+        "reason": {"type": "string"}
+    },
+    "required": ["is_valid"]
+}
 
 class Guardrail:
     """
@@ -52,26 +74,54 @@ class Guardrail:
             >>> print(is_valid)
             True
         """
-        system_prompt="""
-You are a content moderator for a travel planning assistant.
-Your task is to determine if the user's input is:
-1. Related to travel planning or travel information
-2. Appropriate and does not contain harmful, offensive, or inappropriate content
-
-Respond with a JSON object with the following fields:
-- is_valid: true if the input passes both checks, false otherwise
-- reason: If is_valid is false, provide a brief reason
-
-Provide only the JSON, with no additional text.
-"""
-        response = self.llm_provider.generate(
-            system_prompt=system_prompt,
-            user_prompt=user_input
-        )
+        try:
+            result = self.llm_provider.generate_json(
+                system_prompt=GUARDRAIL_SYSTEM_PROMPT,
+                user_prompt=user_input,
+                schema=GUARDRAIL_SCHEMA,
+                name="moderation_verdict",
+                use_cache=True
+            )
+        except StructuredOutputError:
+            # Fallback in case the model doesn't return valid JSON
+            return False, "Failed to validate input"
         
+        return self._parse_response(result)
+    
+    async def avalidate_input(self, user_input: str) -> Tuple[bool, str]:
+        """
+        Validate user input without blocking the event loop.
+        
+        Async counterpart of validate_input() using the provider's async client.
+        
+        Args:
+            user_input (str): The user's text input to be validated.
+            
+        Returns:
+            Tuple[bool, str]: Validity flag and the reason if invalid.
+        """
         try:
-            result = json.loads(response)
-            return result.get("is_valid", False), result.get("reason", "Invalid input")
-        except json.JSONDecodeError:
+            result = await self.llm_provider.agenerate_json(
+                system_prompt=GUARDRAIL_SYSTEM_PROMPT,
+                user_prompt=user_input,
+                schema=GUARDRAIL_SCHEMA,
+                name="moderation_verdict",
+                use_cache=True
+            )
+        except StructuredOutputError:
             # Fallback in case the model doesn't return valid JSON
-            return False, "Failed to validate input"
\ No newline at end of file
+            return False, "Failed to validate input"
+        
+        return self._parse_response(result)
+    
+    def _parse_response(self, result: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        Read the moderator's verdict.
+        
+        Args:
+            result (Dict[str, Any]): The verdict, already validated against GUARDRAIL_SCHEMA.
+            
+        Returns:
+            Tuple[bool, str]: Validity flag and the reason if invalid.
+        """
+        return result["is_valid"], result.get("reason", "Invalid input")
\ No newline at end of file
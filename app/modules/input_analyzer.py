@@ -0,0 +1,184 @@
+"""
+app/modules/input_analyzer.py
+
+Fused input analysis module that validates the user's request and extracts its travel
+features in a single LLM call, replacing the separate guardrail and extraction calls.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+from api.llm_provider import LLMProvider
+from app.modules.guardrail import Guardrail
+from app.modules.search_query_extractor import FEATURES_SCHEMA, SearchQueryExtractor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INPUT_ANALYSIS_SYSTEM_PROMPT = """
+You are the input analyzer for a travel planning assistant.
+First, determine if the user's input is:
+1. Related to travel planning or travel information
+2. Appropriate and does not contain harmful, offensive, or inappropriate content
+
+Then, if it passes both checks, extract key travel information from it.
+
+Respond with a JSON object with the following fields:
+- is_valid: true if the input passes both checks, false otherwise
+- reason: If is_valid is false, provide a brief reason; otherwise an empty string
+- features: null if is_valid is false, otherwise an object with:
+    - place_to_visit: The main travel destination (city, country, or location) - REQUIRED
+    - duration_days: Length of stay as an integer (e.g., 7) - Optional, can be null
+    - cuisine_preferences: List of food and drink preferences - Optional, can be null
+    - place_preferences: List of activity or place preferences (museums, beaches, etc.) - Optional, can be null
+    - transport_preferences: Preferred mode of transport - Optional, can be null
+
+For any feature not mentioned in the input, use null. If place_to_visit is not
+specified, provide a reasonable assumption based on context.
+Provide only the JSON, with no additional text.
+"""
+
+INPUT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_valid": {"type": "boolean"},
+        "reason": {"type": ["string", "null"]},
+        "features": {**FEATURES_SCHEMA, "type": ["object", "null"]}
+    },
+    "required": ["is_valid"]
+}
+
+class InputAnalyzer:
+    """
+    Validates user input and extracts travel features in one LLM round trip.
+    
+    Produces the same results as Guardrail.validate_input() followed by
+    SearchQueryExtractor.extract_features(), but with one completion instead of two.
+    If the fused response can't be parsed, it falls back to the two separate calls.
+    
+    Attributes:
+        llm_provider (LLMProvider): The language model provider used for analysis.
+        guardrail (Guardrail): Used as a fallback when the fused response is unusable.
+        query_extractor (SearchQueryExtractor): Normalizes the extracted features and
+            serves as the extraction fallback.
+    """
+    
+    def __init__(self,
+                 llm_provider: LLMProvider,
+                 guardrail: Guardrail,
+                 query_extractor: SearchQueryExtractor):
+        """
+        Initialize the InputAnalyzer.
+        
+        Args:
+            llm_provider (LLMProvider): The language model provider to use.
+            guardrail (Guardrail): Guardrail used for the two-call fallback.
+            query_extractor (SearchQueryExtractor): Extractor used to normalize features
+                and for the two-call fallback.
+        """
+        self.llm_provider = llm_provider
+        self.guardrail = guardrail
+        self.query_extractor = query_extractor
+        logger.info("Initialized Input Analyzer with provider")
+    
+    def analyze(self, user_input: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        Validate the user input and extract its travel features.
+        
+        Args:
+            user_input (str): The user's text input.
+        
+        Returns:
+            Tuple[bool, str, Optional[Dict[str, Any]]]: A tuple containing:
+                - bool: True if the input is valid, False otherwise.
+                - str: If invalid, contains the reason; empty string if valid.
+                - Optional[Dict[str, Any]]: The extracted features, or None if invalid.
+        """
+        logger.info("Analyzing user input with a single fused call")
+        
+        try:
+            result = self.llm_provider.generate_json(
+                system_prompt=INPUT_ANALYSIS_SYSTEM_PROMPT,
+                user_prompt=self._build_user_prompt(user_input),
+                schema=INPUT_ANALYSIS_SCHEMA,
+                name="input_analysis",
+                use_cache=True
+            )
+            return self._parse_response(result, user_input)
+        except Exception as e:
+            logger.error(f"Error in fused input analysis, using separate calls: {e}", exc_info=True)
+            
+            is_valid, reason = self.guardrail.validate_input(user_input)
+            features = self.query_extractor.extract_features(user_input) if is_valid else None
+            return is_valid, reason, features
+    
+    async def aanalyze(self, user_input: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        Validate the user input and extract its features without blocking the event loop.
+        
+        Async counterpart of analyze() with the same two-call fallback.
+        
+        Args:
+            user_input (str): The user's text input.
+        
+        Returns:
+            Tuple[bool, str, Optional[Dict[str, Any]]]: Validity flag, reason and features.
+        """
+        logger.info("Analyzing user input with a single fused call")
+        
+        try:
+            result = await self.llm_provider.agenerate_json(
+                system_prompt=INPUT_ANALYSIS_SYSTEM_PROMPT,
+                user_prompt=self._build_user_prompt(user_input),
+                schema=INPUT_ANALYSIS_SCHEMA,
+                name="input_analysis",
+                use_cache=True
+            )
+            return self._parse_response(result, user_input)
+        except Exception as e:
+            logger.error(f"Error in fused input analysis, using separate calls: {e}", exc_info=True)
+            
+            is_valid, reason = await self.guardrail.avalidate_input(user_input)
+            features = await self.query_extractor.aextract_features(user_input) if is_valid else None
+            return is_valid, reason, features
+    
+    def _build_user_prompt(self, user_input: str) -> str:
+        """
+        Build the user prompt for the fused analysis call.
+        
+        Args:
+            user_input (str): The user's text input.
+        
+        Returns:
+            str: The user prompt.
+        """
+        return f"""
+        Analyze the following user input:
+        
+        {user_input}
+        """
+    
+    def _parse_response(self, result: Dict[str, Any], user_input: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        Read the fused analysis result.
+        
+        Args:
+            result (Dict[str, Any]): The result, already validated against INPUT_ANALYSIS_SCHEMA.
+            user_input (str): The original user query, used to fill missing features.
+        
+        Returns:
+            Tuple[bool, str, Optional[Dict[str, Any]]]: Validity flag, reason and features.
+        
+        Raises:
+            ValueError: If a valid input comes without features.
+        """
+        if not result["is_valid"]:
+            return False, result.get("reason") or "Invalid input", None
+        
+        features = result.get("features")
+        if not isinstance(features, dict):
+            raise ValueError("Fused input analysis response is missing features")
+        
+        features = self.query_extractor._validate_and_fill_features(features, user_input)
+        logger.info(f"Successfully analyzed input: {features}")
+        return True, "", features
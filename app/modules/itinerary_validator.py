@@ -0,0 +1,207 @@
+"""
+app/modules/itinerary_validator.py
+
+Itinerary validation module. Follows the "## Day N" headers of an itinerary as it streams,
+detects missing and duplicated days, splits and reassembles itineraries so that only the
+missing days need to be regenerated, and parses the day plans of long trips.
+"""
+
+import re
+import logging
+from typing import Dict, List, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DAY_HEADER_PATTERN = re.compile(r"^\s*##\s*Day\s+(\d+)\b", re.IGNORECASE)
+SECTION_HEADER_PATTERN = re.compile(r"^\s*##\s")
+DAY_PLAN_PATTERN = re.compile(r"^\W*Day\s+(\d+)\W*?[:\-\u2013\u2014]\**\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+
+class ItineraryDayTracker:
+    """
+    Tracks the day headers of an itinerary while it streams in.
+    
+    Deltas are buffered until a line is complete, so each line is parsed once however
+    the text is chunked.
+    
+    Attributes:
+        duration_days (int): Number of days requested.
+        days (List[int]): Day numbers in the order their headers appeared, repeats included.
+    """
+    
+    def __init__(self, duration_days: int):
+        """
+        Initialize the tracker.
+        
+        Args:
+            duration_days (int): Number of days requested.
+        """
+        self.duration_days = duration_days
+        self.days = []
+        self._pending = ""
+    
+    def feed(self, delta: str) -> bool:
+        """
+        Parse the lines completed by a new delta.
+        
+        Args:
+            delta (str): The latest text delta.
+        
+        Returns:
+            bool: False once the model repeats a day or goes past the last requested day,
+                after which the rest of the stream is not worth reading.
+        """
+        self._pending += delta
+        if "\n" not in self._pending:
+            return True
+        
+        *lines, self._pending = self._pending.split("\n")
+        return all([self._parse_line(line) for line in lines])
+    
+    def finish(self) -> None:
+        """
+        Parse the last line once the stream has ended.
+        """
+        if self._pending:
+            self._parse_line(self._pending)
+            self._pending = ""
+    
+    def missing_days(self) -> List[int]:
+        """
+        Get the requested days that have no header.
+        
+        Returns:
+            List[int]: Missing day numbers in order.
+        """
+        seen = set(self.days)
+        return [day for day in range(1, self.duration_days + 1) if day not in seen]
+    
+    def duplicate_days(self) -> List[int]:
+        """
+        Get the days whose header appeared more than once.
+        
+        Returns:
+            List[int]: Repeated day numbers in order.
+        """
+        return sorted({day for day in self.days if self.days.count(day) > 1})
+    
+    def _parse_line(self, line: str) -> bool:
+        """
+        Record a day header, returning False if the day is a repeat or out of range.
+        """
+        match = DAY_HEADER_PATTERN.match(line)
+        if not match:
+            return True
+        
+        day = int(match.group(1))
+        repeated = day in self.days
+        self.days.append(day)
+        if repeated:
+            logger.warning(f"Itinerary streaming: day {day} repeated")
+            return False
+        if day > self.duration_days:
+            logger.warning(f"Itinerary streaming: day {day} is past the {self.duration_days} requested")
+            return False
+        
+        logger.info(f"Itinerary streaming: day {day} of {self.duration_days} started")
+        return True
+
+def split_itinerary(text: str) -> Tuple[str, Dict[int, str], str]:
+    """
+    Split an itinerary into the text before the first day, the day sections and the
+    sections after them (accommodation, transportation, tips and so on).
+    
+    Only the first section of a repeated day is kept, and everything from a repeated or
+    out-of-order restart of the day list onwards belongs to that discarded section.
+    
+    Args:
+        text (str): The itinerary text.
+    
+    Returns:
+        Tuple[str, Dict[int, str], str]: Preamble, day sections by day number (each
+            starting with its header) and the trailing sections.
+    """
+    preamble, tail = [], []
+    days = {}
+    current = None
+    discarding = False
+    for line in text.split("\n"):
+        match = DAY_HEADER_PATTERN.match(line)
+        if match:
+            day = int(match.group(1))
+            discarding = day in days
+            current = None if discarding else day
+            if not discarding:
+                days[day] = [line]
+            continue
+        
+        if SECTION_HEADER_PATTERN.match(line) and (current is not None or discarding):
+            current = None
+            discarding = False
+            tail.append(line)
+        elif discarding:
+            continue
+        elif current is not None:
+            days[current].append(line)
+        elif days:
+            tail.append(line)
+        else:
+            preamble.append(line)
+    
+    return "\n".join(preamble), {day: "\n".join(lines).rstrip() for day, lines in days.items()}, "\n".join(tail)
+
+def assemble_itinerary(preamble: str, days: Dict[int, str], tail: str) -> str:
+    """
+    Join the parts from split_itinerary() back together, with the days in order.
+    
+    Args:
+        preamble (str): Text before the first day.
+        days (Dict[int, str]): Day sections by day number.
+        tail (str): Sections after the days.
+    
+    Returns:
+        str: The itinerary text.
+    """
+    parts = [preamble.rstrip()] if preamble.strip() else []
+    parts.extend(days[day] for day in sorted(days))
+    if tail.strip():
+        parts.append(tail.strip())
+    return "\n\n".join(parts)
+
+def summarize_days(days: Dict[int, str], max_chars: int = 120) -> str:
+    """
+    Describe each written day by its first activity, to keep a follow-up call consistent.
+    
+    Args:
+        days (Dict[int, str]): Day sections by day number.
+        max_chars (int, optional): Maximum length of each day's summary. Defaults to 120.
+    
+    Returns:
+        str: One line per day.
+    """
+    summary = []
+    for day in sorted(days):
+        activities = [line.strip(" -*\t") for line in days[day].split("\n")[1:]]
+        activities = [line for line in activities if line and not line.endswith(":")]
+        first = activities[0] if activities else "details not available"
+        summary.append(f"- Day {day}: {first[:max_chars]}")
+    return "\n".join(summary)
+
+def parse_day_plan(text: str, duration_days: int) -> Dict[int, str]:
+    """
+    Parse a "Day N: plan" line per day from a day plan response.
+    
+    Args:
+        text (str): The day plan response.
+        duration_days (int): Number of days requested; other day numbers are ignored.
+    
+    Returns:
+        Dict[int, str]: Plan line by day number, first line per day only.
+    """
+    plan = {}
+    for match in DAY_PLAN_PATTERN.finditer(text or ""):
+        day = int(match.group(1))
+        if 1 <= day <= duration_days and day not in plan:
+            plan[day] = match.group(2)
+    return plan
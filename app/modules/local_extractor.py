@@ -0,0 +1,439 @@
+"""
+app/modules/local_extractor.py
+
+Rule-based travel feature extraction that runs locally in microseconds. Matches the query
+against precompiled patterns, a gazetteer of destination names and keyword tries, and
+scores how much of the query it understood so callers can escalate to the LLM when the
+local result is not trustworthy.
+"""
+
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Destination gazetteer: name -> kind. Countries and regions outrank cities when a
+# query names several places ("Japan ... Tokyo, Kyoto"), the cities become preferences.
+CITIES = [
+    "amsterdam", "athens", "auckland", "austin", "bangkok", "barcelona", "beijing",
+    "berlin", "bogota", "boston", "brussels", "budapest", "buenos aires", "cairo",
+    "cape town", "chicago", "copenhagen", "delhi", "new delhi", "dubai", "dublin",
+    "edinburgh", "florence", "hanoi", "havana", "ho chi minh city", "hong kong", "honolulu",
+    "istanbul", "jaipur", "jerusalem", "krakow", "kyoto", "las vegas", "lima", "lisbon",
+    "london", "los angeles", "madrid", "melbourne", "mexico city", "miami", "milan",
+    "montreal", "mumbai", "munich", "naples", "new orleans", "new york", "new york city",
+    "orlando", "osaka", "oslo", "paris", "porto", "prague", "reykjavik", "rio de janeiro",
+    "rome", "san diego", "san francisco", "seattle", "seoul", "seville", "shanghai",
+    "singapore", "stockholm", "sydney", "taipei", "tokyo", "toronto", "vancouver", "venice",
+    "vienna", "washington dc", "zurich"
+]
+
+REGIONS = [
+    "argentina", "australia", "austria", "bali", "brazil", "california", "canada", "chile",
+    "china", "colombia", "costa rica", "croatia", "cuba", "egypt", "england", "florida",
+    "france", "germany", "greece", "hawaii", "iceland", "india", "indonesia", "ireland",
+    "italy", "japan", "kenya", "maldives", "mexico", "morocco", "nepal", "netherlands",
+    "new zealand", "norway", "peru", "philippines", "portugal", "scotland", "south africa",
+    "south korea", "spain", "sri lanka", "sweden", "switzerland", "tanzania", "thailand",
+    "turkey", "vietnam"
+]
+
+# Names that are also common words; only matched when capitalized in the query
+AMBIGUOUS_PLACES = {"turkey", "chile"}
+
+CUISINE_KEYWORDS = [
+    "food", "cuisine", "restaurant", "dining", "dinner", "lunch", "breakfast", "brunch",
+    "meal", "dish", "snack", "cafe", "coffee", "tea", "wine", "wine tasting", "beer",
+    "cocktail", "drink", "bar", "pub", "street food", "food market", "food tour", "seafood",
+    "sushi", "ramen", "tapas", "pizza", "pasta", "gelato", "pastry", "cheese", "chocolate",
+    "barbecue", "bbq", "curry", "dim sum", "noodle", "taco", "steak", "vegetarian", "vegan",
+    "halal", "kosher", "gluten free", "fine dining", "buffet", "dessert", "bakery",
+    "cooking class", "culinary", "gastronomy"
+]
+
+# Generic dishes that take the preceding adjectives with them ("traditional Czech food")
+CUISINE_HEADS = {
+    "food", "cuisine", "dish", "wine", "beer", "barbecue", "bbq", "dining", "restaurant",
+    "cheese", "seafood", "pastry", "dinner", "curry"
+}
+
+CUISINE_MODIFIERS = {
+    "local", "street", "traditional", "authentic", "regional", "fresh", "fine", "craft",
+    "international", "home", "homemade", "cooked", "red", "white", "sparkling", "natural"
+}
+
+PLACE_KEYWORDS = [
+    "museum", "art", "art gallery", "gallery", "history", "historical site",
+    "historic site", "heritage site", "landmark", "monument", "architecture", "beach",
+    "island", "hiking", "trekking", "nature", "national park", "park", "garden",
+    "botanical garden", "theme park", "water park", "waterpark", "amusement park", "zoo",
+    "aquarium", "shopping", "shopping district", "shopping mall", "mall", "market",
+    "night market", "flea market", "nightlife", "club", "live music", "concert", "festival",
+    "show", "theatre", "theater", "opera", "temple", "shrine", "church", "cathedral",
+    "mosque", "palace", "castle", "fortress", "ruin", "ancient ruin", "old town", "canal",
+    "river", "lake", "waterfall", "mountain", "desert", "safari", "wildlife", "vineyard",
+    "winery", "village", "countryside", "snorkeling", "snorkelling", "scuba diving",
+    "diving", "surfing", "skiing", "kayaking", "water sport", "spa", "yoga", "sightseeing",
+    "photography", "culture", "adventure", "relaxation", "viewpoint", "neighborhood",
+    "neighbourhood"
+]
+
+TRANSPORT_KEYWORDS = [
+    "public transport", "public transportation", "public transit", "bus", "train",
+    "high speed train", "rail", "rail pass", "subway", "metro", "underground", "tram",
+    "streetcar", "taxi", "cab", "rideshare", "uber", "car", "rental car", "car rental",
+    "rv", "bike", "bicycle", "bike rental", "cycling", "walking", "on foot", "ferry",
+    "boat", "cruise", "cable car", "scooter", "moped", "motorcycle", "shuttle", "flight"
+]
+
+# Words that carry no feature information in a travel request
+FILLER_WORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "us", "our", "you", "your", "it", "is", "are",
+    "am", "be", "to", "for", "in", "on", "at", "of", "by", "via", "from", "with", "without",
+    "and", "or", "plus", "also", "as", "well", "some", "any", "that", "this", "which", "who",
+    "please", "can", "could", "would", "will", "should", "want", "need", "like", "love",
+    "help", "plan", "planning", "create", "make", "build", "design", "give", "suggest",
+    "recommend", "prepare", "put", "together", "itinerary", "schedule", "trip", "travel",
+    "traveling", "travelling", "vacation", "holiday", "journey", "getaway", "break", "tour",
+    "visit", "visiting", "see", "seeing", "explore", "exploring", "discover", "try", "trying",
+    "taste", "tasting", "enjoy", "enjoying", "experience", "do", "doing", "include",
+    "including", "includes", "featuring", "feature", "focusing", "focused", "focus", "around",
+    "get", "getting", "go", "going", "use", "using", "option", "activity", "thing", "place",
+    "spot", "time", "day", "night", "week", "weekend", "long", "short", "first", "best",
+    "good", "great", "top", "nice", "fun", "cheap", "budget", "luxury", "family",
+    "friendly", "kid", "solo", "couple", "friend", "easy", "convenient", "transportation",
+    "transport", "detail", "there", "about", "through", "between", "while"
+}
+
+NEGATIONS = {"no", "not", "without", "avoid", "avoiding"}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "a": 1, "an": 1
+}
+
+_NUMBER = r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")"
+
+# Duration patterns, tried in order; the multiplier converts the unit to days
+DURATION_PATTERNS = [
+    (re.compile(_NUMBER + r"[\s-]*days?\b", re.IGNORECASE), 1),
+    (re.compile(_NUMBER + r"[\s-]*nights?\b", re.IGNORECASE), 1),
+    (re.compile(_NUMBER + r"[\s-]*weeks?\b", re.IGNORECASE), 7),
+    (re.compile(r"\bfortnight\b", re.IGNORECASE), 14),
+    (re.compile(r"\bweekend\b", re.IGNORECASE), 2)
+]
+
+# Cues placing the destination right after them when it is not in the gazetteer
+DESTINATION_PATTERN = re.compile(
+    r"\b(?:to|in|visiting|for|of)\s+((?:[A-Z][\w'-]*)(?:\s+(?:de|del|la|le|da|[A-Z][\w'-]*))*)"
+)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:['’-][^\W_]+)*")
+
+_END = object()
+
+def _token_forms(token: str) -> Tuple[str, ...]:
+    """
+    Get the lowercase token and its candidate singular forms, most literal first.
+    """
+    forms = [token]
+    if token.endswith("ies") and len(token) > 4:
+        forms.append(token[:-3] + "y")
+    if token.endswith("es") and len(token) > 3:
+        forms.append(token[:-2])
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 2:
+        forms.append(token[:-1])
+    return tuple(forms)
+
+class PhraseTrie:
+    """
+    Token-level trie for matching multi-word phrases in a single left-to-right pass.
+    
+    Phrases are stored as sequences of lowercase singular tokens. Matching tries each
+    input token's singular forms, so "historical sites" matches "historical site", and
+    always prefers the longest phrase at a position ("rental car" over "car").
+    """
+    
+    def __init__(self, phrases: Iterable[Tuple[str, Any]] = ()):
+        """
+        Initialize the trie.
+        
+        Args:
+            phrases (Iterable[Tuple[str, Any]], optional): (phrase, value) pairs to add.
+        """
+        self.root: Dict[Any, Any] = {}
+        for phrase, value in phrases:
+            self.add(phrase, value)
+    
+    def add(self, phrase: str, value: Any) -> None:
+        """
+        Add a phrase, replacing the value of an existing identical phrase.
+        
+        Args:
+            phrase (str): The phrase, in singular form.
+            value (Any): Value returned when the phrase matches.
+        """
+        node = self.root
+        for token in TOKEN_PATTERN.findall(phrase.lower()):
+            node = node.setdefault(token, {})
+        node[_END] = value
+    
+    def match_at(self, tokens: List[str], start: int) -> Optional[Tuple[int, Any]]:
+        """
+        Find the longest phrase starting at a token position.
+        
+        Args:
+            tokens (List[str]): Lowercase input tokens.
+            start (int): Position to match from.
+        
+        Returns:
+            Optional[Tuple[int, Any]]: End position (exclusive) and value, or None.
+        """
+        best = None
+        frontier = [self.root]
+        position = start
+        while frontier and position < len(tokens):
+            next_frontier = []
+            for node in frontier:
+                for form in _token_forms(tokens[position]):
+                    child = node.get(form)
+                    if child is not None:
+                        next_frontier.append(child)
+                        if _END in child:
+                            best = (position + 1, child[_END])
+            frontier = next_frontier
+            position += 1
+        return best
+
+# Module-level tries, built once at import
+_GAZETTEER = PhraseTrie(
+    [(name, "city") for name in CITIES] + [(name, "region") for name in REGIONS]
+)
+_KEYWORDS = PhraseTrie(
+    [(keyword, "cuisine_preferences") for keyword in CUISINE_KEYWORDS]
+    + [(keyword, "place_preferences") for keyword in PLACE_KEYWORDS]
+    + [(keyword, "transport_preferences") for keyword in TRANSPORT_KEYWORDS]
+)
+
+def known_keyword(phrase: str) -> Optional[str]:
+    """
+    Get the feature field of a phrase built from a known keyword.
+    
+    The keyword may be preceded by cuisine modifiers or capitalized adjectives, so
+    "museums", "traditional Japanese cuisine" and "Thai food" are known, while
+    "romantic dinners" or "luaus" are not.
+    
+    Args:
+        phrase (str): A preference value, e.g. from extracted features.
+    
+    Returns:
+        Optional[str]: "cuisine_preferences", "place_preferences" or "transport_preferences",
+            or None if the phrase is not made of a known keyword.
+    """
+    words = TOKEN_PATTERN.findall(str(phrase))
+    tokens = [word.lower() for word in words]
+    for start in range(len(tokens)):
+        match = _KEYWORDS.match_at(tokens, start)
+        if match is not None and match[0] == len(tokens):
+            return match[1]
+        if tokens[start] not in CUISINE_MODIFIERS and not words[start][0].isupper():
+            return None
+    return None
+
+class LocalFeatureExtractor:
+    """
+    Extracts travel features without an LLM call and reports its confidence.
+    
+    Confidence combines how sure the extractor is about the destination with the share
+    of informative words in the query it could account for. A query like "5-day
+    Amsterdam itinerary with museums and trams" is fully explained and scores 1.0;
+    unrecognized destinations, several competing cities or unknown preferences
+    ("Gaudi architecture") lower the score so the query is escalated to the LLM.
+    
+    Attributes:
+        min_confidence (float): Confidence at or above which the local result is used.
+    """
+    
+    def __init__(self, min_confidence: float = 0.9):
+        """
+        Initialize the LocalFeatureExtractor.
+        
+        Args:
+            min_confidence (float, optional): Confidence needed to skip the LLM. Defaults to 0.9.
+        """
+        self.min_confidence = min_confidence
+        logger.info(f"Initialized Local Feature Extractor (min_confidence={min_confidence})")
+    
+    def extract(self, user_input: str) -> Tuple[Dict[str, Any], float]:
+        """
+        Extract travel features from user input.
+        
+        Args:
+            user_input (str): The natural language query from the user.
+        
+        Returns:
+            Tuple[Dict[str, Any], float]: The features, in the same format as
+                SearchQueryExtractor.extract_features(), and a confidence in [0, 1].
+        """
+        spans = [(m.group(0), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(user_input)]
+        tokens = [text.lower() for text, _, _ in spans]
+        explained = [False] * len(tokens)
+        
+        duration_days = self._match_duration(user_input, spans, explained)
+        destinations = self._match_destinations(spans, tokens, explained)
+        preferences = self._match_keywords(spans, tokens, explained)
+        
+        place_to_visit, destination_confidence = self._choose_destination(user_input, destinations)
+        for name in destinations[1:]:
+            if name != place_to_visit:
+                preferences["place_preferences"].append(name)
+        
+        transport = preferences["transport_preferences"]
+        features = {
+            "place_to_visit": place_to_visit,
+            "duration_days": duration_days,
+            "cuisine_preferences": preferences["cuisine_preferences"] or None,
+            "place_preferences": preferences["place_preferences"] or None,
+            "transport_preferences": (transport[0] if len(transport) == 1 else transport) or None
+        }
+        
+        informative = [
+            i for i, token in enumerate(tokens)
+            if token not in FILLER_WORDS and not any(form in FILLER_WORDS for form in _token_forms(token))
+        ]
+        if informative:
+            coverage = sum(explained[i] for i in informative) / len(informative)
+        else:
+            coverage = 1.0
+        
+        return features, destination_confidence * coverage
+    
+    def _match_duration(self,
+                        user_input: str,
+                        spans: List[Tuple[str, int, int]],
+                        explained: List[bool]) -> Optional[int]:
+        """
+        Find the trip length in days and mark the tokens it covers.
+        """
+        for pattern, days_per_unit in DURATION_PATTERNS:
+            match = pattern.search(user_input)
+            if not match:
+                continue
+            
+            days = days_per_unit
+            if match.groups():
+                number = match.group(1).lower()
+                days *= int(number) if number.isdigit() else NUMBER_WORDS[number]
+            
+            for i, (_, start, end) in enumerate(spans):
+                if start >= match.start() and end <= match.end():
+                    explained[i] = True
+            return days
+        return None
+    
+    def _match_destinations(self,
+                            spans: List[Tuple[str, int, int]],
+                            tokens: List[str],
+                            explained: List[bool]) -> List[str]:
+        """
+        Find gazetteer places in order of appearance, skipping an origin after "from".
+        """
+        destinations = []
+        position = 0
+        while position < len(tokens):
+            match = _GAZETTEER.match_at(tokens, position)
+            if match is None:
+                position += 1
+                continue
+            
+            end, _ = match
+            name = " ".join(text for text, _, _ in spans[position:end])
+            if (" ".join(tokens[position:end]) in AMBIGUOUS_PLACES and not name[0].isupper()) \
+                    or (position > 0 and tokens[position - 1] == "from"):
+                position = end
+                continue
+            
+            for i in range(position, end):
+                explained[i] = True
+            if name.islower():
+                name = name.title()
+            if name not in destinations:
+                destinations.append(name)
+            position = end
+        return destinations
+    
+    def _match_keywords(self,
+                        spans: List[Tuple[str, int, int]],
+                        tokens: List[str],
+                        explained: List[bool]) -> Dict[str, List[str]]:
+        """
+        Find preference keywords, keeping the user's wording for each match.
+        """
+        preferences = {"cuisine_preferences": [], "place_preferences": [], "transport_preferences": []}
+        position = 0
+        while position < len(tokens):
+            if explained[position]:
+                position += 1
+                continue
+            
+            match = _KEYWORDS.match_at(tokens, position)
+            if match is None:
+                position += 1
+                continue
+            
+            end, field = match
+            start = position
+            if field == "cuisine_preferences" and any(form in CUISINE_HEADS for form in _token_forms(tokens[end - 1])):
+                # Take adjectives like "traditional Czech" along with a generic dish
+                while start > 0 and not explained[start - 1] and (
+                        tokens[start - 1] in CUISINE_MODIFIERS or self._is_proper(spans, start - 1)):
+                    start -= 1
+            elif field == "place_preferences":
+                # Named landmarks such as "Central Park" keep their name
+                while start > 0 and not explained[start - 1] and self._is_proper(spans, start - 1):
+                    start -= 1
+            
+            for i in range(start, end):
+                explained[i] = True
+            if any(token in NEGATIONS for token in tokens[max(0, start - 3):start]):
+                # "without needing a car" is not a preference
+                position = end
+                continue
+            value = " ".join(text for text, _, _ in spans[start:end])
+            if value.lower() not in (existing.lower() for existing in preferences[field]):
+                preferences[field].append(value)
+            position = end
+        return preferences
+    
+    def _is_proper(self, spans: List[Tuple[str, int, int]], index: int) -> bool:
+        """
+        Check whether a token is capitalized mid-sentence, i.e. part of a proper name.
+        """
+        return index > 0 and spans[index][0][0].isupper()
+    
+    def _choose_destination(self, user_input: str, destinations: List[str]) -> Tuple[str, float]:
+        """
+        Pick the main destination and rate how certain that choice is.
+        
+        Returns:
+            Tuple[str, float]: The destination (or "Unknown destination") and its confidence.
+        """
+        if destinations:
+            main = destinations[0]
+            if len(destinations) == 1:
+                return main, 1.0
+            
+            # A country or region containing the other places is the trip's destination
+            main_kind = _GAZETTEER.match_at(TOKEN_PATTERN.findall(main.lower()), 0)[1]
+            if main_kind == "region":
+                return main, 0.9
+            return main, 0.5
+        
+        match = DESTINATION_PATTERN.search(user_input)
+        if match:
+            return match.group(1).strip(), 0.4
+        return "Unknown destination", 0.0
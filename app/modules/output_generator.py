@@ -6,15 +6,41 @@ It handles the creation of itineraries, packing lists, and budget estimates usin
 """
 
 import re
+import time
+import asyncio
 import logging
-from typing import Dict, List, Any
-from api.llm_provider import LLMProvider
+from api.llm_provider import LLMProvider, LLMStream, AsyncLLMStream
+from app.modules.context_packer import ContextPacker, TokenCounter
+from app.modules.itinerary_validator import (
+    ItineraryDayTracker, split_itinerary, assemble_itinerary, summarize_days, parse_day_plan
+)
 from datetime import datetime, timedelta
+from typing import Dict, List, Any, Tuple, Awaitable, AsyncIterator, Generator, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
         
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sections generated for every plan, with their default deadlines in seconds
+OUTPUT_SECTIONS = ("itinerary", "packing_list", "estimated_budget")
+DEFAULT_SECTION_TIMEOUTS = {
+    "itinerary": 120.0,
+    "packing_list": 60.0,
+    "estimated_budget": 60.0
+}
+
+# Share of the itinerary deadline after which no more missing days are regenerated
+REPAIR_DEADLINE_SHARE = 0.9
+
+# Trips of at least min_days days are planned first and then written in parallel batches of days
+DEFAULT_LONG_TRIP = {
+    "enabled": True,
+    "min_days": 7,
+    "days_per_batch": 3,
+    "max_parallel_batches": 5
+}
+
 class OutputGenerator:
     """
     Generates travel itineraries and recommendations.
@@ -25,16 +51,39 @@ class OutputGenerator:
     
     Attributes:
         llm_provider (LLMProvider): The language model provider for text generation.
+        section_timeouts (Dict[str, float]): Deadline in seconds for each output section.
+        context_packer (ContextPacker): Selects and trims the context each section is given.
+        max_repair_rounds (int): Follow-up calls allowed for regenerating missing itinerary days.
+        long_trip (Dict[str, Any]): Settings of the batched long-trip mode.
     """
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self,
+                 llm_provider: LLMProvider,
+                 section_timeouts: Optional[Dict[str, float]] = None,
+                 context_budgets: Optional[Dict[str, Optional[int]]] = None,
+                 max_repair_rounds: int = 2,
+                 long_trip: Optional[Dict[str, Any]] = None):
         """
         Initialize the OutputGenerator with an LLM provider.
         
         Args:
             llm_provider (LLMProvider): The language model provider for text generation.
+            section_timeouts (Optional[Dict[str, float]]): Per-section deadlines in seconds.
+                Missing sections use DEFAULT_SECTION_TIMEOUTS.
+            context_budgets (Optional[Dict[str, Optional[int]]]): Per-section context token budgets.
+                Missing sections use DEFAULT_CONTEXT_BUDGETS.
+            max_repair_rounds (int): Follow-up calls allowed for regenerating the days
+                missing from an itinerary. 0 disables the repair.
+            long_trip (Optional[Dict[str, Any]]): Settings overriding entries of DEFAULT_LONG_TRIP.
         """
         self.llm_provider = llm_provider
+        self.section_timeouts = {**DEFAULT_SECTION_TIMEOUTS, **(section_timeouts or {})}
+        self.context_packer = ContextPacker(
+            TokenCounter(llm_provider.provider, llm_provider.model),
+            context_budgets=context_budgets
+        )
+        self.max_repair_rounds = max_repair_rounds
+        self.long_trip = {**DEFAULT_LONG_TRIP, **(long_trip or {})}
         logger.info("Initialized Output generator with provider")
     
     def generate_itinerary(self, 
@@ -47,6 +96,10 @@ class OutputGenerator:
         destination information, weather data, and location context. Also generates
         supplementary information like packing lists and budget estimates.
         
+        The itinerary, packing list and budget are generated concurrently. A section
+        that misses its deadline is returned empty so that the agent substitutes its
+        fallback content for it.
+        
         Args:
             features: Extracted travel preferences including destination, duration,
                      cuisine preferences, place preferences, and transport preferences.
@@ -65,7 +118,786 @@ class OutputGenerator:
         """
         logger.info("Generating travel itinerary")
         
-        # Prepare context for the prompt
+        system_prompt, user_prompt, trip_details = self._build_itinerary_prompts(features, context)
+        
+        # The three sections only share features and context, so generate them side by side
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=len(OUTPUT_SECTIONS), thread_name_prefix="output")
+        try:
+            futures = {
+                "itinerary": executor.submit(self._generate_itinerary_text, system_prompt, user_prompt, trip_details),
+                "packing_list": executor.submit(self.generate_packing_list, features, context),
+                "estimated_budget": executor.submit(self.estimate_budget, features, context)
+            }
+            
+            sections = {}
+            for section, future in futures.items():
+                remaining = self.section_timeouts[section] - (time.monotonic() - started)
+                try:
+                    sections[section] = future.result(timeout=max(0.0, remaining))
+                except FuturesTimeoutError:
+                    logger.warning(f"Generation of {section} missed its {self.section_timeouts[section]}s deadline")
+                    sections[section] = ""
+                except Exception as e:
+                    sections[section] = self._section_error(section, e)
+        finally:
+            # Late sections finish in the background; their results are discarded
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return {**sections, "trip_details": trip_details}
+    
+    async def agenerate_itinerary(self, 
+                                  features: Dict[str, Any], 
+                                  context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generate a complete travel itinerary without blocking the event loop.
+        
+        Async counterpart of generate_itinerary() using the provider's async client.
+        The three sections run concurrently and a section that misses its deadline
+        is cancelled and returned empty.
+        
+        Args:
+            features: Extracted travel preferences.
+            context: Collected context information.
+            
+        Returns:
+            Dictionary with the same structure as generate_itinerary().
+        """
+        logger.info("Generating travel itinerary")
+        
+        system_prompt, user_prompt, trip_details = self._build_itinerary_prompts(features, context)
+        
+        itinerary, packing_list, estimated_budget = await asyncio.gather(
+            self._await_section("itinerary", self._agenerate_itinerary_text(system_prompt, user_prompt, trip_details)),
+            self._await_section("packing_list", self.agenerate_packing_list(features, context)),
+            self._await_section("estimated_budget", self.aestimate_budget(features, context))
+        )
+        
+        return {
+            "itinerary": itinerary,
+            "packing_list": packing_list,
+            "estimated_budget": estimated_budget,
+            "trip_details": trip_details
+        }
+    
+    async def astream_itinerary(self, 
+                                features: Dict[str, Any], 
+                                context: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate the travel plan, streaming the itinerary text as it is produced.
+        
+        The packing list and budget are generated concurrently in the background while
+        the itinerary streams, each within its section deadline.
+        
+        Args:
+            features: Extracted travel preferences.
+            context: Collected context information.
+            
+        Yields:
+            Event dictionaries with "event" and "data" keys:
+            - {"event": "itinerary_delta", "data": {"text": str}} for each piece of itinerary text
+            - {"event": "output", "data": Dict} once at the end, with the same structure
+              as generate_itinerary()
+        """
+        logger.info("Streaming travel itinerary")
+        
+        system_prompt, user_prompt, trip_details = self._build_itinerary_prompts(features, context)
+        
+        packing_task = asyncio.create_task(
+            self._await_section("packing_list", self.agenerate_packing_list(features, context))
+        )
+        budget_task = asyncio.create_task(
+            self._await_section("estimated_budget", self.aestimate_budget(features, context))
+        )
+        
+        try:
+            itinerary_text = ""
+            async for kind, text in self._astream_itinerary_text(system_prompt, user_prompt, trip_details):
+                if kind == "delta":
+                    yield {"event": "itinerary_delta", "data": {"text": text}}
+                else:
+                    itinerary_text = text
+            
+            packing_list, estimated_budget = await asyncio.gather(packing_task, budget_task)
+        finally:
+            # Stop background sections if the consumer went away mid-stream
+            for task in (packing_task, budget_task):
+                if not task.done():
+                    task.cancel()
+        
+        yield {
+            "event": "output",
+            "data": {
+                "itinerary": itinerary_text,
+                "packing_list": packing_list,
+                "estimated_budget": estimated_budget,
+                "trip_details": trip_details
+            }
+        }
+    
+    def _generate_itinerary_text(self, system_prompt: str, user_prompt: str, trip_details: Dict[str, Any]) -> str:
+        """
+        Call the LLM for the day-by-day itinerary text.
+        
+        The day headers are validated as the itinerary streams in, and days that are
+        missing at the end are regenerated with follow-up calls. Long trips are
+        generated in parallel batches of days instead.
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            trip_details: Trip metadata from _build_itinerary_prompts()
+            
+        Returns:
+            The generated itinerary text
+        """
+        logger.info(f"Generating itinerary for {trip_details['place_to_visit']} for {trip_details['duration_days']} days")
+        if self._is_long_trip(trip_details["duration_days"]):
+            return self._generate_long_itinerary_text(system_prompt, user_prompt, trip_details)
+        
+        started = time.monotonic()
+        stream = self.llm_provider.stream(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            cache_prompt=True
+        )
+        
+        # Follow the day headers as they stream in, stopping if the model starts over
+        chunks = []
+        tracker = ItineraryDayTracker(trip_details["duration_days"])
+        for delta in stream:
+            chunks.append(delta)
+            if not tracker.feed(delta):
+                logger.warning("Itinerary started repeating days, stopping early")
+                break
+        tracker.finish()
+        
+        itinerary_text = "".join(chunks)
+        self._log_stream_summary(stream, itinerary_text)
+        
+        deadline = started + self.section_timeouts["itinerary"] * REPAIR_DEADLINE_SHARE
+        itinerary_text, _ = self._complete_itinerary(
+            itinerary_text, stream.truncated, tracker, system_prompt, user_prompt, deadline
+        )
+        logger.info(f"Itinerary preview: {itinerary_text[:200]}...")
+        return itinerary_text
+    
+    async def _agenerate_itinerary_text(self, system_prompt: str, user_prompt: str, trip_details: Dict[str, Any]) -> str:
+        """
+        Call the LLM's async client for the day-by-day itinerary text.
+        
+        Async counterpart of _generate_itinerary_text().
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            trip_details: Trip metadata from _build_itinerary_prompts()
+            
+        Returns:
+            The generated itinerary text
+        """
+        itinerary_text = ""
+        async for kind, text in self._astream_itinerary_text(system_prompt, user_prompt, trip_details):
+            if kind == "itinerary":
+                itinerary_text = text
+        return itinerary_text
+    
+    async def _astream_itinerary_text(self,
+                                      system_prompt: str,
+                                      user_prompt: str,
+                                      trip_details: Dict[str, Any]) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Generate the itinerary text, yielding it as it is produced.
+        
+        Long trips are generated in parallel batches of days, short ones with a single
+        stream. Either way the day headers are validated and missing days regenerated.
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            trip_details: Trip metadata from _build_itinerary_prompts()
+            
+        Yields:
+            ("delta", text) for each piece of itinerary text, in reading order, then
+            ("itinerary", text) once with the complete, validated itinerary. Regenerated
+            days arrive as one last delta; the complete itinerary has them in place. If a
+            single stream misses the itinerary deadline, the text is empty so the agent
+            substitutes its fallback.
+        """
+        started = time.monotonic()
+        deadline = started + self.section_timeouts["itinerary"] * REPAIR_DEADLINE_SHARE
+        logger.info(f"Generating itinerary for {trip_details['place_to_visit']} for {trip_details['duration_days']} days")
+        
+        if self._is_long_trip(trip_details["duration_days"]):
+            day_plan = await self._agenerate_day_plan(system_prompt, user_prompt, trip_details["duration_days"])
+            batches = self._day_batches(trip_details["duration_days"])
+            semaphore = asyncio.Semaphore(self.long_trip["max_parallel_batches"])
+            
+            async def generate_batch(batch: List[int]) -> str:
+                async with semaphore:
+                    stream = self.llm_provider.astream(
+                        system_prompt=system_prompt,
+                        user_prompt=self._build_batch_prompt(user_prompt, day_plan, batch, batches),
+                        cache_prompt=True
+                    )
+                    text, incomplete = await self._aread_stream(stream, deadline)
+                    return self._drop_cut_off_day(text) if incomplete else text
+            
+            # All batches run at once; each is yielded as soon as it and the ones before it are done
+            tasks = [asyncio.create_task(generate_batch(batch)) for batch in batches]
+            parts = []
+            try:
+                for task in tasks:
+                    parts.append(await task)
+                    yield "delta", ("\n\n" if len(parts) > 1 else "") + parts[-1]
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            itinerary_text = "\n\n".join(parts)
+            truncated = False
+            tracker = ItineraryDayTracker(trip_details["duration_days"])
+            tracker.feed(itinerary_text)
+            tracker.finish()
+        else:
+            stream = self.llm_provider.astream(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                cache_prompt=True
+            )
+            
+            # Follow the day headers as they stream in, stopping if the model starts over
+            chunks = []
+            tracker = ItineraryDayTracker(trip_details["duration_days"])
+            deltas = stream.__aiter__()
+            while True:
+                try:
+                    delta = await self._anext_delta(deltas, started + self.section_timeouts["itinerary"])
+                except asyncio.TimeoutError:
+                    # A partial itinerary is not a plan; let the agent substitute its fallback
+                    logger.warning(f"Streaming of itinerary missed its {self.section_timeouts['itinerary']}s deadline")
+                    yield "itinerary", ""
+                    return
+                if delta is None:
+                    break
+                
+                chunks.append(delta)
+                yield "delta", delta
+                
+                if not tracker.feed(delta):
+                    logger.warning("Itinerary started repeating days, stopping early")
+                    break
+            tracker.finish()
+            
+            itinerary_text = "".join(chunks)
+            truncated = stream.truncated
+            self._log_stream_summary(stream, itinerary_text)
+        
+        itinerary_text, regenerated = await self._acomplete_itinerary(
+            itinerary_text, truncated, tracker, system_prompt, user_prompt, deadline
+        )
+        if regenerated:
+            yield "delta", "\n\n" + "\n\n".join(regenerated.values())
+        
+        logger.info(f"Itinerary preview: {itinerary_text[:200]}...")
+        yield "itinerary", itinerary_text
+    
+    def _generate_long_itinerary_text(self, system_prompt: str, user_prompt: str, trip_details: Dict[str, Any]) -> str:
+        """
+        Generate a long trip's itinerary as a day plan followed by parallel batches of days.
+        
+        A first, short call plans a theme and area for every day. The days are then written
+        in batches that all run at once, each batch following the plan so days don't repeat
+        each other, and the batches are joined in the usual "## Day N" format. Latency is
+        the plan call plus the slowest batch, whatever the trip length.
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            trip_details: Trip metadata from _build_itinerary_prompts()
+            
+        Returns:
+            The generated itinerary text
+        """
+        started = time.monotonic()
+        deadline = started + self.section_timeouts["itinerary"] * REPAIR_DEADLINE_SHARE
+        day_plan = self._generate_day_plan(system_prompt, user_prompt, trip_details["duration_days"])
+        batches = self._day_batches(trip_details["duration_days"])
+        
+        def generate_batch(batch: List[int]) -> str:
+            stream = self.llm_provider.stream(
+                system_prompt=system_prompt,
+                user_prompt=self._build_batch_prompt(user_prompt, day_plan, batch, batches),
+                cache_prompt=True
+            )
+            text, incomplete = self._read_stream(stream, deadline)
+            return self._drop_cut_off_day(text) if incomplete else text
+        
+        with ThreadPoolExecutor(max_workers=self.long_trip["max_parallel_batches"], thread_name_prefix="itinerary") as executor:
+            parts = list(executor.map(generate_batch, batches))
+        
+        itinerary_text = "\n\n".join(parts)
+        tracker = ItineraryDayTracker(trip_details["duration_days"])
+        tracker.feed(itinerary_text)
+        tracker.finish()
+        
+        itinerary_text, _ = self._complete_itinerary(itinerary_text, False, tracker, system_prompt, user_prompt, deadline)
+        logger.info(f"Itinerary preview: {itinerary_text[:200]}...")
+        return itinerary_text
+    
+    def _is_long_trip(self, duration_days: int) -> bool:
+        """
+        Check whether a trip is generated in parallel batches of days.
+        """
+        return bool(self.long_trip["enabled"]) and duration_days >= self.long_trip["min_days"]
+    
+    def _day_batches(self, duration_days: int) -> List[List[int]]:
+        """
+        Split the trip's days into consecutive batches of days_per_batch days.
+        """
+        size = max(1, self.long_trip["days_per_batch"])
+        return [list(range(first, min(first + size, duration_days + 1))) for first in range(1, duration_days + 1, size)]
+    
+    def _generate_day_plan(self, system_prompt: str, user_prompt: str, duration_days: int) -> Dict[int, str]:
+        """
+        Ask for a one-line plan of every day of a long trip.
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            duration_days: Number of days in the trip
+            
+        Returns:
+            Plan line by day number; days the model left out are missing
+        """
+        logger.info(f"Planning {duration_days} days before generating them in batches")
+        text = self.llm_provider.generate(
+            system_prompt=system_prompt,
+            user_prompt=self._build_day_plan_prompt(user_prompt, duration_days),
+            cache_prompt=True
+        )
+        return parse_day_plan(text, duration_days)
+    
+    async def _agenerate_day_plan(self, system_prompt: str, user_prompt: str, duration_days: int) -> Dict[int, str]:
+        """
+        Async counterpart of _generate_day_plan().
+        
+        Args:
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            duration_days: Number of days in the trip
+            
+        Returns:
+            Plan line by day number; days the model left out are missing
+        """
+        logger.info(f"Planning {duration_days} days before generating them in batches")
+        text = await self.llm_provider.agenerate(
+            system_prompt=system_prompt,
+            user_prompt=self._build_day_plan_prompt(user_prompt, duration_days),
+            cache_prompt=True
+        )
+        return parse_day_plan(text, duration_days)
+    
+    def _build_day_plan_prompt(self, user_prompt: str, duration_days: int) -> str:
+        """
+        Build the user prompt asking for a compact plan of the whole trip.
+        
+        Args:
+            user_prompt: Itinerary user prompt
+            duration_days: Number of days in the trip
+            
+        Returns:
+            The day plan user prompt
+        """
+        return f"""{user_prompt}
+        
+        ## Plan First
+        Do NOT write the itinerary yet. Reply with ONLY a plan of the {duration_days} days, one line per day
+        from Day 1 to Day {duration_days}, in exactly this format:
+        Day N: <theme> | <neighbourhood or area> | <two or three main attractions>
+        Spread the attractions so that no two days overlap.
+        """
+    
+    def _build_batch_prompt(self,
+                            user_prompt: str,
+                            day_plan: Dict[int, str],
+                            batch: List[int],
+                            batches: List[List[int]]) -> str:
+        """
+        Build the user prompt asking for one batch of days of a long itinerary.
+        
+        The first batch also writes the title and overview and the last one the closing
+        sections, so the joined batches read as one itinerary.
+        
+        Args:
+            user_prompt: Itinerary user prompt
+            day_plan: Plan line by day number
+            batch: Day numbers to write
+            batches: All batches, in order
+            
+        Returns:
+            The batch user prompt
+        """
+        plan = "\n".join(f"Day {day}: {day_plan.get(day, 'Free choice, not overlapping the other days')}"
+                         for day in range(1, batches[-1][-1] + 1))
+        opening = ('Start with the title and the "## Overview" section.' if batch is batches[0]
+                   else "Do not write a title or an overview.")
+        closing = ("After the last day, add the Accommodation, Transportation, Dining Recommendations, "
+                   "Estimated Costs and Tips sections." if batch is batches[-1]
+                   else "Do not write any section other than the days.")
+        return f"""{user_prompt}
+        
+        ## Writing Part of a Long Itinerary
+        This itinerary is written in parts, which replaces the instruction above to write every day in one response.
+        The plan for the whole trip is:
+        {plan}
+        
+        Write ONLY Day {batch[0]} to Day {batch[-1]}, following the plan above. Start each with its "## Day N" header
+        and follow the same morning, afternoon and evening format.
+        Do not use the attractions or restaurants planned for other days.
+        {opening}
+        {closing}
+        """
+    
+    def _drop_cut_off_day(self, text: str) -> str:
+        """
+        Remove the last day section of a batch that was cut off by max_tokens or the deadline.
+        
+        The day is kept if the cut fell in the closing sections the final batch writes
+        after its days, and those sections are kept either way, since repair calls never
+        write them again.
+        """
+        preamble, days, tail = split_itinerary(text)
+        if days and not tail.strip():
+            del days[max(days)]
+        return assemble_itinerary(preamble, days, tail)
+    
+    def _read_stream(self, stream: LLMStream, deadline: float) -> Tuple[str, bool]:
+        """
+        Read a stream to the end or until the deadline passes.
+        
+        Args:
+            stream: The stream to read
+            deadline: time.monotonic() value after which reading stops
+            
+        Returns:
+            Tuple of (text, incomplete), where incomplete means the text was cut off by
+            max_tokens or the deadline
+        """
+        chunks = []
+        for delta in stream:
+            chunks.append(delta)
+            if time.monotonic() > deadline:
+                return "".join(chunks), True
+        return "".join(chunks), stream.truncated
+    
+    async def _aread_stream(self, stream: AsyncLLMStream, deadline: float) -> Tuple[str, bool]:
+        """
+        Async counterpart of _read_stream().
+        
+        Args:
+            stream: The stream to read
+            deadline: time.monotonic() value after which reading stops
+            
+        Returns:
+            Tuple of (text, incomplete), where incomplete means the text was cut off by
+            max_tokens or the deadline
+        """
+        chunks = []
+        deltas = stream.__aiter__()
+        while True:
+            try:
+                delta = await self._anext_delta(deltas, deadline)
+            except asyncio.TimeoutError:
+                return "".join(chunks), True
+            if delta is None:
+                return "".join(chunks), stream.truncated
+            chunks.append(delta)
+    
+    async def _anext_delta(self, deltas: AsyncIterator[str], deadline: float) -> Optional[str]:
+        """
+        Wait for the next delta of a stream, at most until the deadline.
+        
+        Args:
+            deltas: Iterator over the stream's text deltas
+            deadline: time.monotonic() value after which waiting stops
+            
+        Returns:
+            The next delta, or None at the end of the stream
+            
+        Raises:
+            asyncio.TimeoutError: If the deadline passes before the next delta arrives
+        """
+        try:
+            return await asyncio.wait_for(deltas.__anext__(), timeout=max(0.0, deadline - time.monotonic()))
+        except StopAsyncIteration:
+            return None
+    
+    def _complete_itinerary(self,
+                            itinerary_text: str,
+                            truncated: bool,
+                            tracker: ItineraryDayTracker,
+                            system_prompt: str,
+                            user_prompt: str,
+                            deadline: float) -> Tuple[str, Dict[int, str]]:
+        """
+        Drop repeated days and regenerate the missing ones with small follow-up calls.
+        
+        Each follow-up call asks only for the days still missing, so a long trip that hit
+        max_tokens is finished without generating the whole itinerary again.
+        
+        Args:
+            itinerary_text: The streamed itinerary
+            truncated: Whether the itinerary stream hit max_tokens
+            tracker: The day tracker fed with the itinerary stream
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            deadline: time.monotonic() value after which no further call is started
+            
+        Returns:
+            Tuple of (itinerary_text, regenerated), where regenerated holds the new day
+            sections by day number
+        """
+        repair = self._repair_itinerary(itinerary_text, truncated, tracker, user_prompt, deadline)
+        try:
+            repair_prompt = next(repair)
+            while True:
+                stream = self.llm_provider.stream(
+                    system_prompt=system_prompt,
+                    user_prompt=repair_prompt,
+                    cache_prompt=True
+                )
+                repair_prompt = repair.send(self._read_stream(stream, deadline))
+        except StopIteration as done:
+            return done.value
+    
+    async def _acomplete_itinerary(self,
+                                   itinerary_text: str,
+                                   truncated: bool,
+                                   tracker: ItineraryDayTracker,
+                                   system_prompt: str,
+                                   user_prompt: str,
+                                   deadline: float) -> Tuple[str, Dict[int, str]]:
+        """
+        Async counterpart of _complete_itinerary().
+        
+        Args:
+            itinerary_text: The streamed itinerary
+            truncated: Whether the itinerary stream hit max_tokens
+            tracker: The day tracker fed with the itinerary stream
+            system_prompt: Itinerary system prompt
+            user_prompt: Itinerary user prompt
+            deadline: time.monotonic() value after which no further call is started
+            
+        Returns:
+            Tuple of (itinerary_text, regenerated), where regenerated holds the new day
+            sections by day number
+        """
+        repair = self._repair_itinerary(itinerary_text, truncated, tracker, user_prompt, deadline)
+        try:
+            repair_prompt = next(repair)
+            while True:
+                stream = self.llm_provider.astream(
+                    system_prompt=system_prompt,
+                    user_prompt=repair_prompt,
+                    cache_prompt=True
+                )
+                repair_prompt = repair.send(await self._aread_stream(stream, deadline))
+        except StopIteration as done:
+            return done.value
+    
+    def _repair_itinerary(self,
+                          itinerary_text: str,
+                          truncated: bool,
+                          tracker: ItineraryDayTracker,
+                          user_prompt: str,
+                          deadline: float) -> Generator[str, Tuple[str, bool], Tuple[str, Dict[int, str]]]:
+        """
+        Run the repair rounds of _complete_itinerary() and _acomplete_itinerary().
+        
+        Yields the user prompt of each follow-up call and is sent back that call's
+        (text, incomplete) result, so the sync and async callers only differ in how
+        they make the call.
+        
+        Args:
+            itinerary_text: The streamed itinerary
+            truncated: Whether the itinerary stream hit max_tokens
+            tracker: The day tracker fed with the itinerary stream
+            user_prompt: Itinerary user prompt
+            deadline: time.monotonic() value after which no further call is started
+            
+        Returns:
+            Tuple of (itinerary_text, regenerated), as returned by _complete_itinerary()
+        """
+        preamble, days, tail = split_itinerary(itinerary_text)
+        missing = self._days_to_regenerate(days, tail, truncated, tracker)
+        if not missing and len(days) == len(tracker.days):
+            return itinerary_text, {}
+        
+        regenerated = {}
+        for _ in range(self.max_repair_rounds):
+            if not missing or time.monotonic() > deadline:
+                break
+            logger.info(f"Regenerating itinerary days {missing}")
+            text, incomplete = yield self._build_repair_prompt(user_prompt, days, missing)
+            missing = self._merge_repaired_days(text, incomplete, missing, days, regenerated)
+        
+        if missing:
+            logger.warning(f"Itinerary is still missing days {missing}")
+        return assemble_itinerary(preamble, days, tail), regenerated
+    
+    def _days_to_regenerate(self,
+                            days: Dict[int, str],
+                            tail: str,
+                            truncated: bool,
+                            tracker: ItineraryDayTracker) -> List[int]:
+        """
+        Get the days to regenerate: those without a header, plus the last day written if
+        the stream was cut off inside it. Days past the requested duration are dropped.
+        
+        A stream cut off in the sections after the days (accommodation, tips and so on)
+        leaves every day complete, so the last day is only dropped when nothing follows it.
+        
+        Args:
+            days: Day sections from split_itinerary(), updated in place
+            tail: Sections after the days, from split_itinerary()
+            truncated: Whether the itinerary stream hit max_tokens
+            tracker: The day tracker fed with the itinerary stream
+            
+        Returns:
+            Day numbers to regenerate, in order
+        """
+        cut_off_in_day = truncated and not tail.strip()
+        if cut_off_in_day and tracker.days and tracker.days[-1] in days and not tracker.duplicate_days():
+            logger.warning(f"Itinerary was cut off in day {tracker.days[-1]}")
+            del days[tracker.days[-1]]
+        for day in [day for day in days if day > tracker.duration_days]:
+            del days[day]
+        
+        return [day for day in range(1, tracker.duration_days + 1) if day not in days]
+    
+    def _merge_repaired_days(self,
+                             text: str,
+                             incomplete: bool,
+                             missing: List[int],
+                             days: Dict[int, str],
+                             regenerated: Dict[int, str]) -> List[int]:
+        """
+        Add the days written by a follow-up call to the itinerary.
+        
+        Args:
+            text: The follow-up call's output
+            incomplete: Whether that output was cut off, in which case its last day is dropped
+            missing: The days that were asked for
+            days: Day sections of the itinerary, updated in place
+            regenerated: New day sections, updated in place
+            
+        Returns:
+            The days that are still missing
+        """
+        _, new_days, _ = split_itinerary(text)
+        new_days = {day: section for day, section in new_days.items() if day in missing}
+        if incomplete and new_days:
+            del new_days[max(new_days)]
+        
+        days.update(new_days)
+        regenerated.update(new_days)
+        return [day for day in missing if day not in days]
+    
+    def _build_repair_prompt(self, user_prompt: str, days: Dict[int, str], missing: List[int]) -> str:
+        """
+        Build the user prompt asking for only the missing itinerary days.
+        
+        It extends the original user prompt, so the follow-up call has the same trip
+        details and context, and summarizes the days already written to avoid repeats.
+        
+        Args:
+            user_prompt: Itinerary user prompt
+            days: Day sections already written
+            missing: Day numbers to write
+            
+        Returns:
+            The follow-up user prompt
+        """
+        written = summarize_days(days) if days else "- None"
+        wanted = ", ".join(f"Day {day}" for day in missing)
+        return f"""{user_prompt}
+        
+        ## Continuing an Unfinished Itinerary
+        Part of this itinerary has already been written. The days written so far start with:
+        {written}
+        
+        Write ONLY the following days: {wanted}.
+        Start each with its "## Day N" header and follow the same morning, afternoon and evening format.
+        Do not repeat attractions or restaurants from the days already written.
+        Do not write an overview, accommodation, transportation or any other section.
+        """
+    
+    def _log_stream_summary(self, stream: LLMStream, text: str) -> None:
+        """
+        Log the size, token usage and finish reason of a finished stream.
+        
+        Args:
+            stream: The exhausted (or abandoned) stream
+            text: The text received from it
+        """
+        logger.info(f"Successfully generated itinerary: {len(text)} chars, "
+                    f"usage={stream.usage}, finish_reason={stream.finish_reason}")
+        if stream.truncated:
+            logger.warning("Itinerary hit the max_tokens limit and is likely incomplete")
+    
+    async def _await_section(self, section: str, coro: Awaitable[str]) -> str:
+        """
+        Await one output section within its deadline.
+        
+        Args:
+            section: Section name, one of OUTPUT_SECTIONS
+            coro: Coroutine producing the section text
+            
+        Returns:
+            The section text, or an empty string if the deadline was missed so the
+            agent substitutes its fallback for that section
+        """
+        try:
+            return await asyncio.wait_for(coro, timeout=self.section_timeouts[section])
+        except asyncio.TimeoutError:
+            logger.warning(f"Generation of {section} missed its {self.section_timeouts[section]}s deadline")
+            return ""
+        except Exception as e:
+            return self._section_error(section, e)
+    
+    def _section_error(self, section: str, error: Exception) -> str:
+        """
+        Log a failed section and return its user-facing error text.
+        
+        Args:
+            section: Section name, one of OUTPUT_SECTIONS
+            error: The exception raised while generating the section
+            
+        Returns:
+            Apology text for the itinerary, or an empty string for the other sections
+        """
+        logger.error(f"Error generating {section}: {error}", exc_info=error)
+        if section == "itinerary":
+            return "I apologize, but I couldn't generate a detailed itinerary. Please try again with more specific information about your trip."
+        return ""
+    
+    def _build_itinerary_prompts(self, 
+                                 features: Dict[str, Any], 
+                                 context: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Build the itinerary prompts and the trip details returned alongside them.
+        
+        Args:
+            features: Extracted travel preferences.
+            context: Collected context information.
+            
+        Returns:
+            Tuple of (system_prompt, user_prompt, trip_details), where trip_details
+            holds the destination, start/end dates, duration and daily dates.
+        """
+        # Prepare context for the prompt, deduplicated and trimmed to the section's token budget
+        context = self.context_packer.pack("itinerary", context)
         search_context = self._format_search_context(context.get("search_results", []))
         weather_context = self._format_weather_context(context.get("weather_info", {}))
         location_context = self._format_location_context(context.get("map_info", {}))
@@ -99,17 +931,20 @@ class OutputGenerator:
         logger.info(f"Planning trip to {destination} for {duration_days} days")
         logger.info(f"Daily dates: {daily_dates}")
         
-        system_prompt = f"""
+        # Kept free of per-trip values so providers can cache it as a prompt prefix;
+        # the destination, duration and context all go in the user prompt
+        system_prompt = """
         You are a personalized travel planning assistant called NoDetours.
         Your goal is to create detailed, personalized travel itineraries based on user preferences,
         external data about destinations, and current context (like weather conditions).
         
-        You are a TRUE EXPERT on {destination} and will create a comprehensive travel itinerary.
+        You are a TRUE EXPERT on the destination in the user's message and will create a comprehensive travel itinerary.
+        Below, <Destination> stands for that destination and <N> for the number of days the user asks for.
         
-        # {destination} Travel Itinerary for {duration_days} Days
+        # <Destination> Travel Itinerary for <N> Days
         
         ## Overview
-        Welcome to {destination}, known for its [specific unique features]. This itinerary covers a {duration_days}-day trip and includes the best attractions and experiences this destination has to offer.
+        Welcome to <Destination>, known for its [specific unique features]. This itinerary covers a <N>-day trip and includes the best attractions and experiences this destination has to offer.
         
         ## Day 1
         - **Morning**:
@@ -144,17 +979,17 @@ class OutputGenerator:
           - [Activity 1]
           - [Activity 2]
           
-        [Continue until you create EXACTLY {duration_days} days in total]
+        [Continue until you create EXACTLY <N> days in total]
         
-        YOU MUST CREATE EXACTLY {duration_days} DAYS IN TOTAL - from Day 1 to Day {duration_days}.
+        YOU MUST CREATE EXACTLY <N> DAYS IN TOTAL - from Day 1 to Day <N>.
         
-        VERY IMPORTANT: Use EXACTLY this format: "## Day X" (where X is 1 through {duration_days}) without any dates or subtitles.
+        VERY IMPORTANT: Use EXACTLY this format: "## Day X" (where X is 1 through <N>) without any dates or subtitles.
         DO NOT use any special styling, backgrounds, or colors.
         
-        At the end, verify that you have created entries for all days from Day 1 through Day {duration_days}.
+        At the end, verify that you have created entries for all days from Day 1 through Day <N>.
         
         ## Accommodation
-        - **Luxury**: The Grand Hotel {destination} - $300-400 per night, featuring spa facilities and downtown views
+        - **Luxury**: The Grand Hotel <Destination> - $300-400 per night, featuring spa facilities and downtown views
         - **Mid-Range**: Parkview Inn - $150-200 per night, centrally located with complimentary breakfast
         - **Budget-Friendly**: Traveler's Lodge - $70-100 per night, clean and basic accommodations near public transportation
         
@@ -185,12 +1020,12 @@ class OutputGenerator:
         - Look for the "Local's Menu" at restaurants for authentic and affordable options
         - The City Pass ($45) provides entry to 5 major attractions and is worth purchasing
         
-        USE THE ABOVE EXAMPLE as a format reference only. You MUST replace ALL content with genuine attractions, restaurants, hotels, and specific details about {destination}.
+        USE THE ABOVE EXAMPLE as a format reference only. You MUST replace ALL content with genuine attractions, restaurants, hotels, and specific details about <Destination>.
         
         EXTREMELY IMPORTANT:
         1. NEVER include placeholder text inside square brackets
         2. NEVER use text like "[attraction name]" or "famous museum" - always use the ACTUAL NAMES of real places
-        3. EVERY SINGLE attraction, restaurant, museum, park, and hotel MUST be a real place that exists in {destination}
+        3. EVERY SINGLE attraction, restaurant, museum, park, and hotel MUST be a real place that exists in <Destination>
         4. Include the SPECIFIC DATE for each day in the format shown above (YYYY-MM-DD)
         5. Include PRECISE price ranges in local currency for all cost estimates
         6. BE EXTREMELY SPECIFIC and DETAILED about each attraction and location
@@ -242,41 +1077,18 @@ class OutputGenerator:
         I will immediately reject any itinerary that doesn't contain exactly {duration_days} days.
         """
         
-        try:
-            logger.info(f"Generating itinerary for {destination} for {duration_days} days")
-            itinerary_text = self.llm_provider.generate(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt
-            )
-            
-            logger.info(f"Successfully generated itinerary: {len(itinerary_text)} chars")
-            logger.info(f"Itinerary preview: {itinerary_text[:200]}...")
-            
-            # Store trip details to return along with the itinerary
-            # Even though we're not displaying dates in the UI, we'll still include them 
-            # in the trip_details for the calendar feature
-            trip_details = {
-                "place_to_visit": destination,
-                "start_date": start_date_str,
-                "end_date": end_date_str,
-                "duration_days": duration_days,
-                "daily_dates": daily_dates
-            }
-            
-            return {
-                "itinerary": itinerary_text,
-                "packing_list": self.generate_packing_list(features, context),
-                "estimated_budget": self.estimate_budget(features, context),
-                "trip_details": trip_details
-            }
-        except Exception as e:
-            logger.error(f"Error generating itinerary: {e}", exc_info=True)
-            return {
-                "itinerary": "I apologize, but I couldn't generate a detailed itinerary. Please try again with more specific information about your trip.",
-                "packing_list": "",
-                "estimated_budget": "",
-                "trip_details": {}
-            }
+        # Store trip details to return along with the itinerary
+        # Even though we're not displaying dates in the UI, we'll still include them 
+        # in the trip_details for the calendar feature
+        trip_details = {
+            "place_to_visit": destination,
+            "start_date": start_date_str,
+            "end_date": end_date_str,
+            "duration_days": duration_days,
+            "daily_dates": daily_dates
+        }
+        
+        return system_prompt, user_prompt, trip_details
             
     def _parse_trip_dates(self, dates_str: str) -> Dict[str, Any]:
         """
@@ -523,6 +1335,56 @@ class OutputGenerator:
         """
         logger.info("Generating packing list")
         
+        system_prompt, user_prompt = self._build_packing_list_prompts(features, context)
+        
+        try:
+            return self.llm_provider.generate(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt
+            )
+        except Exception as e:
+            logger.error(f"Error generating packing list: {e}", exc_info=True)
+            return "I apologize, but I couldn't generate a packing list. Please try again with more specific information about your trip."
+    
+    async def agenerate_packing_list(self, 
+                                     features: Dict[str, Any], 
+                                     context: Dict[str, Any]) -> str:
+        """
+        Generate a packing list without blocking the event loop.
+        
+        Args:
+            features: Dictionary containing trip features
+            context: Dictionary containing contextual information like weather data
+            
+        Returns:
+            Formatted packing list as a string
+        """
+        logger.info("Generating packing list")
+        
+        system_prompt, user_prompt = self._build_packing_list_prompts(features, context)
+        
+        try:
+            return await self.llm_provider.agenerate(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt
+            )
+        except Exception as e:
+            logger.error(f"Error generating packing list: {e}", exc_info=True)
+            return "I apologize, but I couldn't generate a packing list. Please try again with more specific information about your trip."
+    
+    def _build_packing_list_prompts(self, 
+                                    features: Dict[str, Any], 
+                                    context: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Build the system and user prompts for the packing list.
+        
+        Args:
+            features: Dictionary containing trip features
+            context: Dictionary containing contextual information like weather data
+            
+        Returns:
+            Tuple of (system_prompt, user_prompt)
+        """
         system_prompt = """
         You are a travel planning assistant. Your task is to create a comprehensive 
         packing list based on the destination, weather conditions, and planned activities.
@@ -532,7 +1394,7 @@ class OutputGenerator:
         """
         
         # Format weather information
-        weather_info = context.get("weather_info", {})
+        weather_info = self.context_packer.pack("packing_list", context).get("weather_info", {})
         weather_summary = self._format_weather_context(weather_info)
         
         user_prompt = f"""
@@ -545,14 +1407,7 @@ class OutputGenerator:
         - Food interests: {', '.join(features.get('cuisine_preferences', []) or []) or 'Not specified'}
         """
         
-        try:
-            return self.llm_provider.generate(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt
-            )
-        except Exception as e:
-            logger.error(f"Error generating packing list: {e}", exc_info=True)
-            return "I apologize, but I couldn't generate a packing list. Please try again with more specific information about your trip."
+        return system_prompt, user_prompt
     
     def estimate_budget(self, 
                        features: Dict[str, Any], 
@@ -575,6 +1430,64 @@ class OutputGenerator:
         """
         logger.info("Generating budget estimate")
         
+        system_prompt, user_prompt = self._build_budget_prompts(features, context)
+        
+        try:
+            logger.info("Calling LLM for budget estimation")
+            budget = self.llm_provider.generate(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                cache_prompt=True
+            )
+            logger.info(f"Budget generated successfully: {budget[:100]}...")
+            return budget
+        except Exception as e:
+            logger.error(f"Error generating budget estimate: {e}", exc_info=True)
+            return "I apologize, but I couldn't generate a budget estimate. Please try again with more specific information about your trip."
+    
+    async def aestimate_budget(self, 
+                               features: Dict[str, Any], 
+                               context: Dict[str, Any]) -> str:
+        """
+        Estimate a detailed budget for the trip without blocking the event loop.
+        
+        Args:
+            features: Dictionary containing trip features
+            context: Dictionary containing contextual information
+            
+        Returns:
+            Formatted budget estimate as a string
+        """
+        logger.info("Generating budget estimate")
+        
+        system_prompt, user_prompt = self._build_budget_prompts(features, context)
+        
+        try:
+            logger.info("Calling LLM for budget estimation")
+            budget = await self.llm_provider.agenerate(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                cache_prompt=True
+            )
+            logger.info(f"Budget generated successfully: {budget[:100]}...")
+            return budget
+        except Exception as e:
+            logger.error(f"Error generating budget estimate: {e}", exc_info=True)
+            return "I apologize, but I couldn't generate a budget estimate. Please try again with more specific information about your trip."
+    
+    def _build_budget_prompts(self, 
+                              features: Dict[str, Any], 
+                              context: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Build the system and user prompts for the budget estimate.
+        
+        Args:
+            features: Dictionary containing trip features
+            context: Dictionary containing contextual information
+            
+        Returns:
+            Tuple of (system_prompt, user_prompt)
+        """
         system_prompt = """
         You are a travel budget estimator. Your task is to provide a reasonable 
         budget estimate based on the destination, accommodation preferences, 
@@ -628,17 +1541,7 @@ class OutputGenerator:
         Make sure your output follows EXACTLY the format specified in the system prompt.
         """
         
-        try:
-            logger.info("Calling LLM for budget estimation")
-            budget = self.llm_provider.generate(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt
-            )
-            logger.info(f"Budget generated successfully: {budget[:100]}...")
-            return budget
-        except Exception as e:
-            logger.error(f"Error generating budget estimate: {e}", exc_info=True)
-            return "I apologize, but I couldn't generate a budget estimate. Please try again with more specific information about your trip."
+        return system_prompt, user_prompt
     
     def _format_search_context(self, search_results: List[Dict[str, Any]]) -> str:
         """
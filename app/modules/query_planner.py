@@ -0,0 +1,169 @@
+"""
+app/modules/query_planner.py
+
+Query planning module that sits between search query generation and context collection.
+Removes near-duplicate search queries, ranks the rest by feature importance and trims the
+plan to a fixed budget of search and scrape calls.
+"""
+
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Importance of each feature type when the budget forces queries to be dropped
+DEFAULT_FEATURE_WEIGHTS = {
+    "place_to_visit": 1.0,
+    "place_preferences": 0.8,
+    "cuisine_preferences": 0.7,
+    "transport_preferences": 0.6,
+    "duration_days": 0.5,
+    "general": 0.4
+}
+
+# Words ignored when comparing queries
+STOP_WORDS = {
+    "a", "an", "the", "in", "on", "at", "of", "for", "to", "and", "or", "with", "by", "from",
+    "best", "top", "most", "guide", "travel", "tourist", "tourists", "visit", "visiting",
+    "where", "what", "how", "find", "things", "do", "tips", "recommended"
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class QueryPlanner:
+    """
+    Turns the generated search queries into a bounded search plan.
+    
+    Queries are compared as normalized token sets. Two preference queries are duplicates
+    when one feature value is (nearly) contained in the other, such as "museums" and
+    "art museums"; any two queries are duplicates when their query texts are nearly the
+    same. The earlier, higher-ranked query of a duplicate pair is kept.
+    
+    The remaining queries are picked greedily by feature weight, with each further query
+    of an already chosen feature type worth less (decay), so one long preference list
+    can't crowd out the other feature types. Each search scrapes its top result, so the
+    plan holds at most min(max_searches, max_scrapes) queries.
+    
+    Attributes:
+        max_searches (int): Maximum search calls per plan.
+        max_scrapes (int): Maximum scrape calls per plan.
+        similarity_threshold (float): Token-set similarity at or above which queries are duplicates.
+        feature_weights (Dict[str, float]): Importance of each feature type.
+        decay (float): Weight multiplier for each query already chosen of the same type.
+    """
+    
+    def __init__(self,
+                 max_searches: int = 8,
+                 max_scrapes: int = 8,
+                 similarity_threshold: float = 0.8,
+                 feature_weights: Optional[Dict[str, float]] = None,
+                 decay: float = 0.5):
+        """
+        Initialize the QueryPlanner.
+        
+        Args:
+            max_searches (int, optional): Maximum search calls per plan. Defaults to 8.
+            max_scrapes (int, optional): Maximum scrape calls per plan. Defaults to 8.
+            similarity_threshold (float, optional): Duplicate threshold between 0 and 1. Defaults to 0.8.
+            feature_weights (Optional[Dict[str, float]], optional): Weights overriding entries
+                of DEFAULT_FEATURE_WEIGHTS. Defaults to None.
+            decay (float, optional): Weight multiplier per query already chosen of the same
+                feature type. Defaults to 0.5.
+        """
+        self.max_searches = max_searches
+        self.max_scrapes = max_scrapes
+        self.similarity_threshold = similarity_threshold
+        self.feature_weights = {**DEFAULT_FEATURE_WEIGHTS, **(feature_weights or {})}
+        self.decay = decay
+        logger.info(f"Initialized Query Planner (max_searches={max_searches}, max_scrapes={max_scrapes})")
+    
+    def plan(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Deduplicate, rank and budget the search queries.
+        
+        Args:
+            queries (List[Dict[str, Any]]): Queries with 'feature_type', 'feature_value' and
+                'search_query' keys, as returned by SearchQueryGenerator.
+        
+        Returns:
+            List[Dict[str, Any]]: The queries to run, most important first.
+        """
+        unique = self._deduplicate([query for query in queries if query.get("search_query")])
+        budget = max(0, min(self.max_searches, self.max_scrapes))
+        
+        planned = []
+        chosen_per_type = {}
+        remaining = list(unique)
+        while remaining and len(planned) < budget:
+            best = max(remaining, key=lambda query: self._priority(query, chosen_per_type))
+            remaining.remove(best)
+            planned.append(best)
+            feature_type = best.get("feature_type", "general")
+            chosen_per_type[feature_type] = chosen_per_type.get(feature_type, 0) + 1
+        
+        logger.info(f"Planned {len(planned)} of {len(queries)} queries "
+                    f"({len(queries) - len(unique)} duplicates, {len(remaining)} over budget)")
+        return planned
+    
+    def _priority(self, query: Dict[str, Any], chosen_per_type: Dict[str, int]) -> float:
+        """
+        Get a query's current priority: its feature weight, decayed per query of the same type already chosen.
+        """
+        feature_type = query.get("feature_type", "general")
+        weight = self.feature_weights.get(feature_type, self.feature_weights["general"])
+        return weight * self.decay ** chosen_per_type.get(feature_type, 0)
+    
+    def _deduplicate(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop queries that duplicate an earlier one, keeping the original order.
+        """
+        kept = []
+        for query in queries:
+            duplicate_of = next((other for other in kept if self._is_duplicate(query, other)), None)
+            if duplicate_of is None:
+                kept.append(query)
+            else:
+                logger.info(f"Dropping duplicate query '{query['search_query']}' "
+                            f"(similar to '{duplicate_of['search_query']}')")
+        return kept
+    
+    def _is_duplicate(self, query: Dict[str, Any], other: Dict[str, Any]) -> bool:
+        """
+        Check whether two queries would retrieve essentially the same information.
+        """
+        query_tokens = self._tokens(query.get("search_query"))
+        other_tokens = self._tokens(other.get("search_query"))
+        if query_tokens and other_tokens:
+            jaccard = len(query_tokens & other_tokens) / len(query_tokens | other_tokens)
+            if jaccard >= self.similarity_threshold:
+                return True
+        
+        feature_type = query.get("feature_type")
+        if feature_type in ("place_to_visit", "duration_days", "general") or feature_type != other.get("feature_type"):
+            return False
+        
+        # Overlap coefficient, so a value contained in another ("museums" in "art museums") matches
+        value_tokens = self._tokens(query.get("feature_value"))
+        other_value_tokens = self._tokens(other.get("feature_value"))
+        if not value_tokens or not other_value_tokens:
+            return False
+        overlap = len(value_tokens & other_value_tokens) / min(len(value_tokens), len(other_value_tokens))
+        return overlap >= self.similarity_threshold
+    
+    def _tokens(self, text: Any) -> set:
+        """
+        Normalize text into a set of lowercase, singularized tokens without stop words.
+        """
+        tokens = set()
+        for token in TOKEN_PATTERN.findall(str(text or "").lower()):
+            if token in STOP_WORDS:
+                continue
+            if len(token) > 4 and token.endswith("ies"):
+                token = token[:-3] + "y"
+            elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            tokens.add(token)
+        return tokens
@@ -6,43 +6,179 @@ Provides functionality to parse and extract travel destinations, durations, pref
 """
 
 import re
-import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from api.llm_provider import LLMProvider
+from app.modules.local_extractor import LocalFeatureExtractor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CUISINE_KEYWORDS = [
+    'food', 'cuisine', 'restaurant', 'dining', 'eat', 'meal',
+    'breakfast', 'lunch', 'dinner', 'snack', 'cafe', 'wine',
+    'beer', 'drink', 'bar', 'pub', 'street food', 'local food',
+    'traditional food', 'culinary', 'gastronomy', 'thai food'
+]
+
+PLACE_KEYWORDS = [
+    'museum', 'art', 'history', 'beach', 'hiking', 'nature',
+    'shopping', 'nightlife', 'adventure', 'relax', 'culture',
+    'sightseeing', 'tour', 'park', 'festival', 'concert',
+    'sport', 'outdoor', 'photography', 'historical', 'site',
+    'monument', 'temple', 'church', 'cathedral', 'palace',
+    'castle', 'ruin', 'ancient', 'market', 'water sport',
+    'water sports', 'night market', 'activity', 'beaches'
+]
+
+TRANSPORT_KEYWORDS = [
+    'transport', 'bus', 'train', 'subway', 'metro', 'taxi',
+    'car', 'rental', 'bike', 'walking', 'public transport',
+    'tram', 'ferry', 'boat', 'scooter', 'motorcycle'
+]
+
+KEYWORD_FIELDS = {
+    "cuisine_preferences": CUISINE_KEYWORDS,
+    "place_preferences": PLACE_KEYWORDS,
+    "transport_preferences": TRANSPORT_KEYWORDS
+}
+
+def _build_keyword_index() -> Dict[str, List[Tuple[str, int]]]:
+    """
+    Map each keyword to the fields it belongs to and its position in each field's list.
+    """
+    index = {}
+    for field, keywords in KEYWORD_FIELDS.items():
+        for position, keyword in enumerate(keywords):
+            index.setdefault(keyword, []).append((field, position))
+    return index
+
+def _trie_regex(words: List[str]) -> str:
+    """
+    Build an alternation regex for the words, factored into a prefix trie.
+    
+    Sharing prefixes ("bea(?:ch(?:es)?)") keeps the regex engine from retrying every
+    keyword at each position, and the greedy optional suffixes make the longest
+    keyword win ("street food" over "street").
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+    
+    return build(trie)
+
+_KEYWORD_INDEX = _build_keyword_index()
+
+# One alternation over every keyword, so the input is scanned once for all of them
+KEYWORD_PATTERN = re.compile(r'\b(?:' + _trie_regex(list(_KEYWORD_INDEX)) + r')s?\b', re.IGNORECASE)
+
+DESTINATION_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
+        r'to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'visiting\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'trip\s+to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'vacation\s+in\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'travel(?:ing)?\s+to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'itinerary\s+for\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
+        r'plan\s+(?:a|my)?\s+(?:trip|visit)\s+(?:to)?\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)'
+    ]
+]
+
+DURATION_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
+        r'(\d+)\s+day(?:s)?',
+        r'(\d+)-day',
+        r'for\s+(\d+)\s+day(?:s)?',
+        r'for\s+(\d+)\s+night(?:s)?',
+        r'for\s+about\s+(\d+)\s+day(?:s)?'
+    ]
+]
+
+NUMBER_PATTERN = re.compile(r'(\d+)')
+
+# Schema of the features the LLM extracts; _validate_and_fill_features() normalizes the rest
+FEATURES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "place_to_visit": {"type": "string"},
+        "duration_days": {"type": ["integer", "null"]},
+        "cuisine_preferences": {"type": ["array", "null"], "items": {"type": "string"}},
+        "place_preferences": {"type": ["array", "null"], "items": {"type": "string"}},
+        "transport_preferences": {"type": ["string", "array", "null"], "items": {"type": "string"}}
+    },
+    "required": ["place_to_visit"]
+}
+
+def find_preference_keywords(user_input: str) -> Dict[str, List[str]]:
+    """
+    Find all cuisine, place and transport keywords in a single pass over the input.
+    
+    Keywords may be followed by a plural "s". Where keywords overlap, the longest one
+    is reported ("street food" rather than "street food" and "food").
+    
+    Args:
+        user_input (str): The natural language query from the user.
+    
+    Returns:
+        Dict[str, List[str]]: Matched keywords per feature field, each list in the order of
+            that field's keyword list and without duplicates.
+    """
+    found = {field: set() for field in KEYWORD_FIELDS}
+    for match in KEYWORD_PATTERN.finditer(user_input):
+        text = match.group(0).lower()
+        for field, position in _KEYWORD_INDEX.get(text) or _KEYWORD_INDEX[text[:-1]]:
+            found[field].add(position)
+    
+    return {
+        field: [KEYWORD_FIELDS[field][position] for position in sorted(positions)]
+        for field, positions in found.items()
+    }
+
 class SearchQueryExtractor:
     """
     Extracts search features from user text input.
     
     This class is responsible for processing natural language user queries about travel plans
     and extracting structured data about destinations, duration, preferences, etc. It uses a
-    combination of LLM-based extraction with regex-based fallbacks when needed.
+    combination of LLM-based extraction with regex-based fallbacks when needed. When a
+    local extractor is configured, simple queries it resolves confidently skip the LLM.
     
     Attributes:
         llm_provider (LLMProvider): The language model provider used for feature extraction.
+        local_extractor (Optional[LocalFeatureExtractor]): Rule-based fast path, if enabled.
     """
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, local_extractor: Optional[LocalFeatureExtractor] = None):
         """
         Initialize the SearchQueryExtractor with an LLM provider.
         
         Args:
             llm_provider (LLMProvider): The language model provider to use for feature extraction.
+            local_extractor (Optional[LocalFeatureExtractor], optional): Rule-based extractor
+                tried before the LLM. Defaults to None (always use the LLM).
         """
         self.llm_provider = llm_provider
+        self.local_extractor = local_extractor
         logger.info("Initialized Search Query Feature Extractor with provider")
     
     def extract_features(self, user_input: str) -> Dict[str, Any]:
         """
         Extract relevant travel features from user input.
         
-        This method attempts to extract travel features using the LLM provider first,
-        then falls back to regex-based extraction if the LLM approach fails.
+        This method uses the local extractor when it is confident, otherwise it extracts
+        travel features using the LLM provider, then falls back to regex-based extraction
+        if the LLM approach fails.
         
         Args:
             user_input (str): The natural language query from the user.
@@ -57,7 +193,11 @@ class SearchQueryExtractor:
         """
         logger.info("Extracting travel features from user input")
 
-        # First try to extract using LLM
+        features = self._extract_locally(user_input)
+        if features is not None:
+            return features
+
+        # Then try to extract using LLM
         try:
             features = self._extract_with_llm(user_input)
             logger.info(f"Successfully extracted features with LLM: {features}")
@@ -70,6 +210,58 @@ class SearchQueryExtractor:
             logger.info(f"Extracted features with fallback: {features}")
             return features
     
+    async def aextract_features(self, user_input: str) -> Dict[str, Any]:
+        """
+        Extract relevant travel features from user input without blocking the event loop.
+        
+        Async counterpart of extract_features() with the same local fast path and
+        regex-based fallback.
+        
+        Args:
+            user_input (str): The natural language query from the user.
+            
+        Returns:
+            Dict[str, Any]: A dictionary containing the extracted features.
+        """
+        logger.info("Extracting travel features from user input")
+
+        features = self._extract_locally(user_input)
+        if features is not None:
+            return features
+
+        try:
+            features = await self._aextract_with_llm(user_input)
+            logger.info(f"Successfully extracted features with LLM: {features}")
+            return features
+        except Exception as e:
+            logger.error(f"Error in LLM feature extraction: {e}", exc_info=True)
+            
+            # Fallback to regex-based extraction
+            features = self._extract_features_fallback(user_input)
+            logger.info(f"Extracted features with fallback: {features}")
+            return features
+    
+    def _extract_locally(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract features with the local extractor if it is configured and confident.
+        
+        Args:
+            user_input (str): The natural language query from the user.
+            
+        Returns:
+            Optional[Dict[str, Any]]: The features, or None if the LLM should be used.
+        """
+        if self.local_extractor is None:
+            return None
+        
+        features, confidence = self.local_extractor.extract(user_input)
+        if confidence < self.local_extractor.min_confidence:
+            logger.info(f"Local extraction confidence {confidence:.2f} too low, using LLM")
+            return None
+        
+        logger.info(f"Extracted features locally (confidence {confidence:.2f}): {features}")
+        return features
+    
     def _extract_with_llm(self, user_input: str) -> Dict[str, Any]:
         """
         Extract features using the LLM provider.
@@ -84,7 +276,58 @@ class SearchQueryExtractor:
             Dict[str, Any]: A dictionary containing the extracted features.
             
         Raises:
-            ValueError: If the LLM response cannot be parsed as valid JSON.
+            StructuredOutputError: If the LLM does not return valid features.
+        """
+        system_prompt, user_prompt = self._build_llm_prompts(user_input)
+        
+        features = self.llm_provider.generate_json(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            schema=FEATURES_SCHEMA,
+            name="travel_features",
+            use_cache=True
+        )
+        logger.info(f"Received LLM features: {features}")
+        
+        # Validate and ensure required fields have values
+        return self._validate_and_fill_features(features, user_input)
+    
+    async def _aextract_with_llm(self, user_input: str) -> Dict[str, Any]:
+        """
+        Extract features using the LLM provider's async client.
+        
+        Args:
+            user_input (str): The natural language query from the user.
+            
+        Returns:
+            Dict[str, Any]: A dictionary containing the extracted features.
+            
+        Raises:
+            StructuredOutputError: If the LLM does not return valid features.
+        """
+        system_prompt, user_prompt = self._build_llm_prompts(user_input)
+        
+        features = await self.llm_provider.agenerate_json(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            schema=FEATURES_SCHEMA,
+            name="travel_features",
+            use_cache=True
+        )
+        logger.info(f"Received LLM features: {features}")
+        
+        # Validate and ensure required fields have values
+        return self._validate_and_fill_features(features, user_input)
+    
+    def _build_llm_prompts(self, user_input: str) -> Tuple[str, str]:
+        """
+        Build the system and user prompts for LLM feature extraction.
+        
+        Args:
+            user_input (str): The natural language query from the user.
+            
+        Returns:
+            Tuple[str, str]: The system prompt and the user prompt.
         """
         system_prompt = """
         You are a feature extraction system for a travel planning assistant.
@@ -110,39 +353,7 @@ class SearchQueryExtractor:
         provide a reasonable assumption based on context.
         """
         
-        extracted_features = self.llm_provider.generate(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
-        )
-        
-        logger.info(f"Received LLM response: {extracted_features[:100]}...")
-        
-        # Try to parse JSON
-        try:
-            features = json.loads(extracted_features)
-            logger.info(f"Successfully parsed features: {features}")
-            
-            # Validate and ensure required fields have values
-            features = self._validate_and_fill_features(features, user_input)
-            
-            return features
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON: {e}", exc_info=True)
-            
-            # Try to extract JSON from the response (in case LLM added text)
-            json_pattern = r'(\{[\s\S]*\})'
-            match = re.search(json_pattern, extracted_features)
-            
-            if match:
-                try:
-                    logger.info("Attempting to extract JSON from response")
-                    features = json.loads(match.group(1))
-                    return self._validate_and_fill_features(features, user_input)
-                except json.JSONDecodeError:
-                    logger.error("Failed to parse extracted JSON", exc_info=True)
-            
-            # If JSON parsing fails, raise exception to trigger fallback
-            raise ValueError("Failed to extract features from LLM response")
+        return system_prompt, user_prompt
     
     def _validate_and_fill_features(self, features: Dict[str, Any], user_input: str) -> Dict[str, Any]:
         """
@@ -190,7 +401,7 @@ class SearchQueryExtractor:
             duration = self._extract_duration_fallback(user_input)
             if duration:
                 try:
-                    days_match = re.search(r'(\d+)', duration)
+                    days_match = NUMBER_PATTERN.search(duration)
                     if days_match:
                         features["duration_days"] = int(days_match.group(1))
                     else:
@@ -219,18 +430,8 @@ class SearchQueryExtractor:
         Returns:
             str: The extracted destination, or "Unknown destination" if no match is found.
         """
-        destination_patterns = [
-            r'to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'visiting\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'trip\s+to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'vacation\s+in\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'travel(?:ing)?\s+to\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'itinerary\s+for\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)',
-            r'plan\s+(?:a|my)?\s+(?:trip|visit)\s+(?:to)?\s+([A-Za-z\s]+)(?:,|\s+in|\s+for|\s+on|\.)'
-        ]
-        
-        for pattern in destination_patterns:
-            match = re.search(pattern, user_input, re.IGNORECASE)
+        for pattern in DESTINATION_PATTERNS:
+            match = pattern.search(user_input)
             if match:
                 return match.group(1).strip()
         
@@ -249,16 +450,8 @@ class SearchQueryExtractor:
         Returns:
             str: The extracted duration (e.g., "7 days"), or an empty string if no match is found.
         """
-        duration_patterns = [
-            r'(\d+)\s+day(?:s)?',
-            r'(\d+)-day',
-            r'for\s+(\d+)\s+day(?:s)?',
-            r'for\s+(\d+)\s+night(?:s)?',
-            r'for\s+about\s+(\d+)\s+day(?:s)?'
-        ]
-        
-        for pattern in duration_patterns:
-            match = re.search(pattern, user_input, re.IGNORECASE)
+        for pattern in DURATION_PATTERNS:
+            match = pattern.search(user_input)
             if match:
                 return f"{match.group(1)} days"
         
@@ -295,55 +488,20 @@ class SearchQueryExtractor:
         # Extract duration
         duration_str = self._extract_duration_fallback(user_input)
         if duration_str:
-            days_match = re.search(r'(\d+)', duration_str)
+            days_match = NUMBER_PATTERN.search(duration_str)
             if days_match:
                 features["duration_days"] = int(days_match.group(1))
         
-        # Extract cuisine preferences
-        cuisine_keywords = [
-            'food', 'cuisine', 'restaurant', 'dining', 'eat', 'meal',
-            'breakfast', 'lunch', 'dinner', 'snack', 'cafe', 'wine',
-            'beer', 'drink', 'bar', 'pub', 'street food', 'local food',
-            'traditional food', 'culinary', 'gastronomy', 'thai food'
-        ]
-        
-        cuisine_matches = []
-        for keyword in cuisine_keywords:
-            if re.search(r'\b' + keyword + r'[s]?\b', user_input, re.IGNORECASE):
-                cuisine_matches.append(keyword)
-        
-        if cuisine_matches:
-            features["cuisine_preferences"] = cuisine_matches
-        
-        # Extract place preferences
-        place_keywords = [
-            'museum', 'art', 'history', 'beach', 'hiking', 'nature',
-            'shopping', 'nightlife', 'adventure', 'relax', 'culture',
-            'sightseeing', 'tour', 'park', 'festival', 'concert',
-            'sport', 'outdoor', 'photography', 'historical', 'site',
-            'monument', 'temple', 'church', 'cathedral', 'palace',
-            'castle', 'ruin', 'ancient', 'market', 'water sport',
-            'water sports', 'night market', 'activity', 'beaches'
-        ]
-        
-        place_matches = []
-        for keyword in place_keywords:
-            if re.search(r'\b' + keyword + r'[s]?\b', user_input, re.IGNORECASE):
-                place_matches.append(keyword)
-        
-        if place_matches:
-            features["place_preferences"] = place_matches
-        
-        # Extract transport preferences
-        transport_keywords = [
-            'transport', 'bus', 'train', 'subway', 'metro', 'taxi',
-            'car', 'rental', 'bike', 'walking', 'public transport',
-            'tram', 'ferry', 'boat', 'scooter', 'motorcycle'
-        ]
-        
-        for keyword in transport_keywords:
-            if re.search(r'\b' + keyword + r'[s]?\b', user_input, re.IGNORECASE):
-                features["transport_preferences"] = keyword
-                break
+        # Extract cuisine, place and transport preferences in one pass
+        keywords = find_preference_keywords(user_input)
+        
+        if keywords["cuisine_preferences"]:
+            features["cuisine_preferences"] = keywords["cuisine_preferences"]
+        
+        if keywords["place_preferences"]:
+            features["place_preferences"] = keywords["place_preferences"]
+        
+        if keywords["transport_preferences"]:
+            features["transport_preferences"] = keywords["transport_preferences"][0]
         
         return features
\ No newline at end of file
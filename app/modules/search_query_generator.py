@@ -2,19 +2,47 @@
 app/modules/search_query_generator.py
 
 Search query generator module that transforms extracted travel features into effective search queries.
-Utilizes an LLM provider to generate contextually relevant queries for retrieving travel information.
+Utilizes an LLM provider to generate contextually relevant queries for retrieving travel information,
+or per-feature-type templates when no LLM call is wanted.
 """
 
-import re
-import json
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from api.llm_provider import LLMProvider
+from app.modules.local_extractor import known_keyword
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+QUERY_GENERATION_MODES = ("llm", "template", "hybrid")
+
+PREFERENCE_TYPES = ["cuisine_preferences", "place_preferences", "transport_preferences"]
+
+QUERIES_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "feature_type": {"type": "string"},
+            "feature_value": {"type": "string"},
+            "search_query": {"type": "string"}
+        },
+        "required": ["feature_type", "feature_value", "search_query"]
+    }
+}
+
+# Templates per feature type; {place} is the destination and {value} the feature value.
+# "landmark" is used for named places such as "Central Park" in place_preferences.
+DEFAULT_QUERY_TEMPLATES = {
+    "place_to_visit": "Best time to visit {place} travel guide for tourists",
+    "duration_days": "Perfect {value} day {place} itinerary for first-time visitors",
+    "cuisine_preferences": "Where to find the best {value} in {place} recommended by locals",
+    "place_preferences": "Best {value} in {place} for tourists tips and opening hours",
+    "landmark": "Visiting {value} in {place} tickets tips and best time to go",
+    "transport_preferences": "{place} {value} guide for tourists tickets routes and tips"
+}
+
 class SearchQueryGenerator:
     """
     Generates targeted search queries based on extracted travel features.
@@ -23,27 +51,48 @@ class SearchQueryGenerator:
     into effective search queries that will retrieve the most relevant information for 
     travel planning. Includes fallback mechanisms for handling LLM failures.
     
+    The mode selects how queries are produced: "llm" asks the LLM for every query,
+    "template" fills per-feature-type templates without any LLM call, and "hybrid"
+    uses templates for common preferences and the LLM only for unusual ones.
+    
     Attributes:
         llm_provider (LLMProvider): The language model provider used to generate queries.
+        mode (str): The query generation mode, "llm", "template" or "hybrid".
+        templates (Dict[str, str]): Query templates per feature type.
     """
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self,
+                 llm_provider: LLMProvider,
+                 mode: str = "llm",
+                 templates: Optional[Dict[str, str]] = None):
         """
         Initialize the Search Query Generator with an LLM provider.
         
         Args:
             llm_provider (LLMProvider): The language model provider for generating queries.
+            mode (str, optional): "llm", "template" or "hybrid". Defaults to "llm".
+            templates (Optional[Dict[str, str]], optional): Templates overriding entries of
+                DEFAULT_QUERY_TEMPLATES. Defaults to None.
+            
+        Raises:
+            ValueError: If an unsupported mode is specified.
         """
+        if mode not in QUERY_GENERATION_MODES:
+            raise ValueError(f"Unsupported query generation mode: {mode}")
+        
         self.llm_provider = llm_provider
-        logger.info("Initialized Search Query Generator with provider")
+        self.mode = mode
+        self.templates = {**DEFAULT_QUERY_TEMPLATES, **(templates or {})}
+        logger.info(f"Initialized Search Query Generator with provider (mode={mode})")
     
     def generate_queries(self, features: Dict[str, Any]) -> List[Dict[str, str]]:
         """
         Generate a list of search queries based on extracted travel features.
         
-        This method constructs prompts for the LLM provider to generate search queries
-        for each relevant travel feature. It handles JSON parsing and provides fallback
-        mechanisms for error cases.
+        Depending on the mode, this method constructs prompts for the LLM provider to
+        generate search queries for each relevant travel feature, fills query templates,
+        or combines both. It handles JSON parsing and provides fallback mechanisms for
+        error cases.
         
         Args:
             features (Dict[str, Any]): Dictionary containing extracted travel features
@@ -61,6 +110,122 @@ class SearchQueryGenerator:
         """
         logger.info("Generating search queries based on extracted features")
         
+        place_to_visit = features.get('place_to_visit', '')
+        if not place_to_visit:
+            logger.warning("No destination specified in features")
+            return self._generate_fallback_queries(features)
+        
+        if self.mode == "template":
+            return self._generate_template_queries(features)
+        
+        if self.mode == "hybrid":
+            template_queries, unusual = self._split_hybrid_features(features)
+            if unusual is None:
+                return template_queries
+            
+            llm_queries = self._request_queries(unusual, preferences_only=True)
+            return self._merge_hybrid_queries(template_queries, llm_queries or [], unusual)
+            
+        queries = self._request_queries(features)
+        return queries if queries is not None else self._generate_fallback_queries(features)
+    
+    async def agenerate_queries(self, features: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Generate search queries without blocking the event loop.
+        
+        Async counterpart of generate_queries() using the provider's async client,
+        with the same modes and fallback behaviour.
+        
+        Args:
+            features (Dict[str, Any]): Dictionary containing extracted travel features.
+            
+        Returns:
+            List[Dict[str, str]]: A list of query dictionaries with 'feature_type',
+                'feature_value' and 'search_query' keys.
+        """
+        logger.info("Generating search queries based on extracted features")
+        
+        place_to_visit = features.get('place_to_visit', '')
+        if not place_to_visit:
+            logger.warning("No destination specified in features")
+            return self._generate_fallback_queries(features)
+        
+        if self.mode == "template":
+            return self._generate_template_queries(features)
+        
+        if self.mode == "hybrid":
+            template_queries, unusual = self._split_hybrid_features(features)
+            if unusual is None:
+                return template_queries
+            
+            llm_queries = await self._arequest_queries(unusual, preferences_only=True)
+            return self._merge_hybrid_queries(template_queries, llm_queries or [], unusual)
+        
+        queries = await self._arequest_queries(features)
+        return queries if queries is not None else self._generate_fallback_queries(features)
+    
+    def _request_queries(self, features: Dict[str, Any], preferences_only: bool = False) -> Optional[List[Dict[str, str]]]:
+        """
+        Ask the LLM for search queries.
+        
+        Args:
+            features (Dict[str, Any]): The features to generate queries for.
+            preferences_only (bool, optional): Whether to ask only for preference queries,
+                as hybrid mode does for unusual preferences. Defaults to False.
+            
+        Returns:
+            Optional[List[Dict[str, str]]]: The queries, or None if the LLM call failed.
+        """
+        system_prompt, user_prompt = self._build_prompts(features, preferences_only=preferences_only)
+        try:
+            logger.info("Sending query generation request to LLM" + (" for unusual preferences" if preferences_only else ""))
+            queries = self.llm_provider.generate_json(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                schema=QUERIES_SCHEMA,
+                name="search_queries",
+                use_cache=True
+            )
+        except Exception as e:
+            logger.error(f"Error in query generation: {e}", exc_info=True)
+            return None
+            
+        logger.info(f"Generated {len(queries)} search queries")
+        return queries
+        
+    async def _arequest_queries(self, features: Dict[str, Any], preferences_only: bool = False) -> Optional[List[Dict[str, str]]]:
+        """
+        Async counterpart of _request_queries().
+        """
+        system_prompt, user_prompt = self._build_prompts(features, preferences_only=preferences_only)
+        try:
+            logger.info("Sending query generation request to LLM" + (" for unusual preferences" if preferences_only else ""))
+            queries = await self.llm_provider.agenerate_json(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                schema=QUERIES_SCHEMA,
+                name="search_queries",
+                use_cache=True
+            )
+        except Exception as e:
+            logger.error(f"Error in query generation: {e}", exc_info=True)
+            return None
+            
+        logger.info(f"Generated {len(queries)} search queries")
+        return queries
+    
+    def _build_prompts(self, features: Dict[str, Any], preferences_only: bool = False) -> Tuple[str, str]:
+        """
+        Build the system and user prompts for query generation.
+        
+        Args:
+            features (Dict[str, Any]): Dictionary containing extracted travel features.
+            preferences_only (bool, optional): Ask only for preference queries, as the
+                destination is already covered by templates. Defaults to False.
+            
+        Returns:
+            Tuple[str, str]: The system prompt and the user prompt.
+        """
         system_prompt = """
         You are a search query generator for a travel planning assistant.
         Your task is to create effective search queries based on extracted travel features.
@@ -90,10 +255,6 @@ class SearchQueryGenerator:
         
         # Format the features for the prompt
         place_to_visit = features.get('place_to_visit', '')
-        if not place_to_visit:
-            logger.warning("No destination specified in features")
-            return self._generate_fallback_queries(features)
-        
         duration_days = features.get('duration_days')
         cuisine_preferences = features.get('cuisine_preferences', [])
         place_preferences = features.get('place_preferences', [])
@@ -112,52 +273,151 @@ class SearchQueryGenerator:
         Each query should be specifically designed to retrieve the most relevant information for planning a trip.
         """
         
-        try:
-            logger.info("Sending query generation request to LLM")
-            query_list = self.llm_provider.generate(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt
-            )
+        if preferences_only:
+            user_prompt += """
+        Only create one query for each specified preference; do not create queries for the place to visit.
+        """
+        
+        return system_prompt, user_prompt
+    
+    def _generate_template_queries(self, features: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Generate search queries by filling the per-feature-type templates.
+        
+        Produces one query for the destination, one for the duration if given, and
+        one for each preference value, in the same format as the LLM queries.
+        
+        Args:
+            features (Dict[str, Any]): Dictionary containing extracted travel features.
             
-            logger.info(f"Received LLM response: {query_list[:100]}...")
+        Returns:
+            List[Dict[str, str]]: A list of query dictionaries with 'feature_type',
+                'feature_value' and 'search_query' keys.
+        """
+        place_to_visit = features.get('place_to_visit', '')
+        queries = []
+        
+        def add(feature_type: str, value: Any, template_key: str = None) -> None:
+            template = self.templates[template_key or feature_type]
+            queries.append({
+                "feature_type": feature_type,
+                "feature_value": value,
+                "search_query": template.format(place=place_to_visit, value=value)
+            })
+        
+        if place_to_visit:
+            add("place_to_visit", place_to_visit)
+        if features.get('duration_days') is not None:
+            add("duration_days", features['duration_days'])
+        
+        for feature_type in PREFERENCE_TYPES:
+            for value in self._values(features.get(feature_type)):
+                template_key = None
+                if feature_type == "place_preferences" and self._is_landmark(value):
+                    template_key = "landmark"
+                add(feature_type, value, template_key)
+        
+        logger.info(f"Generated {len(queries)} search queries from templates")
+        return queries
+    
+    def _split_hybrid_features(self, features: Dict[str, Any]) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """
+        Split hybrid-mode generation into template queries and the features left for the LLM.
+        
+        Args:
+            features (Dict[str, Any]): Dictionary containing extracted travel features.
             
-            # Try to parse JSON
-            try:
-                queries = json.loads(query_list)
-                
-                # Validate queries
-                if isinstance(queries, list) and all(
-                    isinstance(q, dict) and 
-                    "feature_type" in q and 
-                    "feature_value" in q and 
-                    "search_query" in q 
-                    for q in queries
-                ):
-                    logger.info(f"Generated {len(queries)} search queries")
-                    return queries
-                else:
-                    logger.warning("LLM returned invalid query list format")
-                    return self._generate_fallback_queries(features)
+        Returns:
+            Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]: Template queries for every
+                feature except the unusual preferences, and the features to send to the LLM
+                (None if no preference is unusual).
+        """
+        unusual = self._unusual_features(features)
+        return self._generate_template_queries(self._without(features, unusual)), unusual
+    
+    def _unusual_features(self, features: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Select the preferences the templates are not expected to handle well.
+        
+        A preference is unusual if it is not made of a known travel keyword and is not
+        a named landmark, e.g. "romantic dinners" or "luaus".
+        
+        Args:
+            features (Dict[str, Any]): Dictionary containing extracted travel features.
             
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON: {e}", exc_info=True)
-                
-                # Try to extract JSON from the response (in case LLM added text)
-                json_pattern = r'(\[[\s\S]*\])'
-                match = re.search(json_pattern, query_list)
-                
-                if match:
-                    try:
-                        logger.info("Attempting to extract JSON array from response")
-                        return json.loads(match.group(1))
-                    except json.JSONDecodeError:
-                        logger.error("Failed to parse extracted JSON array", exc_info=True)
-                
-                return self._generate_fallback_queries(features)
+        Returns:
+            Optional[Dict[str, Any]]: Features holding the destination and only the unusual
+                preferences, or None if every preference is usual.
+        """
+        unusual = {"place_to_visit": features.get('place_to_visit', ''), "duration_days": None}
+        found = False
+        for feature_type in PREFERENCE_TYPES:
+            values = [
+                value for value in self._values(features.get(feature_type))
+                if known_keyword(value) is None
+                and not (feature_type == "place_preferences" and self._is_landmark(value))
+            ]
+            unusual[feature_type] = values or None
+            found = found or bool(values)
         
-        except Exception as e:
-            logger.error(f"Error in query generation: {e}", exc_info=True)
-            return self._generate_fallback_queries(features)
+        return unusual if found else None
+    
+    def _without(self, features: Dict[str, Any], unusual: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Remove the unusual preferences from the features.
+        """
+        if unusual is None:
+            return features
+        
+        remaining = dict(features)
+        for feature_type in PREFERENCE_TYPES:
+            excluded = set(unusual.get(feature_type) or [])
+            remaining[feature_type] = [
+                value for value in self._values(features.get(feature_type)) if value not in excluded
+            ] or None
+        return remaining
+    
+    def _merge_hybrid_queries(self,
+                              template_queries: List[Dict[str, str]],
+                              llm_queries: List[Dict[str, str]],
+                              unusual: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Combine template queries with the LLM's queries for the unusual preferences.
+        
+        Only LLM queries for the feature types that had unusual preferences are kept, so
+        the LLM can't add destination queries or defaults from the fallback generator.
+        If the LLM produced none, the unusual preferences are filled from templates.
+        """
+        wanted = {feature_type for feature_type in PREFERENCE_TYPES if unusual.get(feature_type)}
+        llm_queries = [query for query in llm_queries if query.get("feature_type") in wanted]
+        if not llm_queries:
+            llm_queries = [
+                query for query in self._generate_template_queries(unusual)
+                if query["feature_type"] in wanted
+            ]
+        
+        return template_queries + llm_queries
+    
+    def _values(self, value: Any) -> List[Any]:
+        """
+        Normalize a feature value that may be a single value, a list or empty into a list.
+        """
+        if not value:
+            return []
+        return list(value) if isinstance(value, (list, tuple)) else [value]
+    
+    def _is_landmark(self, value: Any) -> bool:
+        """
+        Check whether a place preference names a specific place ("Central Park", "Louvre").
+        
+        Every word must be capitalized. Short words such as "of" or "du" are skipped unless
+        the name has no longer word ("Big Ben"), and a value without words is never a
+        landmark, so "art", "spa" and "the zoo" are not landmarks.
+        """
+        words = [word for word in str(value).split() if word[0].isalpha()]
+        long_words = [word for word in words if len(word) > 3]
+        words = long_words or words
+        return bool(words) and all(word[0].isupper() for word in words)
     
     def _generate_fallback_queries(self, features: Dict[str, Any]) -> List[Dict[str, str]]:
         """
@@ -0,0 +1,337 @@
+"""
+app/session_store.py
+
+Session state for the travel planner agent. Keeps each session's conversation history,
+last itinerary and last features apart, so concurrent requests don't share state, and
+bounds the number of sessions and messages kept so memory stays flat under load.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Session used by callers that don't track sessions, such as the CLI and the evaluator
+DEFAULT_SESSION_ID = "default"
+
+def empty_session() -> Dict[str, Any]:
+    """
+    Get the state of a session that has no turns yet.
+    
+    Returns:
+        Dict[str, Any]: 'history', 'last_itinerary' and 'last_features'.
+    """
+    return {"history": [], "last_itinerary": "", "last_features": {}}
+
+def _apply_turn(state: Dict[str, Any],
+                user_input: str,
+                itinerary: str,
+                features: Dict[str, Any],
+                max_messages: int) -> Dict[str, Any]:
+    """
+    Add one user/assistant turn to a session state, keeping the newest max_messages messages.
+    """
+    history = state.get("history", []) + [
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": itinerary}
+    ]
+    return {
+        "history": history[-max_messages:] if max_messages > 0 else [],
+        "last_itinerary": itinerary,
+        "last_features": features
+    }
+
+class MemorySessionStore:
+    """
+    Session state held in process memory.
+    
+    Sessions are kept in an LRU: once max_sessions is exceeded the least recently used
+    session is dropped, and sessions idle for longer than the TTL are dropped when next
+    touched. Each session keeps only its newest max_messages history messages.
+    
+    Attributes:
+        max_sessions (int): Maximum number of sessions kept.
+        ttl_seconds (float): Idle time after which a session is forgotten.
+        max_messages (int): Maximum history messages kept per session.
+    """
+    
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600, max_messages: int = 20):
+        """
+        Initialize the in-memory session store.
+        
+        Args:
+            max_sessions (int, optional): Maximum number of sessions. Defaults to 1000.
+            ttl_seconds (float, optional): Session idle lifetime in seconds. Defaults to one hour.
+            max_messages (int, optional): Maximum history messages per session. Defaults to 20.
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        
+        self.evictions = 0
+        
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        
+        logger.info(f"Initialized MemorySessionStore (max_sessions={max_sessions}, ttl_seconds={ttl_seconds})")
+    
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get a session's state.
+        
+        Args:
+            session_id (str): The session id.
+        
+        Returns:
+            Dict[str, Any]: A copy of the session state, empty if the session is unknown or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return empty_session()
+            expires_at, state = entry
+            if expires_at <= now:
+                del self._sessions[session_id]
+                return empty_session()
+            return {**state, "history": list(state["history"])}
+    
+    def record_turn(self, session_id: str, user_input: str, itinerary: str, features: Dict[str, Any]) -> None:
+        """
+        Record one planning turn in a session.
+        
+        Args:
+            session_id (str): The session id.
+            user_input (str): The user's text input.
+            itinerary (str): The generated itinerary.
+            features (Dict[str, Any]): The extracted travel features.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            state = entry[1] if entry is not None and entry[0] > now else empty_session()
+            state = _apply_turn(state, user_input, itinerary, features, self.max_messages)
+            self._sessions[session_id] = (now + self.ttl_seconds, state)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+    
+    def delete(self, session_id: str) -> None:
+        """
+        Forget a session if present.
+        
+        Args:
+            session_id (str): The session id.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the number of live sessions and evictions so far.
+        
+        Returns:
+            Dict[str, Any]: Session and eviction counts.
+        """
+        with self._lock:
+            return {"sessions": len(self._sessions), "evictions": self.evictions}
+    
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired sessions, then the least recently used ones beyond max_sessions.
+        
+        Must be called with the lock held.
+        """
+        expired = [session_id for session_id, (expires_at, _) in self._sessions.items() if expires_at <= now]
+        for session_id in expired:
+            del self._sessions[session_id]
+        self.evictions += len(expired)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+class SQLiteSessionStore:
+    """
+    Session state stored in a SQLite file, shared by every worker process using it.
+    
+    Each turn is recorded in one write transaction, so concurrent requests of the same
+    session never lose each other's messages. The database runs in WAL mode with a busy
+    timeout, like the other caches. Expiry and the session limit work as in
+    MemorySessionStore.
+    
+    Attributes:
+        db_path (str): Path of the SQLite file.
+        max_sessions (int): Maximum number of sessions kept.
+        ttl_seconds (float): Idle time after which a session is forgotten.
+        max_messages (int): Maximum history messages kept per session.
+    """
+    
+    def __init__(self,
+                 db_path: str = "cache/sessions.sqlite",
+                 max_sessions: int = 1000,
+                 ttl_seconds: float = 3600,
+                 max_messages: int = 20):
+        """
+        Open (or create) the session database.
+        
+        Args:
+            db_path (str, optional): Path of the SQLite file. Defaults to "cache/sessions.sqlite".
+            max_sessions (int, optional): Maximum number of sessions. Defaults to 1000.
+            ttl_seconds (float, optional): Session idle lifetime in seconds. Defaults to one hour.
+            max_messages (int, optional): Maximum history messages per session. Defaults to 20.
+        """
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+        
+        logger.info(f"Initialized SQLiteSessionStore (db_path={db_path}, max_sessions={max_sessions})")
+    
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get a session's state.
+        
+        Args:
+            session_id (str): The session id.
+        
+        Returns:
+            Dict[str, Any]: The session state, empty if the session is unknown or expired.
+        """
+        with self._lock:
+            try:
+                return self._load(session_id, time.time())
+            except sqlite3.Error as e:
+                logger.error(f"Error reading session {session_id}: {e}")
+                return empty_session()
+    
+    def record_turn(self, session_id: str, user_input: str, itinerary: str, features: Dict[str, Any]) -> None:
+        """
+        Record one planning turn in a session.
+        
+        Args:
+            session_id (str): The session id.
+            user_input (str): The user's text input.
+            itinerary (str): The generated itinerary.
+            features (Dict[str, Any]): The extracted travel features.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    state = _apply_turn(self._load(session_id, now), user_input, itinerary, features, self.max_messages)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sessions (session_id, state, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                        (session_id, json.dumps(state, default=list), now + self.ttl_seconds, now)
+                    )
+                    self._evict(now)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error(f"Error recording turn for session {session_id}: {e}")
+    
+    def delete(self, session_id: str) -> None:
+        """
+        Forget a session if present.
+        
+        Args:
+            session_id (str): The session id.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the number of live sessions.
+        
+        Returns:
+            Dict[str, Any]: Session count.
+        """
+        with self._lock:
+            (sessions,) = self._db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()
+        return {"sessions": sessions}
+    
+    def _load(self, session_id: str, now: float) -> Dict[str, Any]:
+        """
+        Read a session's state, empty if unknown, expired or unreadable.
+        
+        Must be called with the lock held.
+        """
+        row = self._db.execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND expires_at > ?", (session_id, now)
+        ).fetchone()
+        if row is None:
+            return empty_session()
+        try:
+            return json.loads(row[0])
+        except ValueError as e:
+            logger.error(f"Discarding unreadable session {session_id}: {e}")
+            return empty_session()
+    
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired sessions, then the least recently used ones beyond max_sessions.
+        
+        Must be called inside a write transaction with the lock held.
+        """
+        self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+def create_session_store(session_config: Optional[Dict[str, Any]]):
+    """
+    Build a session store from the "sessions" configuration section.
+    
+    Args:
+        session_config (Optional[Dict[str, Any]]): The configuration section, or None.
+    
+    Returns:
+        MemorySessionStore or SQLiteSessionStore, depending on the configured backend.
+    """
+    session_config = session_config or {}
+    backend = session_config.get("backend", "memory")
+    max_sessions = session_config.get("max_sessions", 1000)
+    ttl_seconds = session_config.get("ttl_seconds", 3600)
+    max_messages = session_config.get("max_messages", 20)
+    
+    if backend == "sqlite":
+        try:
+            return SQLiteSessionStore(
+                db_path=session_config.get("db_path", "cache/sessions.sqlite"),
+                max_sessions=max_sessions,
+                ttl_seconds=ttl_seconds,
+                max_messages=max_messages
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error opening session database, keeping sessions in memory: {e}")
+    elif backend != "memory":
+        logger.warning(f"Unknown session backend '{backend}', keeping sessions in memory")
+    
+    return MemorySessionStore(max_sessions=max_sessions, ttl_seconds=ttl_seconds, max_messages=max_messages)
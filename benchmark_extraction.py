@@ -0,0 +1,139 @@
+"""
+benchmark_extraction.py
+
+Microbenchmark for the regex fallback feature extraction. Compares the single-pass compiled
+keyword matcher against scanning the input once per keyword, on the evaluation query set.
+"""
+
+import re
+import json
+import timeit
+import logging
+import argparse
+from typing import Dict, List
+from app.modules.search_query_extractor import KEYWORD_FIELDS, find_preference_keywords
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def per_keyword_scan(user_input: str) -> Dict[str, List[str]]:
+    """
+    Find keywords with one regex search per keyword, as the fallback extraction used to.
+    
+    Parameters
+    ----------
+    user_input : str
+        The natural language query
+    
+    Returns
+    -------
+    Dict[str, List[str]]
+        Matched keywords per feature field, in keyword list order
+    """
+    return {
+        field: [
+            keyword for keyword in keywords
+            if re.search(r'\b' + keyword + r'[s]?\b', user_input, re.IGNORECASE)
+        ]
+        for field, keywords in KEYWORD_FIELDS.items()
+    }
+
+def load_queries(data_path: str) -> List[str]:
+    """
+    Load the query strings from an evaluation data file.
+    
+    Parameters
+    ----------
+    data_path : str
+        Path to a JSON list of items with an 'input_query' or 'query' key
+    
+    Returns
+    -------
+    List[str]
+        The queries
+    """
+    with open(data_path, 'r') as f:
+        data = json.load(f)
+    
+    return [item.get("input_query") or item.get("query") for item in data
+            if isinstance(item, dict) and (item.get("input_query") or item.get("query"))]
+
+def time_per_query(matcher, queries: List[str], repeat: int, number: int) -> float:
+    """
+    Time a matcher over the query set.
+    
+    Parameters
+    ----------
+    matcher : Callable[[str], Dict[str, List[str]]]
+        The keyword matcher to time
+    queries : List[str]
+        Queries to run it on
+    repeat : int
+        Number of timing runs; the fastest is kept
+    number : int
+        Passes over the query set per timing run
+    
+    Returns
+    -------
+    float
+        Microseconds per query
+    """
+    def run():
+        for query in queries:
+            matcher(query)
+    
+    best = min(timeit.repeat(run, repeat=repeat, number=number))
+    return best / (number * len(queries)) * 1e6
+
+def main():
+    """
+    Run the keyword matcher microbenchmark and log the results.
+    
+    Command-line Arguments
+    ---------------------
+    --data : str
+        Path to the query set (default: 'eval-data/feature_extractor_data.json')
+    --repeat : int
+        Number of timing runs, the fastest is reported (default: 5)
+    --number : int
+        Passes over the query set per timing run (default: 200)
+    """
+    parser = argparse.ArgumentParser(description='Fallback keyword matcher microbenchmark')
+    parser.add_argument('--data', type=str, default='eval-data/feature_extractor_data.json', help='Path to query data file')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs')
+    parser.add_argument('--number', type=int, default=200, help='Passes over the query set per timing run')
+    args = parser.parse_args()
+    
+    queries = load_queries(args.data)
+    if not queries:
+        logger.error("No queries available. Exiting.")
+        return
+    
+    # The compiled matcher reports the longest of overlapping keywords only
+    # ("street food", not also "food"), so compare on the keywords it found
+    differing = 0
+    for query in queries:
+        compiled = find_preference_keywords(query)
+        scanned = per_keyword_scan(query)
+        if any(not set(compiled[field]) <= set(scanned[field]) for field in KEYWORD_FIELDS):
+            differing += 1
+    
+    scan_us = time_per_query(per_keyword_scan, queries, args.repeat, args.number)
+    compiled_us = time_per_query(find_preference_keywords, queries, args.repeat, args.number)
+    
+    logger.info("\n" + "-" * 50)
+    logger.info("FALLBACK KEYWORD MATCHER BENCHMARK")
+    logger.info("-" * 50)
+    logger.info(f"Queries: {len(queries)} from {args.data}")
+    logger.info(f"Per-keyword scan:  {scan_us:.1f} microseconds/query")
+    logger.info(f"Compiled matcher:  {compiled_us:.1f} microseconds/query")
+    logger.info(f"Speedup: {scan_us / compiled_us:.1f}x")
+    logger.info(f"Queries with keywords the scan did not find: {differing}")
+    logger.info("-" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,22 @@ Provides functionality to evaluate responses across multiple metrics and generat
 """
 
 import json
+import time
 import logging
+import itertools
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import matplotlib.pyplot as plt
-from typing import Dict, List, Any
-from app.agent import TravelPlannerAgent
+from typing import Dict, List, Any, Optional
+from app.agent import LLM_STAGES, TravelPlannerAgent
 from api.llm_provider import LLMProvider
-from utils.helpers import set_to_list_converter
+from api.llm_cache import create_completion_cache
+from api.llm_hedging import HedgedLLMProvider
+from api.rate_limiter import create_rate_limiter
+from app.modules.local_extractor import LocalFeatureExtractor
+from app.modules.search_query_generator import SearchQueryGenerator
+from utils.helpers import score_features, score_queries, set_to_list_converter
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -67,7 +74,12 @@ class TravelAgentEvaluator:
             provider=self.judge_llm_config.get("provider", "anthropic"),
             model=self.judge_llm_config.get("model", "claude-3-7-sonnet"),
             temperature=self.judge_llm_config.get("temperature", 0.2),
-            max_tokens=self.judge_llm_config.get("max_tokens", 4000)
+            max_tokens=self.judge_llm_config.get("max_tokens", 4000),
+            cache=create_completion_cache(config.get("llm_cache")),
+            rate_limiter=create_rate_limiter(config.get("llm_rate_limit")),
+            priority=self.judge_llm_config.get("priority", "eval"),
+            structured_output=self.judge_llm_config.get("structured_output", True),
+            max_json_repairs=self.judge_llm_config.get("max_json_repairs", 1)
         )
         
         # Metrics for evaluation
@@ -140,10 +152,319 @@ class TravelAgentEvaluator:
                     })
             
             results[provider_name] = provider_results
+            
+            self._log_llm_stats(provider_name, agent)
+        
+        if self.judge_llm.cache is not None:
+            logger.info(f"Completion cache stats for judge: {self.judge_llm.cache.stats()}")
         
         self.results = results
         return results
     
+    def compare_input_analysis(self, test_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compare the fused input analysis call against the separate guardrail and extraction calls.
+        
+        For every LLM provider, runs each labelled query through both paths and scores
+        the extracted features against the reference features. Every query in the data
+        is a valid travel request, so the valid rate measures false rejections. The
+        completion cache is disabled so latencies reflect real provider calls.
+        
+        Args:
+            test_data (List[Dict[str, Any]]): Items with "input_query" and reference "features",
+                as in eval-data/feature_extractor_data.json
+            
+        Returns:
+            Dict[str, Any]: Per-provider "summary" (valid rate, mean field scores and mean
+                latency for each path) and per-query "details"
+        """
+        logger.info("Comparing fused and two-call input analysis")
+        
+        comparison = {}
+        
+        for provider_name, provider_config in tqdm(self.llm_providers.items(), desc="Comparing input analysis"):
+            provider_specific_config = self.config.copy()
+            provider_specific_config["llm"] = provider_config
+            provider_specific_config["llm_cache"] = {"enabled": False}
+            
+            agent = TravelPlannerAgent(provider_specific_config)
+            details = []
+            
+            for item in tqdm(test_data, desc=f"Testing {provider_name}", leave=False):
+                query = item["input_query"]
+                expected = item["features"]
+                
+                start = time.perf_counter()
+                is_valid, _ = agent.guardrail.validate_input(query)
+                features = agent.query_extractor.extract_features(query)
+                two_call_seconds = time.perf_counter() - start
+                
+                start = time.perf_counter()
+                fused_valid, _, fused_features = agent.input_analyzer.analyze(query)
+                fused_seconds = time.perf_counter() - start
+                
+                details.append({
+                    "query": query,
+                    "two_call": {
+                        "is_valid": bool(is_valid),
+                        "features": features,
+                        "scores": score_features(features, expected),
+                        "seconds": two_call_seconds
+                    },
+                    "fused": {
+                        "is_valid": bool(fused_valid),
+                        "features": fused_features,
+                        "scores": score_features(fused_features, expected),
+                        "seconds": fused_seconds
+                    }
+                })
+            
+            summary = {}
+            for path in ["two_call", "fused"]:
+                runs = [detail[path] for detail in details]
+                if not runs:
+                    continue
+                summary[path] = {
+                    "valid_rate": sum(run["is_valid"] for run in runs) / len(runs),
+                    "mean_seconds": sum(run["seconds"] for run in runs) / len(runs),
+                    "scores": {
+                        field: sum(run["scores"][field] for run in runs) / len(runs)
+                        for field in runs[0]["scores"]
+                    }
+                }
+            
+            logger.info(f"Input analysis comparison for {provider_name}: {summary}")
+            comparison[provider_name] = {"summary": summary, "details": details}
+        
+        return comparison
+    
+    def evaluate_local_extraction(self, test_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Measure how much of the labelled data the local extractor resolves without the LLM.
+        
+        Runs every query through the rule-based extractor using the configured
+        pipeline.local_extraction.min_confidence, and scores the features of the queries
+        it would resolve locally as well as those it would escalate to the LLM.
+        
+        Args:
+            test_data (List[Dict[str, Any]]): Items with "input_query" and reference "features",
+                as in eval-data/feature_extractor_data.json
+            
+        Returns:
+            Dict[str, Any]: A "summary" (local resolution rate, mean field scores of resolved
+                and escalated queries, mean latency in microseconds) and per-query "details"
+        """
+        logger.info("Evaluating local feature extraction")
+        
+        local_config = self.config.get("pipeline", {}).get("local_extraction", {})
+        extractor = LocalFeatureExtractor(min_confidence=local_config.get("min_confidence", 0.9))
+        details = []
+        
+        for item in test_data:
+            query = item["input_query"]
+            
+            start = time.perf_counter()
+            features, confidence = extractor.extract(query)
+            microseconds = (time.perf_counter() - start) * 1e6
+            
+            details.append({
+                "query": query,
+                "features": features,
+                "confidence": confidence,
+                "resolved_locally": confidence >= extractor.min_confidence,
+                "scores": score_features(features, item["features"]),
+                "microseconds": microseconds
+            })
+        
+        def mean_scores(runs):
+            if not runs:
+                return {}
+            return {
+                field: sum(run["scores"][field] for run in runs) / len(runs)
+                for field in runs[0]["scores"]
+            }
+        
+        resolved = [detail for detail in details if detail["resolved_locally"]]
+        escalated = [detail for detail in details if not detail["resolved_locally"]]
+        summary = {
+            "min_confidence": extractor.min_confidence,
+            "queries": len(details),
+            "resolved_rate": len(resolved) / len(details) if details else 0.0,
+            "resolved_scores": mean_scores(resolved),
+            "escalated_scores": mean_scores(escalated),
+            "mean_microseconds": sum(detail["microseconds"] for detail in details) / len(details) if details else 0.0
+        }
+        
+        logger.info(f"Local extraction summary: {summary}")
+        return {"summary": summary, "details": details}
+    
+    def compare_query_generation(self, trips: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compare the LLM, template and hybrid search query generation modes.
+        
+        For every LLM provider, generates queries for each trip's features in every mode
+        and scores them against the trip's reference queries. The completion cache is
+        disabled so latencies reflect real provider calls.
+        
+        Args:
+            trips (List[Dict[str, Any]]): Items with "features" and reference "queries",
+                as built from eval-data/search_query_data.json
+            
+        Returns:
+            Dict[str, Any]: Per-provider "summary" (mean coverage, similarity, query count
+                and latency for each mode) and per-trip "details"
+        """
+        logger.info("Comparing search query generation modes")
+        
+        modes = ["llm", "template", "hybrid"]
+        comparison = {}
+        
+        for provider_name, provider_config in tqdm(self.llm_providers.items(), desc="Comparing query generation"):
+            provider_specific_config = self.config.copy()
+            provider_specific_config["llm"] = provider_config
+            provider_specific_config["llm_cache"] = {"enabled": False}
+            
+            agent = TravelPlannerAgent(provider_specific_config)
+            generators = {
+                mode: SearchQueryGenerator(
+                    agent.llm_providers["query_generation"],
+                    mode=mode,
+                    templates=self.config.get("query_generation", {}).get("templates")
+                )
+                for mode in modes
+            }
+            details = []
+            
+            for trip in tqdm(trips, desc=f"Testing {provider_name}", leave=False):
+                detail = {"features": trip["features"]}
+                for mode, generator in generators.items():
+                    start = time.perf_counter()
+                    queries = generator.generate_queries(trip["features"])
+                    seconds = time.perf_counter() - start
+                    
+                    detail[mode] = {
+                        "queries": queries,
+                        "scores": score_queries(queries, trip["queries"]),
+                        "seconds": seconds
+                    }
+                details.append(detail)
+            
+            summary = {}
+            for mode in modes:
+                runs = [detail[mode] for detail in details]
+                if not runs:
+                    continue
+                summary[mode] = {
+                    "mean_seconds": sum(run["seconds"] for run in runs) / len(runs),
+                    "scores": {
+                        metric: sum(run["scores"][metric] for run in runs) / len(runs)
+                        for metric in runs[0]["scores"]
+                    }
+                }
+            
+            logger.info(f"Query generation comparison for {provider_name}: {summary}")
+            comparison[provider_name] = {"summary": summary, "details": details}
+        
+        return comparison
+    
+    def compare_stage_routing(self, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Sweep combinations of per-stage model routing and compare their latency and quality.
+        
+        The "routing_sweep" configuration section names the llm_providers entry used as the
+        base model, the candidate models, and the models to try for each stage ("base" for
+        the base model). Every combination runs the full pipeline on each test case and has
+        its plans rated by the judge. The completion cache is disabled so latencies reflect
+        real provider calls.
+        
+        Args:
+            test_cases (List[Dict[str, Any]]): List of test cases with queries to process
+            
+        Returns:
+            Dict[str, Any]: Per-combination "summary" (routing, mean latency, mean rating and,
+                if the all-base combination was run, the seconds saved and rating change
+                relative to it) and per-query "details"
+        """
+        logger.info("Sweeping per-stage model routing")
+        
+        sweep_config = self.config.get("routing_sweep", {})
+        base_name = sweep_config.get("base") or next(iter(self.llm_providers), None)
+        if base_name not in self.llm_providers:
+            logger.error(f"Unknown base provider for the routing sweep: {base_name}")
+            return {}
+        
+        models = sweep_config.get("models", {})
+        stage_options = sweep_config.get("stages", {})
+        stages = [stage for stage in LLM_STAGES if stage_options.get(stage)]
+        options = []
+        for stage in stages:
+            unknown = [model for model in stage_options[stage] if model != "base" and model not in models]
+            if unknown:
+                logger.warning(f"Skipping unknown models {unknown} for the {stage} stage")
+            options.append([model for model in stage_options[stage] if model not in unknown])
+        
+        combinations = list(itertools.product(*options))
+        logger.info(f"Running {len(combinations)} routing combinations on {len(test_cases)} test cases")
+        comparison = {}
+        
+        for choice in tqdm(combinations, desc="Sweeping stage routing"):
+            routing = dict(zip(stages, choice))
+            name = ", ".join(f"{stage}={model}" for stage, model in routing.items()) or "base"
+            
+            routed_config = self.config.copy()
+            routed_config["llm"] = {
+                **self.llm_providers[base_name],
+                "stages": {stage: models[model] for stage, model in routing.items() if model != "base"}
+            }
+            routed_config["llm_cache"] = {"enabled": False}
+            
+            agent = TravelPlannerAgent(routed_config)
+            details = []
+            
+            for test_case in tqdm(test_cases, desc=f"Testing {name}", leave=False):
+                query = test_case["query"]
+                
+                try:
+                    start = time.perf_counter()
+                    response = agent.process_input(query, eval=True)
+                    seconds = time.perf_counter() - start
+                    evaluation = self.judge_response(query, response, name)
+                    details.append({
+                        "query": query,
+                        "seconds": seconds,
+                        "rating": self._mean_rating(evaluation),
+                        "evaluation": evaluation
+                    })
+                except Exception as e:
+                    logger.error(f"Error evaluating routing {name} on query '{query}': {str(e)}")
+                    details.append({"query": query, "error": str(e)})
+            
+            timed = [detail["seconds"] for detail in details if "seconds" in detail]
+            rated = [detail["rating"] for detail in details if detail.get("rating") is not None]
+            summary = {
+                "routing": {stage: routing.get(stage, "base") for stage in LLM_STAGES},
+                "mean_seconds": sum(timed) / len(timed) if timed else None,
+                "mean_rating": sum(rated) / len(rated) if rated else None,
+                "errors": len(details) - len(timed)
+            }
+            
+            self._log_llm_stats(name, agent)
+            logger.info(f"Routing comparison for {name}: {summary}")
+            comparison[name] = {"summary": summary, "details": details}
+        
+        # Compare every combination with running all stages on the base model
+        baseline = next((result["summary"] for result in comparison.values()
+                         if set(result["summary"]["routing"].values()) == {"base"}), None)
+        if baseline is not None:
+            for result in comparison.values():
+                summary = result["summary"]
+                if summary["mean_seconds"] is not None and baseline["mean_seconds"] is not None:
+                    summary["seconds_saved"] = baseline["mean_seconds"] - summary["mean_seconds"]
+                if summary["mean_rating"] is not None and baseline["mean_rating"] is not None:
+                    summary["rating_change"] = summary["mean_rating"] - baseline["mean_rating"]
+        
+        return comparison
+    
     def judge_response(self, query: str, response: Dict[str, Any], provider_name: str) -> Dict[str, Any]:
         """
         Use the judge LLM to evaluate a response.
@@ -225,31 +546,86 @@ Example format:
         logger.info(prompt)
         
         try:
-            # Call the judge LLM
-            response = self.judge_llm.generate(
+            # Call the judge LLM for an evaluation matching the metrics
+            evaluation = self.judge_llm.generate_json(
                 user_prompt=prompt,
-                system_prompt=system_prompt
+                system_prompt=system_prompt,
+                schema=self._judge_schema(),
+                name="evaluation"
             )
 
-            logger.info(response)
-            
-            # Extract the JSON from the response
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > 0:
-                json_str = response[json_start:json_end]
-                evaluation = json.loads(json_str)
-                
-                return evaluation
-            else:
-                logger.warning(f"Could not extract JSON from judge response: {response}")
-                return {"error": "Failed to parse judge response"}
+            logger.info(evaluation)
+            return evaluation
                 
         except Exception as e:
             logger.error(f"Error in judge_response: {str(e)}")
             return {"error": str(e)}
     
+    def _judge_schema(self) -> Dict[str, Any]:
+        """
+        Build the JSON Schema of the judge's evaluation from the configured metrics.
+        
+        Returns:
+            Dict[str, Any]: Schema requiring an integer rating on the scale and an
+                explanation for every metric
+        """
+        metric_ids = [metric.get("id", "") if isinstance(metric, dict) else metric for metric in self.metrics]
+        rating = {"type": "integer", "minimum": self.scale_min, "maximum": self.scale_max}
+        
+        return {
+            "type": "object",
+            "properties": {
+                "ratings": {
+                    "type": "object",
+                    "properties": {metric_id: rating for metric_id in metric_ids},
+                    "required": metric_ids
+                },
+                "explanations": {
+                    "type": "object",
+                    "properties": {metric_id: {"type": "string"} for metric_id in metric_ids}
+                }
+            },
+            "required": ["ratings", "explanations"]
+        }
+    
+    def _mean_rating(self, evaluation: Dict[str, Any]) -> Optional[float]:
+        """
+        Average the judge's metric ratings, ignoring ratings that are not numbers.
+        
+        Args:
+            evaluation (Dict[str, Any]): The judge's evaluation from judge_response()
+            
+        Returns:
+            Optional[float]: The mean rating, or None if the evaluation has no ratings
+        """
+        ratings = [rating for rating in (evaluation.get("ratings") or {}).values()
+                   if isinstance(rating, (int, float))]
+        return sum(ratings) / len(ratings) if ratings else None
+    
+    def _log_llm_stats(self, name: str, agent: TravelPlannerAgent) -> None:
+        """
+        Log the token usage and hedging counters of each distinct LLM of an agent, and its
+        completion cache and rate limiter stats.
+        
+        Args:
+            name (str): Name of the evaluated configuration
+            agent (TravelPlannerAgent): The agent that was evaluated
+        """
+        stages_by_llm = {}
+        for stage, llm in agent.llm_providers.items():
+            stages_by_llm.setdefault(id(llm), (llm, []))[1].append(stage)
+        
+        for llm, stages in stages_by_llm.values():
+            label = f"{name} [{', '.join(stages)}: {llm.provider}/{llm.model}]"
+            logger.info(f"Token usage for {label}: {llm.usage_stats()}")
+            if isinstance(llm, HedgedLLMProvider):
+                logger.info(f"Hedging stats for {label}: {llm.hedge_stats()}")
+        
+        if agent.llm_provider.cache is not None:
+            logger.info(f"Completion cache stats for {name}: {agent.llm_provider.cache.stats()}")
+        if agent.rate_limiter is not None:
+            logger.info(f"Rate limiter stats for {name}: {agent.rate_limiter.stats()}")
+    
     def generate_report(self, output_file: str = None) -> Dict[str, Any]:
         """
         Generate a report from the evaluation results.
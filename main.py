@@ -6,9 +6,11 @@ and provides both CLI and web interface for the travel planning agent.
 """
 
 import yaml
+import asyncio
 import argparse
 from dotenv import load_dotenv
 from app.agent import TravelPlannerAgent
+from api.llm_provider import aclose_http_clients
 
 def load_config(config_path: str):
     """
@@ -23,6 +25,39 @@ def load_config(config_path: str):
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
 
+async def stream_travel_plan(agent: TravelPlannerAgent, user_input: str) -> dict:
+    """
+    Run the planner for one input, printing the itinerary as it is generated.
+    
+    Args:
+        agent (TravelPlannerAgent): The travel planner agent
+        user_input (str): The user's travel request
+        
+    Returns:
+        dict: The final travel plan output
+    """
+    output = {}
+    streamed = False
+    
+    print("\n--- Your Travel Itinerary ---\n")
+    try:
+        async for event in agent.astream_input(user_input):
+            if event["event"] == "itinerary_delta":
+                print(event["data"]["text"], end="", flush=True)
+                streamed = True
+            elif event["event"] == "result":
+                output = event["data"]
+    finally:
+        # Each input runs on a fresh event loop, so release its connection pool
+        await aclose_http_clients()
+    
+    # Nothing was streamed if the pipeline fell back to a template itinerary
+    if not streamed:
+        print(output.get("itinerary", ""))
+    print()
+    
+    return output
+
 def main():
     """
     Main entry point for the NoDetours application.
@@ -56,12 +91,8 @@ def main():
                 print("\nThank you for using NoDetours Travel Planner. Happy travels!")
                 break
             
-            # Process user input
-            output = agent.process_input(user_input)
-            
-            # Display itinerary
-            print("\n--- Your Travel Itinerary ---\n")
-            print(output.get("itinerary", ""))
+            # Process user input, displaying the itinerary as it streams
+            output = asyncio.run(stream_travel_plan(agent, user_input))
             
             # Display packing list
             print("\n--- Packing Recommendations ---\n")
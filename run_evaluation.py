@@ -89,6 +89,107 @@ def load_test_data(data_path: str, sample_size: int = None) -> list:
         logger.error(f"Error loading test data: {str(e)}")
         return []
 
+def load_labelled_data(data_path: str, sample_size: int = None) -> list:
+    """
+    Load queries together with their reference features from a JSON file.
+    
+    Parameters
+    ----------
+    data_path : str
+        Path to a JSON file in the format of eval-data/feature_extractor_data.json
+    sample_size : int, optional
+        Number of items to randomly sample (uses seed 42 for reproducibility)
+        
+    Returns
+    -------
+    list
+        List of dictionaries with 'input_query' and 'features' keys
+    """
+    try:
+        with open(data_path, 'r') as f:
+            data = json.load(f)
+        
+        items = [
+            item for item in data
+            if isinstance(item, dict) and "input_query" in item and "features" in item
+        ]
+        logger.info(f"Loaded {len(items)} labelled queries from {data_path}")
+        
+        if sample_size and 0 < sample_size < len(items):
+            import random
+            random.seed(42)  # For reproducibility
+            items = random.sample(items, sample_size)
+            logger.info(f"Sampled {len(items)} labelled queries")
+        
+        return items
+        
+    except Exception as e:
+        logger.error(f"Error loading labelled data: {str(e)}")
+        return []
+
+def load_query_reference(data_path: str, sample_size: int = None) -> list:
+    """
+    Load reference search queries and group them into trips.
+    
+    Each "place_to_visit" entry starts a new trip; the entries that follow it supply the
+    trip's duration and preferences, so the features can be rebuilt from the references.
+    
+    Parameters
+    ----------
+    data_path : str
+        Path to a JSON file in the format of eval-data/search_query_data.json
+    sample_size : int, optional
+        Number of trips to randomly sample (uses seed 42 for reproducibility)
+        
+    Returns
+    -------
+    list
+        List of dictionaries with 'features' and reference 'queries' keys
+    """
+    try:
+        with open(data_path, 'r') as f:
+            data = json.load(f)
+        
+        trips = []
+        for query in data.get("search_queries", []):
+            feature_type = query.get("feature_type")
+            value = query.get("feature_value")
+            
+            if feature_type == "place_to_visit":
+                trips.append({
+                    "features": {
+                        "place_to_visit": value,
+                        "duration_days": None,
+                        "cuisine_preferences": None,
+                        "place_preferences": None,
+                        "transport_preferences": None
+                    },
+                    "queries": []
+                })
+            elif not trips:
+                continue
+            elif feature_type == "duration_days":
+                trips[-1]["features"]["duration_days"] = int(value)
+            elif feature_type in trips[-1]["features"]:
+                features = trips[-1]["features"]
+                features[feature_type] = (features[feature_type] or []) + [value]
+            
+            trips[-1]["queries"].append(query)
+        
+        logger.info(f"Loaded {len(trips)} trips with reference queries from {data_path}")
+        
+        if sample_size and 0 < sample_size < len(trips):
+            import random
+            random.seed(42)  # For reproducibility
+            trips = random.sample(trips, sample_size)
+            logger.info(f"Sampled {len(trips)} trips")
+        
+        return trips
+        
+    except Exception as e:
+        logger.error(f"Error loading reference queries: {str(e)}")
+        return []
+
 def create_run_directory(base_dir: str = "evaluation_runs") -> str:
     """
     Create a timestamped directory for the current evaluation run.
@@ -140,6 +241,16 @@ def main():
         Skip evaluation and use existing results file
     --results-file : str, optional
         Path to existing results file (required if --skip-evaluation is used)
+    --compare-input-analysis : flag
+        Only compare fused vs. two-call input analysis on the labelled data
+    --local-extraction-report : flag
+        Only report how many labelled queries the local extractor resolves, and how accurately
+    --compare-query-generation : flag
+        Only compare LLM, template and hybrid query generation against reference queries
+        (use with --data eval-data/search_query_data.json)
+    --compare-routing : flag
+        Only sweep the per-stage model routing combinations of the routing_sweep config
+        section, comparing latency and judged quality
     """
     # Load environment variables
     load_dotenv()
@@ -152,11 +263,112 @@ def main():
     parser.add_argument('--output-dir', type=str, default='evaluation_runs', help='Base directory for evaluation outputs')
     parser.add_argument('--skip-evaluation', action='store_true', help='Skip evaluation and use existing results file')
     parser.add_argument('--results-file', type=str, help='Path to existing results file (if skipping evaluation)')
+    parser.add_argument('--compare-input-analysis', action='store_true', help='Compare fused vs. two-call input analysis on the labelled data')
+    parser.add_argument('--local-extraction-report', action='store_true', help='Report local extractor coverage and accuracy on the labelled data')
+    parser.add_argument('--compare-query-generation', action='store_true', help='Compare LLM, template and hybrid query generation on reference queries')
+    parser.add_argument('--compare-routing', action='store_true', help='Sweep per-stage model routing and compare latency against judged quality')
     args = parser.parse_args()
     
     # Create run directory
     run_dir = create_run_directory(args.output_dir)
     
+    if args.compare_input_analysis:
+        items = load_labelled_data(args.data, args.sample_size)
+        if not items:
+            logger.error("No labelled queries available. Exiting.")
+            return
+        
+        evaluator = TravelAgentEvaluator(load_config(args.config))
+        comparison = evaluator.compare_input_analysis(items)
+        
+        comparison_file = os.path.join(run_dir, "input_analysis_comparison.json")
+        with open(comparison_file, 'w') as f:
+            json.dump(comparison, f, indent=2)
+        
+        logger.info("\n" + "-" * 50)
+        logger.info("INPUT ANALYSIS COMPARISON")
+        logger.info("-" * 50)
+        for provider_name, result in comparison.items():
+            for path, summary in result["summary"].items():
+                logger.info(f"{provider_name} [{path}]: overall={summary['scores']['overall']:.3f} "
+                            f"valid_rate={summary['valid_rate']:.2f} mean_seconds={summary['mean_seconds']:.2f}")
+        logger.info(f"Detailed comparison saved to {comparison_file}")
+        return
+    
+    if args.local_extraction_report:
+        items = load_labelled_data(args.data, args.sample_size)
+        if not items:
+            logger.error("No labelled queries available. Exiting.")
+            return
+        
+        evaluator = TravelAgentEvaluator(load_config(args.config))
+        report = evaluator.evaluate_local_extraction(items)
+        
+        report_file = os.path.join(run_dir, "local_extraction_report.json")
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        
+        summary = report["summary"]
+        logger.info("\n" + "-" * 50)
+        logger.info("LOCAL EXTRACTION REPORT")
+        logger.info("-" * 50)
+        logger.info(f"Resolved locally: {summary['resolved_rate']:.1%} of {summary['queries']} queries "
+                    f"(min_confidence={summary['min_confidence']})")
+        if summary["resolved_scores"]:
+            logger.info(f"Accuracy of resolved queries: overall={summary['resolved_scores']['overall']:.3f}")
+        if summary["escalated_scores"]:
+            logger.info(f"Local accuracy of escalated queries: overall={summary['escalated_scores']['overall']:.3f}")
+        logger.info(f"Mean local extraction time: {summary['mean_microseconds']:.0f} microseconds")
+        logger.info(f"Detailed report saved to {report_file}")
+        return
+    
+    if args.compare_query_generation:
+        trips = load_query_reference(args.data, args.sample_size)
+        if not trips:
+            logger.error("No reference queries available. Exiting.")
+            return
+        
+        evaluator = TravelAgentEvaluator(load_config(args.config))
+        comparison = evaluator.compare_query_generation(trips)
+        
+        comparison_file = os.path.join(run_dir, "query_generation_comparison.json")
+        with open(comparison_file, 'w') as f:
+            json.dump(comparison, f, indent=2)
+        
+        logger.info("\n" + "-" * 50)
+        logger.info("QUERY GENERATION COMPARISON")
+        logger.info("-" * 50)
+        for provider_name, result in comparison.items():
+            for mode, summary in result["summary"].items():
+                logger.info(f"{provider_name} [{mode}]: coverage={summary['scores']['coverage']:.3f} "
+                            f"similarity={summary['scores']['similarity']:.3f} "
+                            f"mean_seconds={summary['mean_seconds']:.3f}")
+        logger.info(f"Detailed comparison saved to {comparison_file}")
+        return
+    
+    if args.compare_routing:
+        test_cases = load_test_data(args.data, args.sample_size)
+        if not test_cases:
+            logger.error("No test cases available. Exiting.")
+            return
+        
+        evaluator = TravelAgentEvaluator(load_config(args.config))
+        comparison = evaluator.compare_stage_routing(test_cases)
+        
+        comparison_file = os.path.join(run_dir, "routing_comparison.json")
+        with open(comparison_file, 'w') as f:
+            json.dump(comparison, f, indent=2, default=str)
+        
+        logger.info("\n" + "-" * 50)
+        logger.info("STAGE ROUTING COMPARISON")
+        logger.info("-" * 50)
+        for name, result in comparison.items():
+            summary = result["summary"]
+            logger.info(f"{name}: mean_seconds={summary['mean_seconds']} mean_rating={summary['mean_rating']} "
+                        f"seconds_saved={summary.get('seconds_saved')} rating_change={summary.get('rating_change')}")
+        logger.info(f"Detailed comparison saved to {comparison_file}")
+        return
+    
     # Path for evaluation results
     results_file = os.path.join(run_dir, "evaluation_results.json")
     
@@ -67,25 +67,8 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             logDebug('Sending request to API');
             
-            // Send request to API
-            const response = await fetch('/api/plan', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ text: input })
-            });
-            
-            logDebug(`API response status: ${response.status}`);
-            
-            let data;
-            try {
-                data = await response.json();
-                logDebug('Parsed response data', data);
-            } catch (parseError) {
-                logDebug(`Error parsing JSON: ${parseError}`);
-                throw new Error('Failed to parse response from server');
-            }
+            // Stream the plan so progress and itinerary text show up as they are generated
+            const { response, data } = await streamPlan(input);
             
             if (!response.ok || data.error) {
                 // Special handling for validation errors with missing required info
@@ -193,6 +176,119 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Progress messages shown while each pipeline stage completes
+    const STAGE_MESSAGES = {
+        guardrail: 'Understanding your request...',
+        features: 'Gathering destination information...',
+        queries: 'Searching for places, weather and maps...',
+        context: 'Writing your itinerary...'
+    };
+    
+    // The server keeps conversation history per session; remember ours for this tab
+    const SESSION_KEY = 'nodetours-session-id';
+    
+    // Send the request to the streaming endpoint and render events as they arrive.
+    // Resolves with the final plan once the "result" event is received.
+    async function streamPlan(input) {
+        const response = await fetch('/api/plan/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ text: input, session_id: sessionStorage.getItem(SESSION_KEY) })
+        });
+        
+        logDebug(`API response status: ${response.status}`);
+        
+        // Validation errors are returned as plain JSON, not as a stream
+        if (!response.ok || !response.body) {
+            try {
+                const data = await response.json();
+                logDebug('Parsed response data', data);
+                return { response, data };
+            } catch (parseError) {
+                logDebug(`Error parsing JSON: ${parseError}`);
+                throw new Error('Failed to parse response from server');
+            }
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const loadingMessage = loadingIndicator.querySelector('p');
+        let buffer = '';
+        let streamedItinerary = '';
+        let renderPending = false;
+        let data = null;
+        
+        function renderItinerary() {
+            renderPending = false;
+            itineraryText.innerHTML = formatContent(streamedItinerary);
+        }
+        
+        function handleEvent(eventName, payload) {
+            if (STAGE_MESSAGES[eventName]) {
+                logDebug(`Stage completed: ${eventName}`, payload);
+                loadingMessage.textContent = STAGE_MESSAGES[eventName];
+            } else if (eventName === 'itinerary_delta') {
+                if (!streamedItinerary) {
+                    // Show the itinerary tab as soon as the first text arrives
+                    loadingIndicator.style.display = 'none';
+                    document.querySelector('.tabs').style.display = 'flex';
+                    document.querySelector('.tab-content').style.display = 'block';
+                }
+                streamedItinerary += payload.text;
+                if (!renderPending) {
+                    renderPending = true;
+                    requestAnimationFrame(renderItinerary);
+                }
+            } else if (eventName === 'result' || eventName === 'error') {
+                data = payload;
+                if (payload.session_id) {
+                    sessionStorage.setItem(SESSION_KEY, payload.session_id);
+                }
+            }
+        }
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        eventData += line.slice(5).trim();
+                    }
+                });
+                
+                try {
+                    handleEvent(eventName, JSON.parse(eventData));
+                } catch (parseError) {
+                    logDebug(`Error parsing event ${eventName}: ${parseError}`);
+                }
+            }
+        }
+        
+        loadingMessage.textContent = 'Planning your perfect trip...';
+        
+        if (!data) {
+            throw new Error('The connection closed before the travel plan was complete');
+        }
+        
+        logDebug('Received final plan', data);
+        return { response, data };
+    }
+    
     // Function to format content with better styling
     function formatContent(text) {
         if (!text) return 'No content available.';
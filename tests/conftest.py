@@ -0,0 +1,137 @@
+"""
+tests/conftest.py
+
+Fakes shared by the test modules, exposed as fixtures.
+"""
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from api.llm_provider import AsyncLLMStream, LLMProvider, LLMStream
+
+class FakeLLM:
+    """
+    Stands in for LLMProvider, answering each call with the next canned output and
+    recording the prompts.
+    
+    An exception output is raised instead of returned. Streams yield their output as a
+    single delta; with stall set, async streams then stop sending deltas like a hung
+    connection.
+    """
+    
+    provider = "anthropic"
+    
+    def __init__(self, outputs=(), model="test-model", stall=False):
+        self.outputs = list(outputs)
+        self.model = model
+        self.stall = stall
+        self.prompts = []
+    
+    @property
+    def calls(self):
+        return len(self.prompts)
+    
+    def _next_output(self, user_prompt):
+        self.prompts.append(user_prompt)
+        output = self.outputs.pop(0)
+        if isinstance(output, Exception):
+            raise output
+        return output
+    
+    def generate(self, system_prompt, user_prompt, conversation_history=None, use_cache=None, cache_prompt=False):
+        return self._next_output(user_prompt)
+    
+    async def agenerate(self, system_prompt, user_prompt, conversation_history=None, use_cache=None, cache_prompt=False):
+        return self._next_output(user_prompt)
+    
+    def generate_json(self, system_prompt, user_prompt, schema, name="response",
+                      conversation_history=None, use_cache=None, cache_prompt=False):
+        return self._next_output(user_prompt)
+    
+    async def agenerate_json(self, system_prompt, user_prompt, schema, name="response",
+                             conversation_history=None, use_cache=None, cache_prompt=False):
+        return self._next_output(user_prompt)
+    
+    def stream(self, system_prompt, user_prompt, conversation_history=None, cache_prompt=False):
+        text = self._next_output(user_prompt)
+        
+        def deltas(result):
+            yield text
+            result.finish_reason = "end_turn"
+        return LLMStream(deltas)
+    
+    def astream(self, system_prompt, user_prompt, conversation_history=None, cache_prompt=False):
+        text = self._next_output(user_prompt)
+        stall = self.stall
+        
+        async def deltas(result):
+            yield text
+            if stall:
+                await asyncio.sleep(60)
+            result.finish_reason = "end_turn"
+        return AsyncLLMStream(deltas)
+
+class FakeMessages:
+    """
+    Stands in for the Anthropic messages API, answering with canned outputs in order.
+    
+    A dict output becomes a tool call, a string a text block and an exception is raised.
+    """
+    
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.requests = []
+    
+    @property
+    def with_raw_response(self):
+        return self
+    
+    def create(self, **request):
+        self.requests.append(request)
+        output = self.outputs.pop(0)
+        if isinstance(output, Exception):
+            raise output
+        if isinstance(output, dict):
+            content = [SimpleNamespace(type="tool_use", input=output)]
+        else:
+            content = [SimpleNamespace(type="text", text=output)]
+        response = SimpleNamespace(content=content, usage=SimpleNamespace(input_tokens=10, output_tokens=5))
+        return SimpleNamespace(parse=lambda: response, headers={})
+
+class AsyncMessages:
+    """
+    Async wrapper of FakeMessages.
+    """
+    
+    def __init__(self, messages):
+        self.messages = messages
+    
+    @property
+    def with_raw_response(self):
+        return self
+    
+    async def create(self, **request):
+        return self.messages.create(**request)
+
+@pytest.fixture
+def fake_llm():
+    """
+    The FakeLLM class, to build stand-ins for LLMProvider with canned outputs.
+    """
+    return FakeLLM
+
+@pytest.fixture
+def provider_with():
+    """
+    Build an Anthropic LLMProvider whose sync and async clients answer with canned outputs.
+    
+    The fixture is a function taking the outputs and LLMProvider keyword arguments and
+    returning the provider and its FakeMessages.
+    """
+    def build(outputs, **kwargs):
+        llm = LLMProvider(provider="anthropic", model="test-model", **kwargs)
+        messages = FakeMessages(outputs)
+        llm.client = SimpleNamespace(messages=messages)
+        llm._get_async_client = lambda: SimpleNamespace(messages=AsyncMessages(messages))
+        return llm, messages
+    return build
@@ -0,0 +1,23 @@
+"""
+tests/test_context_packer.py
+
+Tests for token counting in the context packer.
+"""
+
+import types
+from app.modules import context_packer
+from app.modules.context_packer import TokenCounter
+
+def test_unloadable_fallback_encoding_estimates_from_length(monkeypatch):
+    def encoding_for_model(model):
+        raise KeyError(model)
+    
+    def get_encoding(name):
+        raise OSError("cannot download the encoding")
+    
+    fake_tiktoken = types.SimpleNamespace(encoding_for_model=encoding_for_model, get_encoding=get_encoding)
+    monkeypatch.setattr(context_packer, "tiktoken", fake_tiktoken)
+    
+    counter = TokenCounter("openai", "unknown-model")
+    
+    assert counter.count("x" * 40) == 10
@@ -0,0 +1,109 @@
+"""
+tests/test_itinerary_repair.py
+
+Tests for the validation and repair of streamed itineraries.
+"""
+
+import time
+import asyncio
+from app.modules.output_generator import OutputGenerator
+from app.modules.itinerary_validator import ItineraryDayTracker, split_itinerary
+
+CUT_IN_TAIL = "# Rome\n## Day 1\n- a\n## Day 2\n- b\n## Accommodation\n- Luxury: Hotel X - $300-"
+CUT_IN_DAY = "# Rome\n## Day 1\n- a\n## Day 2\n- b and then"
+
+def tracked(text, duration_days):
+    tracker = ItineraryDayTracker(duration_days)
+    tracker.feed(text)
+    tracker.finish()
+    return tracker
+
+def test_cut_off_in_trailing_sections_keeps_last_day(fake_llm):
+    generator = OutputGenerator(fake_llm([]))
+    _, days, tail = split_itinerary(CUT_IN_TAIL)
+    
+    assert generator._days_to_regenerate(days, tail, True, tracked(CUT_IN_TAIL, 2)) == []
+    assert sorted(days) == [1, 2]
+
+def test_cut_off_in_day_regenerates_it(fake_llm):
+    generator = OutputGenerator(fake_llm([]))
+    _, days, tail = split_itinerary(CUT_IN_DAY)
+    
+    assert generator._days_to_regenerate(days, tail, True, tracked(CUT_IN_DAY, 2)) == [2]
+    assert sorted(days) == [1]
+
+def test_complete_itinerary_keeps_tail_of_truncated_stream(fake_llm):
+    llm = fake_llm([])
+    generator = OutputGenerator(llm)
+    
+    text, regenerated = generator._complete_itinerary(
+        CUT_IN_TAIL, True, tracked(CUT_IN_TAIL, 2), "system", "user", time.monotonic() + 60
+    )
+    
+    assert text == CUT_IN_TAIL
+    assert regenerated == {}
+    assert llm.prompts == []
+
+def test_complete_itinerary_regenerates_missing_days(fake_llm):
+    llm = fake_llm(["## Day 2\n- new b\n## Day 3\n- c"])
+    generator = OutputGenerator(llm)
+    
+    text, regenerated = generator._complete_itinerary(
+        CUT_IN_DAY, True, tracked(CUT_IN_DAY, 3), "system", "user", time.monotonic() + 60
+    )
+    
+    assert text == "# Rome\n\n## Day 1\n- a\n\n## Day 2\n- new b\n\n## Day 3\n- c"
+    assert sorted(regenerated) == [2, 3]
+    assert "Day 2, Day 3" in llm.prompts[0]
+
+def test_acomplete_itinerary_matches_sync(fake_llm):
+    llm = fake_llm(["## Day 2\n- new b"])
+    generator = OutputGenerator(llm, max_repair_rounds=2)
+    
+    text, regenerated = asyncio.run(generator._acomplete_itinerary(
+        CUT_IN_DAY, True, tracked(CUT_IN_DAY, 2), "system", "user", time.monotonic() + 60
+    ))
+    
+    assert text == "# Rome\n\n## Day 1\n- a\n\n## Day 2\n- new b"
+    assert list(regenerated) == [2]
+
+def test_repair_stops_after_max_rounds(fake_llm):
+    llm = fake_llm(["## Day 1\n- wrong day", "## Day 1\n- wrong again"])
+    generator = OutputGenerator(llm, max_repair_rounds=2)
+    
+    text, regenerated = generator._complete_itinerary(
+        CUT_IN_DAY, True, tracked(CUT_IN_DAY, 2), "system", "user", time.monotonic() + 60
+    )
+    
+    assert len(llm.prompts) == 2
+    assert regenerated == {}
+    assert text == "# Rome\n\n## Day 1\n- a"
+
+def test_cut_off_batch_drops_only_a_cut_off_day(fake_llm):
+    generator = OutputGenerator(fake_llm([]))
+    
+    assert generator._drop_cut_off_day("## Day 4\n- a\n## Day 5\n- b and") == "## Day 4\n- a"
+    assert generator._drop_cut_off_day("## Day 4\n- a\n## Day 5\n- b\n## Tips\n- Carry cash and") == (
+        "## Day 4\n- a\n\n## Day 5\n- b\n\n## Tips\n- Carry cash and"
+    )
+
+def test_stalled_stream_falls_back_at_the_deadline(fake_llm):
+    generator = OutputGenerator(fake_llm(["# Rome\n## Day 1\n- a"], stall=True), section_timeouts={"itinerary": 0.2})
+    trip_details = {"place_to_visit": "Rome", "duration_days": 2}
+    
+    async def collect():
+        return [event async for event in generator._astream_itinerary_text("system", "user", trip_details)]
+    
+    started = time.monotonic()
+    events = asyncio.run(collect())
+    
+    assert time.monotonic() - started < 5
+    assert events == [("delta", "# Rome\n## Day 1\n- a"), ("itinerary", "")]
+
+def test_stalled_batch_is_cut_at_the_deadline(fake_llm):
+    generator = OutputGenerator(fake_llm(["## Day 4\n- a"], stall=True))
+    stream = generator.llm_provider.astream("system", "user")
+    
+    text, incomplete = asyncio.run(generator._aread_stream(stream, time.monotonic() + 0.2))
+    
+    assert (text, incomplete) == ("## Day 4\n- a", True)
@@ -0,0 +1,30 @@
+"""
+tests/test_llm_hedging.py
+
+Tests for hedged completions when a provider call raises.
+"""
+
+import asyncio
+import pytest
+from api.llm_hedging import HedgedLLMProvider
+
+def test_raising_primary_fails_over_to_secondary(fake_llm):
+    primary = fake_llm([RuntimeError("connection reset")], model="primary")
+    llm = HedgedLLMProvider(primary, fake_llm(["plan"], model="secondary"))
+    
+    assert llm.generate("system", "user") == "plan"
+    assert llm.hedge_stats()["secondary_wins"] == 1
+
+def test_raising_providers_reraise_the_last_error(fake_llm):
+    error = RuntimeError("secondary down")
+    llm = HedgedLLMProvider(fake_llm([RuntimeError("primary down")], model="primary"), fake_llm([error], model="secondary"))
+    
+    with pytest.raises(RuntimeError) as raised:
+        llm.generate("system", "user")
+    assert raised.value is error
+
+def test_async_raising_primary_fails_over_to_secondary(fake_llm):
+    primary = fake_llm([RuntimeError("connection reset")], model="primary")
+    llm = HedgedLLMProvider(primary, fake_llm(["plan"], model="secondary"))
+    
+    assert asyncio.run(llm.agenerate("system", "user")) == "plan"
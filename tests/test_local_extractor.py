@@ -0,0 +1,30 @@
+"""
+tests/test_local_extractor.py
+
+Tests for the rule-based local feature extractor.
+"""
+
+from app.modules.local_extractor import LocalFeatureExtractor
+
+def test_resolves_query_built_from_generic_terms():
+    extractor = LocalFeatureExtractor(min_confidence=0.9)
+    
+    features, confidence = extractor.extract("Plan a 5-day trip to Tokyo with sushi, temples and the subway")
+    
+    assert confidence >= extractor.min_confidence
+    assert features["place_to_visit"] == "Tokyo"
+    assert features["duration_days"] == 5
+    assert features["cuisine_preferences"] == ["sushi"]
+    assert features["place_preferences"] == ["temples"]
+    assert features["transport_preferences"] == "subway"
+
+def test_escalates_query_with_terms_outside_the_tables():
+    extractor = LocalFeatureExtractor(min_confidence=0.9)
+    
+    features, confidence = extractor.extract(
+        "Plan a 10-day New Zealand trip to see fjords and try lamb with a campervan"
+    )
+    
+    assert confidence < extractor.min_confidence
+    assert features["place_to_visit"] == "New Zealand"
+    assert features["duration_days"] == 10
@@ -0,0 +1,166 @@
+"""
+tests/test_rate_limiter.py
+
+Tests for the SQLite-backed adaptive rate limiter and the retries of rate limited providers.
+"""
+
+import time
+import asyncio
+import pytest
+from api import llm_provider
+from api.rate_limiter import (
+    RateLimiter, RateLimitTimeout, create_rate_limiter, is_rate_limit_error, parse_rate_limit_headers
+)
+
+KEY = "anthropic/test-model"
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "rate_limits.sqlite")
+
+def test_parse_anthropic_headers():
+    limits = parse_rate_limit_headers({
+        "anthropic-ratelimit-requests-limit": "50",
+        "anthropic-ratelimit-requests-remaining": "0",
+        "anthropic-ratelimit-requests-reset": "1970-01-01T00:00:12Z",
+        "anthropic-ratelimit-tokens-limit": "40000",
+        "retry-after": "3"
+    }, now=10.0)
+    
+    assert limits == {"request_limit": 50, "requests_remaining": 0, "requests_reset": 2.0,
+                      "token_limit": 40000, "retry_after": 3}
+
+def test_parse_openai_headers():
+    limits = parse_rate_limit_headers({
+        "x-ratelimit-limit-tokens": "150000",
+        "x-ratelimit-remaining-tokens": "149000",
+        "x-ratelimit-reset-tokens": "6m0s",
+        "x-ratelimit-reset-requests": "20ms",
+        "retry-after-ms": "1500"
+    }, now=0.0)
+    
+    assert limits == {"token_limit": 150000, "tokens_remaining": 149000, "tokens_reset": 360.0,
+                      "requests_reset": 0.02, "retry_after": 1.5}
+
+def test_is_rate_limit_error():
+    class RateLimitError(Exception):
+        pass
+    
+    class ServerError(Exception):
+        status_code = 500
+    
+    assert is_rate_limit_error(RateLimitError())
+    assert not is_rate_limit_error(ServerError())
+    assert not is_rate_limit_error(None)
+
+def test_concurrency_limit_makes_callers_wait(db_path):
+    limiter = RateLimiter(db_path=db_path, initial_concurrency=1, max_wait_seconds=0.2)
+    lease = limiter.acquire(KEY, 100)
+    
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(KEY, 100)
+    
+    limiter.release(lease, used_tokens=50)
+    limiter.release(limiter.acquire(KEY, 100))
+
+def test_rate_limited_release_halves_concurrency_and_pauses(db_path):
+    limiter = RateLimiter(db_path=db_path, initial_concurrency=8, max_wait_seconds=0.1)
+    limiter.release(limiter.acquire(KEY, 100), headers={"retry-after": "30"}, rate_limited=True)
+    
+    state = limiter.stats()["keys"][KEY]
+    assert state["concurrency"] == 4
+    assert state["blocked_seconds"] > 25
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(KEY, 100)
+
+def test_request_bucket_limits_calls(db_path):
+    limiter = RateLimiter(db_path=db_path, requests_per_minute=2, max_wait_seconds=0.2)
+    for _ in range(2):
+        limiter.release(limiter.acquire(KEY, 1))
+    
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(KEY, 1)
+
+def test_learned_limits_survive_a_new_process(db_path):
+    limiter = RateLimiter(db_path=db_path)
+    limiter.release(limiter.acquire(KEY, 100), headers={"anthropic-ratelimit-requests-limit": "50",
+                                                        "anthropic-ratelimit-tokens-limit": "40000"})
+    
+    # Another process with no configured limits keeps the ones learned from the headers
+    other = RateLimiter(db_path=db_path)
+    other.release(other.acquire(KEY, 100))
+    
+    assert other.stats()["keys"][KEY]["requests_per_minute"] == 50
+    assert other.stats()["keys"][KEY]["tokens_per_minute"] == 40000
+
+def test_configured_limits_replace_learned_ones(db_path):
+    limiter = RateLimiter(db_path=db_path)
+    limiter.release(limiter.acquire(KEY, 100), headers={"anthropic-ratelimit-requests-limit": "50"})
+    
+    configured = RateLimiter(db_path=db_path, limits={KEY: {"requests_per_minute": 10}})
+    configured.release(configured.acquire(KEY, 100))
+    
+    assert configured.stats()["keys"][KEY]["requests_per_minute"] == 10
+    assert configured.stats()["keys"][KEY]["tokens_per_minute"] is None
+
+def test_expired_lease_stops_counting(db_path):
+    limiter = RateLimiter(db_path=db_path, initial_concurrency=1, max_wait_seconds=1.0, lease_seconds=0.1)
+    limiter.acquire(KEY, 100)
+    
+    started = time.monotonic()
+    limiter.release(limiter.acquire(KEY, 100))
+    assert time.monotonic() - started < 1.0
+
+def test_interactive_calls_bypass_batch_share(db_path):
+    limiter = RateLimiter(db_path=db_path, initial_concurrency=2, max_wait_seconds=0.2)
+    batch = limiter.acquire(KEY, 100, priority="batch")
+    
+    # Batch may hold at most half of the two slots, interactive calls may use the rest
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(KEY, 100, priority="batch")
+    limiter.release(limiter.acquire(KEY, 100, priority="interactive"))
+    limiter.release(batch)
+
+def test_create_rate_limiter(db_path):
+    assert create_rate_limiter(None) is None
+    assert create_rate_limiter({"enabled": False}) is None
+    
+    limiter = create_rate_limiter({"enabled": True, "db_path": db_path, "lease_seconds": 30, "priority": "batch"})
+    assert limiter.lease_seconds == 30
+    assert limiter.default_priority == "batch"
+
+class ServiceUnavailable(Exception):
+    status_code = 503
+
+class APIConnectionError(Exception):
+    pass
+
+class BadRequestError(Exception):
+    status_code = 400
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_provider, "RETRY_BACKOFF_BASE", 0.0)
+
+def test_server_error_is_retried_with_a_limiter(db_path, provider_with, no_backoff):
+    llm, messages = provider_with([ServiceUnavailable("overloaded"), "plan"], rate_limiter=RateLimiter(db_path=db_path))
+    
+    assert llm.generate("system", "user") == "plan"
+    assert len(messages.requests) == 2
+
+def test_connection_error_is_retried_with_a_limiter(db_path, provider_with, no_backoff):
+    llm, messages = provider_with([APIConnectionError("reset"), "plan"], rate_limiter=RateLimiter(db_path=db_path))
+    
+    assert asyncio.run(llm.agenerate("system", "user")) == "plan"
+    assert len(messages.requests) == 2
+
+def test_client_errors_and_exhausted_retries_are_not_retried(db_path, provider_with, no_backoff):
+    limiter = RateLimiter(db_path=db_path, max_retries=1)
+    
+    llm, messages = provider_with([BadRequestError("bad"), "plan"], rate_limiter=limiter)
+    assert llm.generate("system", "user").startswith(llm_provider.ERROR_RESPONSE_PREFIX)
+    assert len(messages.requests) == 1
+    
+    llm, messages = provider_with([ServiceUnavailable("down"), ServiceUnavailable("down"), "plan"], rate_limiter=limiter)
+    assert llm.generate("system", "user").startswith(llm_provider.ERROR_RESPONSE_PREFIX)
+    assert len(messages.requests) == 2
@@ -0,0 +1,45 @@
+"""
+tests/test_search_query_generator.py
+
+Tests for the template and hybrid query generation modes.
+"""
+
+import asyncio
+import pytest
+from app.modules.search_query_generator import SearchQueryGenerator
+
+@pytest.mark.parametrize("value", ["Central Park", "Louvre", "Musée du Louvre", "Big Ben"])
+def test_named_places_are_landmarks(value, fake_llm):
+    assert SearchQueryGenerator(fake_llm())._is_landmark(value)
+
+@pytest.mark.parametrize("value", ["art", "zoo", "spa", "the zoo", "street art", "", "   ", "42"])
+def test_generic_preferences_are_not_landmarks(value, fake_llm):
+    assert not SearchQueryGenerator(fake_llm())._is_landmark(value)
+
+def test_landmark_gets_landmark_template(fake_llm):
+    generator = SearchQueryGenerator(fake_llm(), mode="template")
+    queries = generator.generate_queries({"place_to_visit": "Rome", "place_preferences": ["Colosseum", "art"]})
+    by_value = {query["feature_value"]: query["search_query"] for query in queries}
+    
+    assert by_value["Colosseum"].startswith("Visiting Colosseum in Rome")
+    assert by_value["art"].startswith("Best art in Rome")
+
+def test_hybrid_falls_back_to_templates_when_llm_fails(fake_llm):
+    llm = fake_llm([ValueError("no JSON")])
+    generator = SearchQueryGenerator(llm, mode="hybrid")
+    features = {"place_to_visit": "Rome", "cuisine_preferences": ["kombucha tasting"]}
+    
+    queries = generator.generate_queries(features)
+    
+    assert llm.calls == 1
+    assert [query["feature_value"] for query in queries if query["feature_type"] == "cuisine_preferences"] == ["kombucha tasting"]
+
+def test_hybrid_sync_and_async_agree(fake_llm):
+    llm_query = {"feature_type": "cuisine_preferences", "feature_value": "kombucha tasting", "search_query": "q"}
+    features = {"place_to_visit": "Rome", "cuisine_preferences": ["kombucha tasting"]}
+    
+    sync_queries = SearchQueryGenerator(fake_llm([[llm_query]]), mode="hybrid").generate_queries(features)
+    async_queries = asyncio.run(SearchQueryGenerator(fake_llm([[llm_query]]), mode="hybrid").agenerate_queries(features))
+    
+    assert sync_queries == async_queries
+    assert llm_query in sync_queries
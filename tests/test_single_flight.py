@@ -0,0 +1,67 @@
+"""
+tests/test_single_flight.py
+
+Tests for request coalescing.
+"""
+
+import time
+import threading
+import pytest
+from api.single_flight import SingleFlight
+
+class Interrupted(BaseException):
+    """
+    A failure that is not an Exception, like KeyboardInterrupt.
+    """
+
+def run_with_follower(group, fn):
+    """
+    Run fn through the group from a leader thread while a follower joins the call.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = {}
+    
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+    
+    def run(role, call):
+        try:
+            outcomes[role] = ("result", group.do("key", call))
+        except BaseException as e:
+            outcomes[role] = ("error", e)
+    
+    leader = threading.Thread(target=run, args=("leader", leader_fn))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=run, args=("follower", lambda: pytest.fail("follower ran fn")))
+    follower.start()
+    while group.coalesced == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return outcomes
+
+def test_follower_gets_a_copy_of_the_result():
+    group = SingleFlight("test")
+    
+    outcomes = run_with_follower(group, lambda: {"places": ["a"]})
+    
+    assert outcomes["follower"] == ("result", {"places": ["a"]})
+    assert outcomes["follower"][1] is not outcomes["leader"][1]
+    assert group.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+@pytest.mark.parametrize("error", [ValueError("upstream failed"), Interrupted()])
+def test_follower_reraises_the_leaders_failure(error):
+    group = SingleFlight("test")
+    
+    def fail():
+        raise error
+    
+    outcomes = run_with_follower(group, fail)
+    
+    assert outcomes["leader"] == ("error", error)
+    assert outcomes["follower"] == ("error", error)
@@ -0,0 +1,152 @@
+"""
+tests/test_structured_output.py
+
+Tests for JSON parsing and validation of model output, and for LLMProvider.generate_json().
+"""
+
+import asyncio
+import pytest
+from api.llm_provider import LLMProvider
+from api.structured_output import StructuredOutputError, drop_optional_nulls, parse_json, strict_schema, validate_json
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_valid": {"type": "boolean"},
+        "reason": {"type": "string"}
+    },
+    "required": ["is_valid"]
+}
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('  [1, 2]\n', [1, 2]),
+    ('```json\n{"a": [1, 2]}\n```', {"a": [1, 2]}),
+    ('```\n{"a": 1}\n```', {"a": 1}),
+    ('{"a": [1, 2,],}', {"a": [1, 2]}),
+    ('Here is the JSON: {"a": 1} Let me know if you need more. {"b": 2}', {"a": 1}),
+    ('Result: [{"a": 1}]', [{"a": 1}])
+])
+def test_parse_json_repairs_formatting(text, expected):
+    assert parse_json(text) == expected
+
+@pytest.mark.parametrize("text", ["", "   ", "no json here", '{"a": ', None])
+def test_parse_json_rejects_text_without_json(text):
+    with pytest.raises(StructuredOutputError):
+        parse_json(text)
+
+def test_validate_json_accepts_valid_values():
+    assert validate_json({"is_valid": False, "reason": "off topic"}, VERDICT_SCHEMA) == []
+    assert validate_json({"n": None}, {"properties": {"n": {"type": ["integer", "null"]}}}) == []
+    assert validate_json(["a", "b"], {"type": "array", "items": {"type": "string"}}) == []
+
+def test_validate_json_reports_errors_with_paths():
+    assert validate_json({"reason": 1}, VERDICT_SCHEMA) == [
+        "$.is_valid is required", "$.reason should be string, got int"
+    ]
+    assert validate_json([{"q": 1}], {"type": "array", "items": {"properties": {"q": {"type": "string"}}}}) == [
+        "$[0].q should be string, got int"
+    ]
+    assert validate_json("c", {"enum": ["a", "b"]}) == ["$ should be one of ['a', 'b']"]
+
+def test_validate_json_checks_ranges():
+    rating = {"type": "integer", "minimum": 1, "maximum": 5}
+    
+    assert validate_json(3, rating) == []
+    assert validate_json(0, rating) == ["$ should be at least 1"]
+    assert validate_json(6, rating) == ["$ should be at most 5"]
+
+def test_strict_schema_requires_every_property():
+    schema = {
+        "type": "object",
+        "properties": {
+            "rating": {"type": "integer", "minimum": 1, "maximum": 5},
+            "reason": {"type": "string"},
+            "tags": {"type": ["string", "array", "null"], "items": {"type": "string"}}
+        },
+        "required": ["rating"]
+    }
+    
+    assert strict_schema(schema) == {
+        "type": "object",
+        "properties": {
+            "rating": {"type": "integer"},
+            "reason": {"type": ["string", "null"]},
+            "tags": {"anyOf": [{"type": "string"}, {"type": "array", "items": {"type": "string"}}, {"type": "null"}]}
+        },
+        "required": ["rating", "reason", "tags"],
+        "additionalProperties": False
+    }
+    assert schema["required"] == ["rating"]
+
+def test_drop_optional_nulls_restores_omitted_properties():
+    schema = {
+        "type": "object",
+        "properties": {"is_valid": {"type": "boolean"}, "reason": {"type": "string"}, "note": {"type": ["string", "null"]}},
+        "required": ["is_valid"]
+    }
+    
+    assert drop_optional_nulls({"is_valid": True, "reason": None, "note": None}, schema) == {"is_valid": True, "note": None}
+
+def test_validate_json_does_not_count_booleans_as_numbers():
+    assert validate_json(True, {"type": "integer"})
+    assert validate_json(False, {"type": "number"})
+    assert validate_json(2.5, {"type": "integer"})
+    assert validate_json(2.5, {"type": "number"}) == []
+
+class BadRequestError(Exception):
+    status_code = 400
+
+def test_generate_json_forces_a_tool_call(provider_with):
+    llm, messages = provider_with([{"is_valid": True}])
+    
+    assert llm.generate_json("system", "user", VERDICT_SCHEMA, name="verdict") == {"is_valid": True}
+    assert messages.requests[0]["tool_choice"] == {"type": "tool", "name": "verdict"}
+    assert messages.requests[0]["tools"][0]["input_schema"] == VERDICT_SCHEMA
+
+def test_generate_json_unwraps_array_schemas(provider_with):
+    llm, messages = provider_with([{"result": ["a", "b"]}])
+    schema = {"type": "array", "items": {"type": "string"}}
+    
+    assert llm.generate_json("system", "user", schema) == ["a", "b"]
+    assert messages.requests[0]["tools"][0]["input_schema"]["properties"]["result"] == schema
+
+def test_generate_json_makes_bounded_repair_calls(provider_with):
+    llm, messages = provider_with([{"is_valid": "yes"}, {"is_valid": True}])
+    assert llm.generate_json("system", "user", VERDICT_SCHEMA) == {"is_valid": True}
+    assert messages.requests[1]["temperature"] == 0.0
+    assert "$.is_valid should be boolean" in messages.requests[1]["messages"][-1]["content"]
+    
+    llm, messages = provider_with([{"is_valid": "yes"}, {"is_valid": "still yes"}], max_json_repairs=1)
+    with pytest.raises(StructuredOutputError):
+        llm.generate_json("system", "user", VERDICT_SCHEMA)
+    assert len(messages.requests) == 2
+
+def test_format_rejection_switches_to_json_prompts(provider_with):
+    llm, messages = provider_with([BadRequestError("tool_choice is not supported by this model"),
+                                   '```json\n{"is_valid": true,}\n```'])
+    
+    assert llm.generate_json("system", "user", VERDICT_SCHEMA) == {"is_valid": True}
+    assert llm.structured_output is False
+    assert "tool_choice" not in messages.requests[1]
+
+def test_unrelated_bad_request_keeps_structured_output(provider_with):
+    llm, messages = provider_with([BadRequestError("prompt is too long: 210000 tokens > 200000 maximum")])
+    
+    with pytest.raises(StructuredOutputError):
+        llm.generate_json("system", "user", VERDICT_SCHEMA)
+    assert llm.structured_output is True
+    assert len(messages.requests) == 1
+
+def test_agenerate_json_matches_sync(provider_with):
+    llm, messages = provider_with([{"is_valid": "yes"}, {"is_valid": False, "reason": "spam"}])
+    
+    assert asyncio.run(llm.agenerate_json("system", "user", VERDICT_SCHEMA)) == {"is_valid": False, "reason": "spam"}
+    assert len(messages.requests) == 2
+
+def test_openai_request_uses_strict_schema():
+    llm = LLMProvider(provider="openai", model="test-model")
+    
+    request = llm._build_structured_request("system", "user", VERDICT_SCHEMA, "verdict")
+    
+    assert request["response_format"]["json_schema"] == {"name": "verdict", "schema": strict_schema(VERDICT_SCHEMA), "strict": True}
@@ -1,13 +1,14 @@
 """
 utils/helpers.py
 Utility functions for handling date parsing, formatting, and data conversion operations.
-These helpers support the travel planner application with common data manipulation tasks.
+These helpers support the travel planner application with common data manipulation tasks,
+and the evaluation scripts with feature-extraction and search-query scoring.
 """
 
 import re
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 def parse_date_string(date_str: str) -> Optional[datetime]:
     """
@@ -139,4 +140,117 @@ def set_to_list_converter(obj):
     """
     if isinstance(obj, set):
         return list(obj)
-    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
\ No newline at end of file
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _preference_tokens(value: Any) -> set:
+    """
+    Normalize a preference value into a set of lowercase, singularized word tokens.
+    """
+    if value is None:
+        return set()
+    if not isinstance(value, (list, tuple, set)):
+        value = [value]
+    
+    tokens = set()
+    for item in value:
+        for word in re.findall(r"[a-z]+", str(item).lower()):
+            if len(word) > 4 and word.endswith("ies"):
+                word = word[:-3] + "y"
+            elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            tokens.add(word)
+    return tokens
+
+def _token_f1(predicted_tokens: set, expected_tokens: set) -> float:
+    """
+    Compute the F1 score of two token sets, 0.0 if either is empty.
+    """
+    overlap = len(predicted_tokens & expected_tokens)
+    if not overlap:
+        return 0.0
+    precision = overlap / len(predicted_tokens)
+    recall = overlap / len(expected_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+def score_features(predicted: Dict[str, Any], expected: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Score extracted travel features against a labelled reference.
+    
+    Destinations match if either name contains the other ("Paris" vs "Paris, France"),
+    durations must be equal, and preference fields are scored with a word-level F1 so
+    "beach activities" partially matches "beaches". A field that is empty in both the
+    prediction and the reference scores 1.0.
+    
+    Args:
+        predicted (Dict[str, Any]): Features returned by an extractor
+        expected (Dict[str, Any]): Reference features from the evaluation data
+        
+    Returns:
+        Dict[str, float]: Score between 0 and 1 for each feature, plus their mean as "overall"
+    """
+    predicted = predicted or {}
+    scores = {}
+    
+    predicted_place = str(predicted.get("place_to_visit") or "").strip().lower()
+    expected_place = str(expected.get("place_to_visit") or "").strip().lower()
+    if not expected_place:
+        scores["place_to_visit"] = 1.0 if not predicted_place else 0.0
+    else:
+        scores["place_to_visit"] = float(bool(predicted_place) and (expected_place in predicted_place or predicted_place in expected_place))
+    
+    try:
+        predicted_days = int(predicted["duration_days"]) if predicted.get("duration_days") is not None else None
+    except (TypeError, ValueError):
+        predicted_days = None
+    scores["duration_days"] = float(predicted_days == expected.get("duration_days"))
+    
+    for field in ["cuisine_preferences", "place_preferences", "transport_preferences"]:
+        predicted_tokens = _preference_tokens(predicted.get(field))
+        expected_tokens = _preference_tokens(expected.get(field))
+        if not predicted_tokens and not expected_tokens:
+            scores[field] = 1.0
+        else:
+            scores[field] = _token_f1(predicted_tokens, expected_tokens)
+    
+    scores["overall"] = sum(scores.values()) / len(scores)
+    return scores
+
+def score_queries(generated: List[Dict[str, Any]], reference: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Score generated search queries against reference queries for the same features.
+    
+    A reference query is covered if a generated query has the same feature type and
+    feature value (case-insensitive). Its similarity is the best word-level F1 between
+    the reference query and the generated queries for that feature, 0.0 if uncovered.
+    
+    Args:
+        generated (List[Dict[str, Any]]): Queries with 'feature_type', 'feature_value' and 'search_query'
+        reference (List[Dict[str, Any]]): Reference queries in the same format, as in
+            eval-data/search_query_data.json
+        
+    Returns:
+        Dict[str, float]: "coverage" and mean "similarity" between 0 and 1, and the number
+            of generated "queries"
+    """
+    def feature_key(query: Dict[str, Any]) -> tuple:
+        return query.get("feature_type"), str(query.get("feature_value")).strip().lower()
+    
+    by_feature = {}
+    for query in generated or []:
+        by_feature.setdefault(feature_key(query), []).append(_preference_tokens(query.get("search_query")))
+    
+    covered = 0
+    similarity = 0.0
+    for query in reference:
+        candidates = by_feature.get(feature_key(query))
+        if candidates:
+            covered += 1
+            expected_tokens = _preference_tokens(query.get("search_query"))
+            similarity += max(_token_f1(tokens, expected_tokens) for tokens in candidates)
+    
+    count = len(reference) or 1
+    return {
+        "coverage": covered / count,
+        "similarity": similarity / count,
+        "queries": float(len(generated or []))
+    }
\ No newline at end of file